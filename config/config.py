@@ -17,8 +17,138 @@ PROXY_URL = os.getenv('PROXY_URL') if PROXY_ENABLED else None  # 代理地址
 # 功能开关
 PING_ENABLED = os.getenv('PING_ENABLED', 'false').lower() == 'true'
 
+# Ping配置（进程内探测，不调用系统 ping 命令）
+PING_METHOD = os.getenv('PING_METHOD', 'auto').lower()  # 探测方式: auto/icmp/tcp/udp，auto 在有权限时使用 ICMP，否则使用 TCP 连接
+PING_COUNT = int(os.getenv('PING_COUNT', '4'))  # 每个主机的探测次数
+PING_TIMEOUT = float(os.getenv('PING_TIMEOUT', '2'))  # 单次探测超时（秒）
+PING_INTERVAL = float(os.getenv('PING_INTERVAL', '0.5'))  # 两次探测之间的间隔（秒）
+PING_TCP_PORT = int(os.getenv('PING_TCP_PORT', '443'))  # TCP 探测的端口
+PING_MAX_HOSTS = int(os.getenv('PING_MAX_HOSTS', '5'))  # 一次 /ping 最多探测的主机数
+
 # 管理员配置
 ADMIN_IDS = [int(id.strip()) for id in os.getenv('ADMIN_IDS', '').split(',') if id.strip()] 
 
 # API配置
-API_DOMAIN = os.getenv('API_DOMAIN', 'http://localhost:5244')  # 默认值为本地地址 
\ No newline at end of file
+API_DOMAIN = os.getenv('API_DOMAIN', 'http://localhost:5244')  # 默认值为本地地址
+API_DOMAINS = [
+    domain.strip().rstrip('/')
+    for domain in os.getenv('API_DOMAINS', API_DOMAIN).split(',')
+    if domain.strip()
+]  # 多个解析API实例，逗号分隔；未设置时只使用 API_DOMAIN
+API_HEALTH_PATH = os.getenv('API_HEALTH_PATH', '/')  # 健康检查请求的路径，返回 5xx 或无响应视为不可用
+API_HEALTH_INTERVAL = float(os.getenv('API_HEALTH_INTERVAL', '15'))  # 健康检查间隔（秒）
+API_HEALTH_TIMEOUT = float(os.getenv('API_HEALTH_TIMEOUT', '5'))  # 健康检查超时（秒）
+API_MAX_FAILURES = int(os.getenv('API_MAX_FAILURES', '3'))  # 连续失败多少次后标记为不可用，直到健康检查通过
+API_EWMA_ALPHA = float(os.getenv('API_EWMA_ALPHA', '0.3'))  # 延迟滑动平均的权重，越大越看重最近的请求
+API_HEDGE_ENABLED = os.getenv('API_HEDGE_ENABLED', 'false').lower() == 'true'  # 请求超过p95延迟仍未返回时向另一实例补发请求
+API_HEDGE_MIN_SAMPLES = int(os.getenv('API_HEDGE_MIN_SAMPLES', '20'))  # 实例至少有多少次请求记录后才计算p95并补发
+API_HEDGE_MIN_DELAY = float(os.getenv('API_HEDGE_MIN_DELAY', '0.2'))  # 补发前的最短等待（秒）
+
+# HTTP连接池配置
+HTTP_POOL_LIMIT = int(os.getenv('HTTP_POOL_LIMIT', '100'))  # 连接池总连接数
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', '20'))  # 单个主机最大连接数
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', '30'))  # 空闲连接保持时间（秒）
+HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', '300'))  # DNS缓存时间（秒）
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10'))  # 连接超时（秒）
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '30'))  # 单次请求总超时（秒）
+
+# BMCLAPI统计缓存配置
+BMCL_CACHE_TTL = float(os.getenv('BMCL_CACHE_TTL', '60'))  # 排行数据缓存时间（秒）
+BMCL_STALE_TTL = float(os.getenv('BMCL_STALE_TTL', '600'))  # 过期后仍可回退使用的时长（秒）
+BMCL_STALE_TIMEOUT = float(os.getenv('BMCL_STALE_TIMEOUT', '2'))  # 有过期数据时等待上游的最长时间（秒）
+
+# BMCLAPI统计采集配置：后台定期记录各节点的流量和请求次数
+BMCL_COLLECT_ENABLED = os.getenv('BMCL_COLLECT_ENABLED', 'true').lower() == 'true'  # 是否后台定期采集（需安装 python-telegram-bot[job-queue]，未安装时启动报错并改为查询时获取）
+BMCL_COLLECT_INTERVAL = float(os.getenv('BMCL_COLLECT_INTERVAL', '300'))  # 采集间隔（秒）
+BMCL_HISTORY_HOURS = float(os.getenv('BMCL_HISTORY_HOURS', '72'))  # 保留多少小时的历史
+BMCL_MAX_NODES = int(os.getenv('BMCL_MAX_NODES', '1000'))  # 最多记录的节点数
+
+# 分享列表缓存配置
+SHARE_CACHE_TTL = float(os.getenv('SHARE_CACHE_TTL', '300'))  # 目录列表缓存时间（秒）
+SHARE_CACHE_MAX_BYTES = int(os.getenv('SHARE_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))  # 目录列表缓存容量（字节）
+
+# 分享浏览会话配置
+SHARE_SESSION_IDLE_TIMEOUT = float(os.getenv('SHARE_SESSION_IDLE_TIMEOUT', '1800'))  # 会话空闲过期时间（秒）
+SHARE_SESSION_MAX_ENTRIES = int(os.getenv('SHARE_SESSION_MAX_ENTRIES', '1000'))  # 最大会话数
+SHARE_SESSION_MAX_BYTES = int(os.getenv('SHARE_SESSION_MAX_BYTES', str(64 * 1024 * 1024)))  # 会话总内存上限（字节）
+SHARE_SESSION_SWEEP_INTERVAL = float(os.getenv('SHARE_SESSION_SWEEP_INTERVAL', '60'))  # 过期会话清理间隔（秒）
+
+# 日志配置
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()  # 日志级别
+LOG_FILE = os.getenv('LOG_FILE', 'bot.log')  # 日志文件路径
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))  # 单个日志文件最大字节数，超过后轮转
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))  # 保留的压缩日志文件数
+LOG_PAYLOAD_LIMIT = int(os.getenv('LOG_PAYLOAD_LIMIT', '512'))  # 日志中请求/响应内容的最大长度
+LOG_SAMPLE_RATE = int(os.getenv('LOG_SAMPLE_RATE', '20'))  # 高频日志采样率，每N次输出一次
+
+# 接收更新方式: polling（长轮询）或 webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+
+# 更新处理配置：不同用户的更新并发处理，同一用户的更新按顺序处理
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '16'))  # 同时处理的更新数上限
+UPDATE_MAX_PENDING = int(os.getenv('UPDATE_MAX_PENDING', '256'))  # 已接收但尚未处理完的更新数上限
+
+# Webhook配置（BOT_MODE=webhook 时生效）
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').rstrip('/')  # 对外访问地址，如 https://example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '')  # 接收路径，为空时使用 /telegram/<机器人ID>
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')  # 内置服务监听地址
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))  # 内置服务监听端口
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')  # Telegram 推送时携带的密钥
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))  # 待处理更新队列上限
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '1'))  # 处理更新的工作协程数
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))  # Telegram 同时推送的最大连接数
+
+# 版本检查配置
+VERSION_CHECK_ENABLED = os.getenv('VERSION_CHECK_ENABLED', 'true').lower() == 'true'  # 启动时是否检查新版本
+VERSION_CHECK_TIMEOUT = float(os.getenv('VERSION_CHECK_TIMEOUT', '10'))  # 版本检查最长等待时间（秒）
+VERSION_CHECK_CACHE_TTL = float(os.getenv('VERSION_CHECK_CACHE_TTL', '21600'))  # 版本检查结果缓存时间（秒）
+VERSION_CHECK_FAILURE_TTL = float(os.getenv('VERSION_CHECK_FAILURE_TTL', '3600'))  # 版本检查失败或超时后多久内不再重试（秒）
+VERSION_CHECK_CACHE_FILE = os.getenv('VERSION_CHECK_CACHE_FILE', '.version_cache.json')  # 版本检查结果缓存文件
+
+# 限流配置（各命令的具体限额在注册时声明）
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'  # 是否启用命令和按钮限流
+
+# 指标接口配置（Prometheus 文本格式，仅建议监听本机）
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'  # 是否启动指标接口
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')  # 指标接口监听地址
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9464'))  # 指标接口监听端口
+
+# 追踪配置：记录每个更新经过的处理函数和上游请求耗时
+TRACE_ENABLED = os.getenv('TRACE_ENABLED', 'false').lower() == 'true'  # 是否启用追踪
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')  # span 输出文件（每行一个JSON）
+TRACE_MAX_BYTES = int(os.getenv('TRACE_MAX_BYTES', str(10 * 1024 * 1024)))  # 单个追踪文件最大字节数，超过后轮转
+
+# 扫码登录配置（/cookie）
+COOKIE_QR_TIMEOUT = int(os.getenv('COOKIE_QR_TIMEOUT', '180'))  # 二维码有效期（秒），超时后停止等待扫码
+COOKIE_POLL_TIMEOUT = float(os.getenv('COOKIE_POLL_TIMEOUT', '25'))  # 单次长轮询扫码状态的最长等待时间（秒）
+COOKIE_CACHE_TTL = float(os.getenv('COOKIE_CACHE_TTL', str(30 * 24 * 3600)))  # Cookie未声明过期时间时的缓存时间（秒）
+COOKIE_CHECK_INTERVAL = float(os.getenv('COOKIE_CHECK_INTERVAL', '600'))  # 缓存Cookie有效性检查间隔（秒）
+
+# 发送队列配置：发送和编辑消息按会话排队，遵守 Telegram 的发送频率
+OUTBOX_GLOBAL_RATE = os.getenv('OUTBOX_GLOBAL_RATE', '30/s')  # 所有会话合计的发送频率
+OUTBOX_CHAT_RATE = os.getenv('OUTBOX_CHAT_RATE', '1/s')  # 单个会话的发送频率
+OUTBOX_CHAT_BURST = int(os.getenv('OUTBOX_CHAT_BURST', '3'))  # 单个会话允许的突发次数
+OUTBOX_GROUP_RATE = os.getenv('OUTBOX_GROUP_RATE', '20/min')  # 群组的发送频率
+OUTBOX_MAX_RETRIES = int(os.getenv('OUTBOX_MAX_RETRIES', '3'))  # 遇到 429 时的最大重试次数
+
+# 分享遍历配置（/bd 中的「遍历此目录」）
+CRAWL_CONCURRENCY = int(os.getenv('CRAWL_CONCURRENCY', '8'))  # 单次遍历同时请求的目录数
+CRAWL_UPSTREAM_LIMIT = int(os.getenv('CRAWL_UPSTREAM_LIMIT', '8'))  # 所有遍历任务对解析API的总并发上限（与浏览请求共用实例，不宜过高）
+CRAWL_MAX_FILES = int(os.getenv('CRAWL_MAX_FILES', '50000'))  # 单次遍历的文件数上限（约占12MB内存）
+CRAWL_RESULTS_MAX_BYTES = int(os.getenv('CRAWL_RESULTS_MAX_BYTES', str(64 * 1024 * 1024)))  # 所有用户遍历结果的总字节数上限，与分享会话分开计算
+CRAWL_PROGRESS_INTERVAL = float(os.getenv('CRAWL_PROGRESS_INTERVAL', '3'))  # 私聊中进度消息更新间隔（秒）
+CRAWL_GROUP_PROGRESS_INTERVAL = float(os.getenv('CRAWL_GROUP_PROGRESS_INTERVAL', '15'))  # 群组中进度消息更新间隔（秒），群组发送额度较少，避免进度更新占满额度
+
+# 列表导出配置（CSV/JSONL）
+EXPORT_SPOOL_MAX_BYTES = int(os.getenv('EXPORT_SPOOL_MAX_BYTES', str(1024 * 1024)))  # 导出文件在内存中的最大字节数，超过后写入临时文件
+EXPORT_MAX_BYTES = int(os.getenv('EXPORT_MAX_BYTES', str(16 * 1024 * 1024)))  # 导出文件大小上限（发送时整个文件会读入内存，每个进行中的导出最多占用这么多；Telegram 上限为50MB）
+EXPORT_CONCURRENCY = int(os.getenv('EXPORT_CONCURRENCY', '2'))  # 同时进行的导出数上限，发送占用的内存最多为该值乘以 EXPORT_MAX_BYTES
+
+# 上游重试与熔断配置（解析API、BMCLAPI、百度登录接口等）
+UPSTREAM_RETRY_ATTEMPTS = int(os.getenv('UPSTREAM_RETRY_ATTEMPTS', '3'))  # 幂等请求的最多尝试次数
+UPSTREAM_ATTEMPT_TIMEOUT = float(os.getenv('UPSTREAM_ATTEMPT_TIMEOUT', '10'))  # 单次尝试超时（秒）
+UPSTREAM_DEADLINE = float(os.getenv('UPSTREAM_DEADLINE', '20'))  # 包含重试在内的总期限（秒）
+UPSTREAM_RETRY_BASE_DELAY = float(os.getenv('UPSTREAM_RETRY_BASE_DELAY', '0.5'))  # 首次重试前的最大等待（秒），之后每次翻倍
+UPSTREAM_RETRY_MAX_DELAY = float(os.getenv('UPSTREAM_RETRY_MAX_DELAY', '4'))  # 重试等待上限（秒）
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))  # 连续失败多少次后熔断
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', '30'))  # 熔断后多久放行试探请求（秒）
@@ -1,40 +1,120 @@
 import os
+import sys
+import json
+import hashlib
 import importlib
-from telegram.ext import Application, CommandHandler
-from utils.decorators import CommandRegistry
+from typing import Dict, Optional
+from telegram.ext import Application, MessageHandler, CallbackQueryHandler, filters
+from utils.decorators import CommandRegistry, CallbackRegistry
 from utils.logger import setup_logger
-from handlers.commands.cookie_commands import setup_cookie_handlers
-from handlers.commands.baidu_commands import setup_baidu_handlers
 
-logger = setup_logger()
+logger = setup_logger(__name__)
+
+COMMANDS_PACKAGE = "handlers.commands"
+COMMANDS_DIR = os.path.join(os.path.dirname(__file__), 'commands')
+
+# 命令清单：记录每个命令模块提供的命令和回调前缀，启动时据此登记占位命令而不导入模块
+MANIFEST_PATH = os.path.join(os.path.dirname(__file__), 'commands_manifest.json')
+MANIFEST_VERSION = 1
+
+def list_command_modules() -> Dict[str, str]:
+    """列出commands目录下所有命令模块，返回 {模块名: 文件路径}"""
+    modules = {}
+    for filename in sorted(os.listdir(COMMANDS_DIR)):
+        if filename.endswith('.py') and not filename.startswith('__'):
+            modules[f"{COMMANDS_PACKAGE}.{filename[:-3]}"] = os.path.join(COMMANDS_DIR, filename)
+    return modules
+
+def module_digest(path: str) -> str:
+    """计算模块源码摘要（忽略换行符差异），用于判断清单是否过期"""
+    with open(path, 'rb') as f:
+        source = f.read().replace(b'\r\n', b'\n')
+    return hashlib.sha1(source).hexdigest()
+
+def generate_manifest(path: str = MANIFEST_PATH) -> dict:
+    """导入所有命令模块并生成命令清单"""
+    modules = list_command_modules()
+    manifest = {'version': MANIFEST_VERSION, 'modules': {}}
+    for module_name, module_path in modules.items():
+        importlib.import_module(module_name)
+        manifest['modules'][module_name] = {
+            'digest': module_digest(module_path),
+            'commands': [
+                {
+                    'command': cmd['command'],
+                    'description': cmd['description'],
+                    'is_admin': cmd['is_admin'],
+                }
+                for cmd in CommandRegistry._commands.values()
+                if cmd['module'] == module_name
+            ],
+            'callbacks': sorted(
+                prefix for prefix, module in CallbackRegistry.prefixes().items()
+                if module == module_name
+            ),
+        }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+    return manifest
+
+def load_manifest(path: str = MANIFEST_PATH) -> Optional[dict]:
+    """读取命令清单，不存在或格式不符时返回 None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
 
 async def setup_commands(application: Application) -> None:
     """
     自动加载和注册所有命令
+    清单有效的模块只登记占位命令，首次调用时才导入；清单缺失或过期的模块立即导入
     """
-    # 导入commands目录下所有命令模块
-    commands_dir = os.path.join(os.path.dirname(__file__), 'commands')
-    for filename in os.listdir(commands_dir):
-        if filename.endswith('.py') and not filename.startswith('__'):
-            module_name = f"handlers.commands.{filename[:-3]}"
-            try:
-                importlib.import_module(module_name)
-                logger.info(f"✅ 已加载命令模块: {module_name}")
-            except Exception as e:
-                logger.error(f"❌ 加载命令模块失败 {module_name}: {str(e)}")
-    
-    # 注册所有命令
-    for command in CommandRegistry.get_commands():
+    manifest = load_manifest()
+    manifest_modules = manifest['modules'] if manifest else {}
+
+    for module_name, module_path in list_command_modules().items():
+        entry = manifest_modules.get(module_name)
+        if entry is not None and entry['digest'] == module_digest(module_path):
+            # 按清单登记占位命令
+            for cmd in entry['commands']:
+                CommandRegistry.register_lazy(
+                    cmd['command'],
+                    module_name,
+                    description=cmd['description'],
+                    is_admin=cmd['is_admin']
+                )
+            for prefix in entry['callbacks']:
+                CallbackRegistry.register_lazy(prefix, module_name)
+            logger.debug("已登记延迟加载模块: %s", module_name)
+            continue
+
+        if manifest is not None:
+            logger.warning(f"⚠️ 命令清单已过期，立即加载模块: {module_name}（可运行 python -m handlers.command_loader 重新生成）")
         try:
-            application.add_handler(
-                CommandHandler(command['command'], command['handler'])
-            )
-            logger.info(f"📝 注册命令: /{command['command']}")
+            importlib.import_module(module_name)
+            logger.info(f"✅ 已加载命令模块: {module_name}")
         except Exception as e:
-            logger.error(f"❌ 注册命令失败 /{command['command']}: {str(e)}") 
-    
-    # 设置Cookie处理器
-    setup_cookie_handlers(application) 
-    
-    # 设置百度网盘处理器
-    setup_baidu_handlers(application) 
\ No newline at end of file
+            logger.error(f"❌ 加载命令模块失败 {module_name}: {str(e)}")
+
+    # 编译命令分发表，所有命令由同一个处理器查表分发
+    table = CommandRegistry.compile()
+    application.add_handler(MessageHandler(
+        filters.COMMAND & filters.UpdateType.MESSAGES,
+        CommandRegistry.dispatch
+    ))
+    logger.info(f"📝 已注册 {len(table)} 个命令: {' '.join('/' + name for name in table)}")
+
+    # 所有回调查询由同一个处理器按前缀分发
+    application.add_handler(CallbackQueryHandler(CallbackRegistry.dispatch))
+
+if __name__ == '__main__':
+    # 生成命令清单：python -m handlers.command_loader [输出路径]
+    output = sys.argv[1] if len(sys.argv) > 1 else MANIFEST_PATH
+    result = generate_manifest(output)
+    count = sum(len(entry['commands']) for entry in result['modules'].values())
+    print(f"已生成命令清单: {output}（{len(result['modules'])} 个模块，{count} 个命令）")
@@ -1,10 +1,16 @@
 from telegram import Update
+from telegram.constants import MessageLimit
 from telegram.ext import ContextTypes
 from utils.decorators import CommandRegistry
-from utils.logger import setup_logger
+from utils.logger import setup_logger, get_module_loggers, set_module_level
+from utils.rate_limit import rate_limit_stats
+from utils.metrics import handler_stats, collector_stats
+from utils.resilience import breaker_stats
+from handlers.command_loader import list_command_modules
+import logging
 from config.config import ADMIN_IDS
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 @CommandRegistry.register(command="admin", description="查看管理员信息", is_admin=True)
 async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -12,23 +18,13 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         user = update.effective_user
         
-        # 获取所有管理员命令
-        admin_commands = [
-            cmd for cmd in CommandRegistry.get_commands() 
-            if cmd['is_admin']
-        ]
-        
         # 构建响应消息
         response = (
             f"👮‍♂️ 管理员信息\n\n"
             f"当前管理员ID：\n"
             f"{', '.join(map(str, ADMIN_IDS))}\n\n"
             f"可用管理员命令：\n"
-        )
-        
-        for cmd in admin_commands:
-            enabled = "✅" if cmd['enabled'] else "❌"
-            response += f"{enabled} /{cmd['command']} - {cmd['description']}\n"
+        ) + CommandRegistry.help_text(is_admin=True)
         
         await update.message.reply_text(response)
         logger.info(f"📊 已发送管理员信息给用户 {user.first_name}")
@@ -36,4 +32,146 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         error_msg = f"获取管理员信息时出错: {str(e)}"
         logger.error(error_msg)
-        await update.message.reply_text(f"❌ {error_msg}") 
\ No newline at end of file
+        await update.message.reply_text(f"❌ {error_msg}")
+
+@CommandRegistry.register(command="loglevel", description="调整模块日志级别", is_admin=True)
+async def loglevel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """处理 /loglevel 命令 - 运行时调整模块日志级别，无需重启"""
+    try:
+        user = update.effective_user
+        
+        # 无参数时列出所有模块的当前级别
+        if len(context.args) < 2:
+            loggers = get_module_loggers()
+            response = (
+                "📝 模块日志级别\n"
+                "用法: /loglevel <模块> <DEBUG|INFO|WARNING|ERROR>\n\n"
+            )
+            for name in sorted(loggers):
+                level = logging.getLevelName(loggers[name].getEffectiveLevel())
+                response += f"{name}: {level}\n"
+            # 延迟加载的命令模块在首次使用前还没有记录器，也可以提前设置
+            for name in sorted(set(list_command_modules()) - set(loggers)):
+                response += f"{name}: 未加载\n"
+            for message in split_sections([response]):
+                await update.message.reply_text(message)
+            return
+        
+        module, level = context.args[0], context.args[1]
+        try:
+            matched = set_module_level(module, level)
+        except ValueError as e:
+            await update.message.reply_text(f"❌ {str(e)}")
+            return
+        
+        if matched is None:
+            # 尚未加载的命令模块：先创建记录器，模块加载后沿用该级别
+            pending = next(
+                (name for name in list_command_modules() if module in (name, name.rsplit('.', 1)[-1])),
+                None
+            )
+            if pending is not None:
+                setup_logger(pending)
+                matched = set_module_level(pending, level)
+        
+        if matched is None:
+            await update.message.reply_text(f"❌ 未找到模块: {module}")
+            return
+        
+        await update.message.reply_text(f"✅ 已将 {matched} 的日志级别设置为 {level.upper()}")
+        logger.info(f"📝 用户 {user.first_name} 将 {matched} 的日志级别设置为 {level.upper()}")
+        
+    except Exception as e:
+        error_msg = f"调整日志级别时出错: {str(e)}"
+        logger.error(error_msg)
+        await update.message.reply_text(f"❌ {error_msg}")
+
+# 熔断器状态的显示名称
+BREAKER_STATE_NAMES = {
+    'closed': '🟢 正常',
+    'open': '🔴 熔断',
+    'half_open': '🟡 试探中',
+}
+
+def format_ms(seconds: float) -> str:
+    """格式化耗时"""
+    return f"{seconds * 1000:.0f}ms"
+
+def split_sections(sections: list, limit: int = MessageLimit.MAX_TEXT_LENGTH) -> list:
+    """
+    把多个段落合并为若干条消息，每条不超过 Telegram 的长度上限；
+    尽量不拆开段落，单个段落过长时按行拆分（单行过长时直接截断）
+    :param sections: 段落文本列表
+    :param limit: 每条消息的最大字符数
+    """
+    messages = []
+    current = ""
+    for section in sections:
+        lines = [section] if len(section) <= limit else section.splitlines(keepends=True)
+        for line in lines:
+            line = line[:limit]
+            if len(current) + len(line) > limit:
+                messages.append(current)
+                current = ""
+            current += line
+    if current:
+        messages.append(current)
+    return messages
+
+@CommandRegistry.register(command="stats", description="查看运行统计", is_admin=True)
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """处理 /stats 命令 - 显示命令耗时分位数、错误数、缓存、限流和上游熔断统计"""
+    try:
+        user = update.effective_user
+        
+        # 按段落生成，合并发送时超过消息长度上限则分成多条
+        sections = []
+        response = "📊 运行统计\n\n⏱️ 处理耗时（次数 | 错误 | 进行中 | p50/p95/p99）：\n"
+        handlers = handler_stats()
+        if not handlers:
+            response += "暂无数据\n"
+        for item in handlers:
+            name = f"/{item['name']}" if item['kind'] == 'command' else f"[{item['name']}]"
+            response += (
+                f"{name}: {item['count']} | {item['errors']} | {item['in_flight']} | "
+                f"{format_ms(item['p50'])}/{format_ms(item['p95'])}/{format_ms(item['p99'])}\n"
+            )
+        
+        sections.append(response)
+        
+        # 缓存、会话等统计
+        for (kind, name), values in collector_stats().items():
+            sections.append(f"\n🗄️ {kind}/{name}：\n" + ", ".join(
+                f"{key}={value}" for key, value in values.items()
+            ) + "\n")
+        
+        # 限流统计
+        limits = rate_limit_stats()
+        if limits:
+            sections.append("\n🚦 限流（已放行/已拒绝）：\n" + "".join(
+                f"{item['name']} ({item['rate']}, 突发{item['burst']}): {item['allowed']}/{item['rejected']}\n"
+                for item in limits
+            ))
+        
+        # 上游熔断器
+        breakers = breaker_stats()
+        if breakers:
+            response = "\n🔌 上游熔断（状态 | 连续失败 | 失败/成功 | 拒绝 | 熔断次数）：\n"
+            for item in breakers:
+                state = BREAKER_STATE_NAMES.get(item['state'], item['state'])
+                if item['retry_in']:
+                    state += f"，{item['retry_in']:.0f}秒后试探"
+                response += (
+                    f"{item['name']}: {state} | {item['consecutive_failures']} | "
+                    f"{item['failures']}/{item['successes']} | {item['rejected']} | {item['opened']}\n"
+                )
+            sections.append(response)
+        
+        for message in split_sections(sections):
+            await update.message.reply_text(message)
+        logger.info(f"📊 已发送运行统计给用户 {user.first_name}")
+        
+    except Exception as e:
+        error_msg = f"获取运行统计时出错: {str(e)}"
+        logger.error(error_msg)
+        await update.message.reply_text(f"❌ {error_msg}")
@@ -1,67 +1,362 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, CallbackQueryHandler
-from utils.decorators import CommandRegistry
-from utils.logger import setup_logger
-from config.config import API_DOMAIN
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
+from telegram.ext import ContextTypes
+from utils.decorators import CommandRegistry, CallbackRegistry
+from utils.logger import setup_logger, truncate
+from utils.http_client import get_http_session
+from utils.outbox import get_outbox
+from utils.cache import json_sizeof
+from utils.baidu_share import CRAWL_UPSTREAM, api_backends, crawl_results, listing_cache, share_sessions
+from utils.metrics import set_action, mark_error
+from utils.tracing import span
+from utils.crawler import CrawlStats, crawl_tree, upstream_limit
+from utils.export import EXPORT_FORMATS, ExportTooLarge, export_rows
+from utils.resilience import UpstreamError, call_upstream
+from utils.backends import Backend
+from config.config import (
+    LOG_SAMPLE_RATE,
+    CRAWL_CONCURRENCY,
+    CRAWL_UPSTREAM_LIMIT,
+    CRAWL_MAX_FILES,
+    CRAWL_PROGRESS_INTERVAL,
+    CRAWL_GROUP_PROGRESS_INTERVAL,
+    EXPORT_SPOOL_MAX_BYTES,
+    EXPORT_MAX_BYTES,
+    EXPORT_CONCURRENCY,
+)
+from typing import Dict, Optional
 import re
+import asyncio
 import aiohttp
-import json
+import base64
+import itertools
+import struct
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
-# 存储用户的分享信息
-share_sessions = {}
+# 回调数据前缀
+CALLBACK_PREFIX = "bd"
 
-async def get_share_info(surl: str, pwd: str = "", dir: str = "/"):
-    """获取分享信息"""
-    try:
-        url = f"{API_DOMAIN}/api/v0/list"
-        data = {
-            "surl": surl,
-            "pwd": pwd,
-            "dir": dir
-        }
-        
-        logger.info(f"请求API: {url} 数据: {data}")
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=data) as response:
-                logger.info(f"API响应状态码: {response.status}")
+# 取消遍历按钮的回调前缀（不依赖会话令牌，重新发送链接后仍可取消）
+CRAWL_CALLBACK_PREFIX = "bdc"
+
+# 回调动作编码
+ACTION_ENTER_DIR = 0
+ACTION_FILE_INFO = 1
+ACTION_PAGE = 2
+ACTION_CRAWL = 3
+ACTION_EXPORT = 4  # 导出当前目录，参数为格式下标
+ACTION_EXPORT_CRAWL = 5  # 导出遍历结果，参数为格式下标
+
+# 参数为页码或格式下标（而非路径）的动作
+INDEX_ACTIONS = (ACTION_PAGE, ACTION_EXPORT, ACTION_EXPORT_CRAWL)
+
+# 按会话而非当前目录校验的动作（遍历完成消息中的按钮，切换目录后仍然有效）
+SESSION_ACTIONS = (ACTION_EXPORT_CRAWL,)
+
+# 导出文件的列
+EXPORT_FIELDS = ('path', 'is_dir', 'size', 'md5', 'server_mtime')
+
+# 动作名称，用于耗时统计
+ACTION_NAMES = {
+    ACTION_ENTER_DIR: "enter_dir",
+    ACTION_FILE_INFO: "file_info",
+    ACTION_PAGE: "page",
+    ACTION_CRAWL: "crawl",
+    ACTION_EXPORT: "export",
+    ACTION_EXPORT_CRAWL: "export_crawl",
+}
+
+# 令牌结构：动作(1字节) + 会话或目录代号(2字节) + 参数(4字节)，base64url 编码后为10个字符
+TOKEN_STRUCT = struct.Struct('>BHI')
+
+# 每页显示的文件数
+ITEMS_PER_PAGE = 10
+
+# 代号生成器，用于识别旧会话或旧目录留下的按钮
+_session_generations = itertools.count(1)
+
+def format_size(size: int) -> str:
+    """格式化文件大小"""
+    if size < 1024:
+        return f"{size}B"
+    elif size < 1024 * 1024:
+        return f"{size/1024:.2f}KB"
+    elif size < 1024 * 1024 * 1024:
+        return f"{size/1024/1024:.2f}MB"
+    else:
+        return f"{size/1024/1024/1024:.2f}GB"
+
+class DirectoryView:
+    """
+    目录的物化视图：收到列表时一次性建立文件名索引和可读大小，
+    键盘按页懒渲染并缓存，点击和翻页不再遍历整个列表
+    """
+    __slots__ = ('path', 'entries', 'by_name', 'size_strs', 'pages')
+
+    def __init__(self, path: str, entries: list):
+        self.path = path
+        self.entries = entries
+        self.by_name = {}
+        self.size_strs = {}
+        for entry in entries:
+            name = entry.get('server_filename', '')
+            self.by_name[name] = entry
+            if entry.get('isdir') != "1":
+                self.size_strs[name] = format_size(int(entry.get('size', 0)))
+        # 页码 -> InlineKeyboardMarkup
+        self.pages = {}
+
+    def find(self, name: str):
+        """按文件名查找条目"""
+        return self.by_name.get(name)
+
+    def child_path(self, name: str) -> str:
+        """拼接子项路径"""
+        return f"{self.path.rstrip('/')}/{name}"
+
+class CrawlResult:
+    """
+    一次遍历的结果，单独保存在 crawl_results 中，按 surl 和会话代号对应到分享会话
+    files 中每项为 (路径, 大小, MD5, 修改时间)
+    """
+    __slots__ = ('surl', 'serial', 'root', 'files', 'stats', 'nbytes')
+
+    def __init__(self, session: "ShareSession", root: str, files: list, stats: CrawlStats):
+        self.surl = session.surl
+        self.serial = session.serial
+        self.root = root
+        self.files = files
+        self.stats = stats
+        self.nbytes = sum(len(item[0]) * 2 + 120 for item in files)
+
+class ShareSession:
+    """用户的分享浏览会话"""
+    __slots__ = (
+        'surl', 'pwd', 'share_info', 'view', 'nbytes',
+        'serial', 'generation', 'paths', 'path_index'
+    )
+
+    def __init__(self, surl: str, pwd: str, share_info: dict, current_path: str = '/', file_list: list = None):
+        self.surl = surl
+        self.pwd = pwd
+        self.share_info = share_info
+        self.view = None
+        self.nbytes = 0
+        # 会话代号，整个会话不变
+        self.serial = next(_session_generations) & 0xFFFF
+        # 目录代号和路径表，每次切换目录时重建
+        self.generation = self.serial
+        self.paths = []
+        self.path_index = {}
+        self.set_listing(current_path, file_list or [], renew=False)
+
+    @property
+    def current_path(self) -> str:
+        return self.view.path
+
+    @property
+    def file_list(self) -> list:
+        return self.view.entries
+
+    def set_listing(self, path: str, file_list: list, renew: bool = True):
+        """
+        切换当前目录，建立目录视图并重新估算会话占用
+        路径表随之清空并更换目录代号，路径表只保存当前目录的条目，不会随浏览无限增长；
+        之前目录的按钮因代号不同而失效，不会解析到新路径表中的其他路径
+        :param renew: 是否更换目录代号（新建会话时不需要）
+        """
+        if renew:
+            self.generation = next(_session_generations) & 0xFFFF
+            # 路径表：令牌中只保存下标，点击时 O(1) 取回完整路径
+            self.paths = []
+            self.path_index = {}
+        self.view = DirectoryView(path, file_list)
+        self.nbytes = 256 + json_sizeof(self.share_info) + json_sizeof(file_list)
+
+    def owns(self, crawl: Optional[CrawlResult]) -> bool:
+        """遍历结果是否属于本会话（重新发送链接后旧结果失效）"""
+        return crawl is not None and crawl.surl == self.surl and crawl.serial == self.serial
+
+    def make_token(self, action: int, path: str = None, page: int = 0) -> str:
+        """
+        生成按钮的 callback_data
+        :param action: 动作编码
+        :param path: 目录或文件路径（进入目录、查看文件时使用）
+        :param page: 页码（翻页时使用）或导出格式下标
+        """
+        if path is not None:
+            arg = self.path_index.get(path)
+            if arg is None:
+                arg = len(self.paths)
+                self.paths.append(path)
+                self.path_index[path] = arg
+        else:
+            arg = page
+        generation = self.serial if action in SESSION_ACTIONS else self.generation
+        raw = TOKEN_STRUCT.pack(action, generation, arg)
+        token = base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+        return CallbackRegistry.pack(CALLBACK_PREFIX, token)
+
+    def resolve_token(self, token: str):
+        """
+        解析令牌，返回 (动作, 路径, 页码)；令牌无效或不属于当前会话时返回 None
+        """
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            action, generation, arg = TOKEN_STRUCT.unpack(raw)
+        except (ValueError, struct.error):
+            return None
+        if generation != (self.serial if action in SESSION_ACTIONS else self.generation):
+            return None
+        if action in INDEX_ACTIONS:
+            return action, None, arg
+        if arg >= len(self.paths):
+            return None
+        return action, self.paths[arg], 0
+
+def parent_path(path: str) -> str:
+    """获取上级目录路径"""
+    return path.rstrip('/').rsplit('/', 1)[0] or "/"
+
+async def get_share_info(session: aiohttp.ClientSession, surl: str, pwd: str = "", dir: str = "/"):
+    """获取分享信息（优先使用缓存，相同目录的并发请求只回源一次）"""
+    with span("baidu.get_share_info", dir=dir) as current:
+        if current is not None:
+            current.set(cached=(surl, pwd, dir) in listing_cache)
+        return await listing_cache.get(
+            (surl, pwd, dir),
+            lambda: fetch_share_info(session, surl, pwd, dir)
+        )
+
+async def fetch_share_info(
+    session: aiohttp.ClientSession,
+    surl: str,
+    pwd: str = "",
+    dir: str = "/",
+    upstream: str = api_backends.name,
+):
+    """
+    请求API获取分享信息（列表接口只读，上游故障时换实例重试）
+    :param upstream: 熔断器名称，遍历请求使用单独的熔断器
+    """
+    path = "/api/v0/list"
+    data = {
+        "surl": surl,
+        "pwd": pwd,
+        "dir": dir
+    }
+    
+    async def request(backend: Backend):
+        async with session.post(backend.url + path, json=data) as response:
+            logger.debug("API响应状态码: %s", response.status)
+            with span("baidu.read_body"):
                 response_text = await response.text()
-                logger.info(f"API响应内容: {response_text}")
-                
-                if response.status == 200:
-                    try:
-                        return await response.json()
-                    except Exception as e:
-                        logger.error(f"解析JSON响应失败: {str(e)}")
-                        return None
-                else:
-                    logger.error(f"API请求失败: {response.status}, 响应: {response_text}")
-                    return None
+            logger.debug("API响应内容: %s", truncate(response_text))
+            
+            if response.status != 200:
+                logger.error("API请求失败: %s, 响应: %s", response.status, truncate(response_text))
+                raise UpstreamError(backend.name, response.status)
+            try:
+                with span("baidu.parse_json", bytes=len(response_text)):
+                    return await response.json()
+            except Exception as e:
+                logger.error(f"解析JSON响应失败: {str(e)}")
+                return None
+    
+    try:
+        logger.sample(LOG_SAMPLE_RATE).info("请求API: %s 数据: %s", path, data)
+        # 熔断器按整组计算，只有所有实例都失败时才熔断；每次重试重新选择实例
+        return await call_upstream(upstream, lambda: api_backends.call(request))
     except Exception as e:
-        logger.error(f"获取分享信息时出错: {str(e)}")
+        logger.error(f"获取分享信息时出错: {str(e) or type(e).__name__}")
         return None
 
-def build_file_list_buttons(file_list, current_path="/", page=0):
-    """构建文件列表按钮"""
-    items_per_page = 10
-    start = page * items_per_page
-    end = start + items_per_page
-    current_files = file_list[start:end]
+def build_export_buttons(session: ShareSession, action: int) -> list:
+    """导出按钮（每种格式一个）"""
+    return [
+        InlineKeyboardButton(f"📤 {fmt.upper()}", callback_data=session.make_token(action, page=index))
+        for index, fmt in enumerate(EXPORT_FORMATS)
+    ]
+
+def listing_rows(view: DirectoryView):
+    """当前目录的导出行"""
+    for entry in view.entries:
+        name = entry.get('server_filename', '')
+        is_dir = entry.get('isdir') == "1"
+        yield (
+            view.child_path(name),
+            is_dir,
+            0 if is_dir else int(entry.get('size', 0)),
+            entry.get('md5', ''),
+            entry.get('server_mtime', '')
+        )
+
+def crawl_rows(crawl: CrawlResult):
+    """遍历结果的导出行（只包含文件）"""
+    for path, size, md5, mtime in crawl.files:
+        yield path, False, size, md5, mtime
+
+def export_filename(surl: str, path: str, fmt: str) -> str:
+    """导出文件名，如 share_abc_dir_sub.csv"""
+    slug = re.sub(r'[\\/:*?"<>|\s]+', '_', path).strip('_')[:60]
+    return f"share_{surl}{'_' + slug if slug else ''}.{fmt}"
+
+# 同时进行的导出数
+export_slots = asyncio.Semaphore(EXPORT_CONCURRENCY)
+
+async def send_export(outbox, chat_id: int, rows, fmt: str, filename: str, title: str) -> bool:
+    """
+    流式生成导出文件并发送，文件过大时改为发送提示
+    :return: 是否发送了文件
+    """
+    count = 0
+    
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+    
+    # 限制同时进行的导出数：发送时文件会整个读入内存，总占用不超过 EXPORT_CONCURRENCY * EXPORT_MAX_BYTES
+    async with export_slots:
+        try:
+            file, size = await export_rows(counted(), EXPORT_FIELDS, fmt, EXPORT_SPOOL_MAX_BYTES, EXPORT_MAX_BYTES)
+        except ExportTooLarge:
+            await outbox.send(chat_id, f"❌ 导出文件超过 {format_size(EXPORT_MAX_BYTES)}，无法发送")
+            return False
+        with file:
+            # python-telegram-bot 上传前总会把整个文件读入内存（内存中的临时文件没有文件名，
+            # 不能直接交给 InputFile），这里在线程中读取，避免阻塞事件循环
+            data = await asyncio.get_running_loop().run_in_executor(None, file.read)
+            await outbox.send_document(
+                chat_id,
+                InputFile(data, filename=filename),
+                caption=f"{title}\n共 {count} 条，文件大小 {format_size(size)}"
+            )
+    logger.info(f"已导出 {filename}，{count} 条，{format_size(size)}")
+    return True
+
+def build_file_list_buttons(session: ShareSession, page: int = 0) -> InlineKeyboardMarkup:
+    """构建文件列表按钮（按页缓存于当前目录视图）"""
+    view = session.view
+    markup = view.pages.get(page)
+    if markup is not None:
+        return markup
+    
+    start = page * ITEMS_PER_PAGE
+    end = start + ITEMS_PER_PAGE
     
     buttons = []
-    for file in current_files:
+    for file in view.entries[start:end]:
         is_dir = file.get('isdir') == "1"
         icon = "📁" if is_dir else "📄"
         name = file.get('server_filename', '')
-        path = f"{current_path.rstrip('/')}/{name}"
         
         # 为目录添加导航功能
-        callback_data = json.dumps({
-            "action": "enter_dir" if is_dir else "file_info",
-            "path": path
-        })
+        callback_data = session.make_token(
+            ACTION_ENTER_DIR if is_dir else ACTION_FILE_INFO,
+            path=view.child_path(name)
+        )
         
         buttons.append([InlineKeyboardButton(
             f"{icon} {name}",
@@ -70,47 +365,162 @@ def build_file_list_buttons(file_list, current_path="/", page=0):
     
     # 添加导航按钮
     nav_buttons = []
-    if current_path != "/":
+    if view.path != "/":
         nav_buttons.append(InlineKeyboardButton(
             "⬆️ 返回上级",
-            callback_data=json.dumps({
-                "action": "enter_dir",
-                "path": str(current_path).rsplit('/', 2)[0] or "/"
-            })
+            callback_data=session.make_token(ACTION_ENTER_DIR, path=parent_path(view.path))
         ))
     
     # 添加翻页按钮
     if page > 0:
         nav_buttons.append(InlineKeyboardButton(
             "⬅️ 上一页",
-            callback_data=json.dumps({
-                "action": "page",
-                "page": page - 1
-            })
+            callback_data=session.make_token(ACTION_PAGE, page=page - 1)
         ))
-    if end < len(file_list):
+    if end < len(view.entries):
         nav_buttons.append(InlineKeyboardButton(
             "➡️ 下一页",
-            callback_data=json.dumps({
-                "action": "page",
-                "page": page + 1
-            })
+            callback_data=session.make_token(ACTION_PAGE, page=page + 1)
         ))
     
     if nav_buttons:
         buttons.append(nav_buttons)
     
-    return buttons
+    # 遍历当前目录下的整棵树，或导出当前目录的完整列表
+    buttons.append([
+        InlineKeyboardButton("🌲 遍历此目录", callback_data=session.make_token(ACTION_CRAWL, path=view.path)),
+        *build_export_buttons(session, ACTION_EXPORT)
+    ])
+    
+    markup = InlineKeyboardMarkup(buttons)
+    view.pages[page] = markup
+    return markup
+
+# 正在进行的遍历任务，每个用户同时只能有一个
+crawl_tasks: Dict[int, asyncio.Task] = {}
+
+async def list_share_dir(http: aiohttp.ClientSession, surl: str, pwd: str, path: str):
+    """
+    列出分享中的一个目录，返回 (子目录路径列表, 文件列表, 文件总字节数)，失败时返回 None
+    不经过目录列表缓存，避免大量遍历请求挤掉其他用户正在浏览的目录
+    """
+    result = await fetch_share_info(http, surl, pwd, path, upstream=CRAWL_UPSTREAM)
+    if not result or result.get('code') != 200:
+        return None
+    subdirs, files, total = [], [], 0
+    for entry in result.get('data', {}).get('list', []):
+        child = f"{path.rstrip('/')}/{entry.get('server_filename', '')}"
+        if entry.get('isdir') == "1":
+            subdirs.append(child)
+        else:
+            size = int(entry.get('size', 0))
+            files.append((child, size, entry.get('md5', ''), entry.get('server_mtime', '')))
+            total += size
+    return subdirs, files, total
+
+def build_crawl_cancel_button() -> InlineKeyboardMarkup:
+    """遍历进度消息的取消按钮"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("⏹ 停止遍历", callback_data=CallbackRegistry.pack(CRAWL_CALLBACK_PREFIX, "cancel"))
+    ]])
+
+def format_crawl_progress(title: str, root: str, stats: CrawlStats) -> str:
+    """遍历进度文本"""
+    text = (
+        f"{title}\n"
+        f"起始目录：{root}\n"
+        f"📁 目录：{stats.dirs}（待处理 {stats.pending}）\n"
+        f"📄 文件：{stats.files}\n"
+        f"💾 总大小：{format_size(stats.bytes)}\n"
+        f"📏 当前深度：{stats.depth}（最深 {stats.max_depth}）\n"
+        f"⏱ 用时：{stats.elapsed:.0f}秒"
+    )
+    if stats.errors:
+        text += f"\n⚠️ {stats.errors} 个目录获取失败"
+    return text
+
+async def run_crawl(outbox, http: aiohttp.ClientSession, user_id: int, session: ShareSession, root: str, message):
+    """
+    后台遍历分享目录树，进度按间隔更新到同一条消息，完成后结果保存到会话
+    :param outbox: 发送队列
+    :param http: 共享HTTP会话
+    :param user_id: 发起遍历的用户
+    :param session: 用户的分享会话
+    :param root: 起始目录
+    :param message: 进度消息
+    """
+    stats = CrawlStats()
+    files = []
+    loop = asyncio.get_running_loop()
+    # 群组的发送额度（OUTBOX_GROUP_RATE）由整个群共用，进度更新放慢，不挤占其他回复
+    interval = CRAWL_PROGRESS_INTERVAL if message.chat.type == 'private' else CRAWL_GROUP_PROGRESS_INTERVAL
+    next_update = loop.time() + interval
+    try:
+        async for _, _, entries in crawl_tree(
+            lambda path: list_share_dir(http, session.surl, session.pwd, path),
+            root,
+            concurrency=CRAWL_CONCURRENCY,
+            upstream=upstream_limit(CRAWL_UPSTREAM, CRAWL_UPSTREAM_LIMIT),
+            max_files=CRAWL_MAX_FILES,
+            stats=stats
+        ):
+            files.extend(entries)
+            if loop.time() >= next_update:
+                next_update = loop.time() + interval
+                # 不等待发送完成，进度更新过快时只发送最新一次
+                await outbox.edit_text(
+                    message,
+                    format_crawl_progress("🌲 正在遍历...", root, stats),
+                    reply_markup=build_crawl_cancel_button(),
+                    wait=False
+                )
+    except asyncio.CancelledError:
+        logger.info(f"用户 {user_id} 已停止遍历 {session.surl}:{root}")
+        await outbox.edit_text(message, format_crawl_progress("⏹ 已停止遍历", root, stats), wait=False)
+        raise
+    except Exception as e:
+        logger.error(f"遍历分享目录时出错: {str(e)}")
+        await outbox.edit_text(message, format_crawl_progress(f"❌ 遍历出错：{str(e)}", root, stats), wait=False)
+        return
+    
+    # 保存结果（用户期间重新发送了链接时会话已被替换，结果直接丢弃）
+    if share_sessions.get(user_id) is session:
+        crawl_results.put(user_id, CrawlResult(session, root, files, stats))
+    
+    if stats.truncated:
+        title = f"⚠️ 文件数已达上限 {CRAWL_MAX_FILES}，结果不完整"
+    else:
+        title = "✅ 遍历完成"
+    logger.info(
+        f"✅ 遍历完成 {session.surl}:{root}，目录 {stats.dirs}，文件 {stats.files}，"
+        f"大小 {format_size(stats.bytes)}，用时 {stats.elapsed:.1f}秒"
+    )
+    # 会话仍是当前会话时附带导出按钮
+    reply_markup = None
+    if share_sessions.get(user_id) is session:
+        reply_markup = InlineKeyboardMarkup([build_export_buttons(session, ACTION_EXPORT_CRAWL)])
+    await outbox.edit_text(message, format_crawl_progress(title, root, stats), reply_markup=reply_markup, wait=False)
 
-@CommandRegistry.register(command="bd", description="解析百度网盘链接")
+def start_crawl(context: ContextTypes.DEFAULT_TYPE, user_id: int, session: ShareSession, root: str, message) -> asyncio.Task:
+    """启动后台遍历任务，结束后自动移除"""
+    task = asyncio.create_task(run_crawl(
+        get_outbox(context), get_http_session(context), user_id, session, root, message
+    ))
+    crawl_tasks[user_id] = task
+    task.add_done_callback(lambda done: crawl_tasks.pop(user_id, None) if crawl_tasks.get(user_id) is done else None)
+    return task
+
+@CommandRegistry.register(command="bd", description="解析百度网盘链接", rate="5/min", burst=2, chat_rate="20/min", chat_burst=5)
 async def baidu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 /bd 命令 - 解析百度网盘分享链接"""
     try:
+        outbox = get_outbox(context)
         user = update.effective_user
         
         # 检查参数
         if not context.args:
-            await update.message.reply_text(
+            await outbox.reply(
+                update.message,
                 "❌ 请提供百度网盘分享链接\n"
                 "格式: /bd https://pan.baidu.com/s/xxxxxx?pwd=yyyy\n"
                 "或: /bd https://pan.baidu.com/s/xxxxxx yyyy"
@@ -126,7 +536,8 @@ async def baidu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         match = re.match(url_pattern, share_url)
         
         if not match:
-            await update.message.reply_text(
+            await outbox.reply(
+                update.message,
                 "❌ 无效的百度网盘链接格式\n"
                 "请使用以下格式：\n"
                 "1. https://pan.baidu.com/s/xxxxxx?pwd=yyyy\n"
@@ -142,7 +553,8 @@ async def baidu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # 如果没有提取码，询问用户
         if not url_pwd:
-            confirm_msg = await update.message.reply_text(
+            confirm_msg = await outbox.reply(
+                update.message,
                 "⚠️ 未检测到提取码，确认分享链接真的没有提取码吗？\n"
                 "如果有提取码，请使用以下格式重新发送：\n"
                 "1. /bd https://pan.baidu.com/s/xxxxxx?pwd=yyyy\n"
@@ -151,16 +563,17 @@ async def baidu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         # 发送等待消息
-        message = await update.message.reply_text(
+        message = await outbox.reply(
+            update.message,
             "🔄 正在解析分享链接...\n"
             "请稍候"
         )
         
         # 获取分享信息
-        result = await get_share_info(surl, url_pwd)
+        result = await get_share_info(get_http_session(context), surl, url_pwd)
         
         if result is None:
-            await message.edit_text("❌ 解析失败，API请求出错")
+            await outbox.edit_text(message, "❌ 解析失败，API请求出错")
             return
             
         # 处理API响应
@@ -170,18 +583,13 @@ async def baidu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             share_info = data.get('info', {})
             
             if not file_list:
-                await message.edit_text("❌ 未找到文件信息")
+                await outbox.edit_text(message, "❌ 未找到文件信息")
                 return
             
             # 保存会话信息
-            session_data = {
-                'surl': surl,
-                'pwd': url_pwd,
-                'share_info': share_info,
-                'current_path': '/',
-                'file_list': file_list
-            }
-            share_sessions[user.id] = session_data
+            session = ShareSession(surl, url_pwd, share_info, '/', file_list)
+            share_sessions.put(user.id, session)
+            crawl_results.pop(user.id)
             
             # 构建分享信息消息
             response = (
@@ -194,10 +602,10 @@ async def baidu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             
             # 构建按钮
-            buttons = build_file_list_buttons(file_list)
-            reply_markup = InlineKeyboardMarkup(buttons)
+            reply_markup = build_file_list_buttons(session)
             
-            await message.edit_text(
+            await outbox.edit_text(
+                message,
                 response,
                 reply_markup=reply_markup
             )
@@ -205,22 +613,22 @@ async def baidu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
         else:
             error_msg = result.get('message', '未知错误')
-            await message.edit_text(f"❌ 解析失败：{error_msg}")
+            await outbox.edit_text(message, f"❌ 解析失败：{error_msg}")
         
     except Exception as e:
         error_msg = f"解析链接时出错: {str(e)}"
         logger.error(error_msg)
-        await update.message.reply_text(f"❌ {error_msg}")
+        mark_error()
+        await get_outbox(context).reply(update.message, f"❌ {error_msg}")
 
-async def baidu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@CallbackRegistry.register(CALLBACK_PREFIX, rate="60/min", burst=10)
+async def baidu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, token: str):
     """处理百度网盘相关的回调查询"""
     try:
+        outbox = get_outbox(context)
         query = update.callback_query
         user = query.from_user
-        logger.info(f"收到回调查询 - 用户: {user.first_name}({user.id}), 数据: {query.data}")
-        
-        data = json.loads(query.data)
-        action = data.get('action')
+        logger.sample(LOG_SAMPLE_RATE).info("收到回调查询 - 用户: %s(%s), 数据: %s", user.first_name, user.id, query.data)
         
         # 获取用户会话
         session = share_sessions.get(user.id)
@@ -229,89 +637,134 @@ async def baidu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.answer("会话已过期，请重新发送分享链接")
             return
         
-        if action == "enter_dir":
-            path = data.get('path', '/')
-            logger.info(f"用户 {user.first_name} 尝试进入目录: {path}")
+        # 解析令牌
+        resolved = session.resolve_token(token)
+        if resolved is None:
+            await query.answer("按钮已过期，请重新发送分享链接")
+            return
+        action, path, page = resolved
+        set_action(ACTION_NAMES[action])
+        
+        if action == ACTION_ENTER_DIR:
+            logger.debug("用户 %s 尝试进入目录: %s", user.first_name, path)
             
             # 获取目录内容
-            result = await get_share_info(session['surl'], session['pwd'], path)
-            logger.info(f"目录内容响应: {result}")
+            result = await get_share_info(get_http_session(context), session.surl, session.pwd, path)
+            logger.debug("目录内容响应: %s", truncate(result))
             
             if result and result.get('code') == 200:
                 file_list = result.get('data', {}).get('list', [])
-                session['current_path'] = path
-                session['file_list'] = file_list
-                logger.info(f"成功获取目录 {path} 的内容，文件数: {len(file_list)}")
+                session.set_listing(path, file_list)
+                share_sessions.put(user.id, session)
+                logger.info("成功获取目录 %s 的内容，文件数: %s", path, len(file_list))
                 
                 # 更新消息内容和按钮
                 response = (
                     f"🔗 分享信息\n"
-                    f"链接：https://pan.baidu.com/s/{session['surl']}\n"
-                    f"提取码：{session['pwd']}\n"
+                    f"链接：https://pan.baidu.com/s/{session.surl}\n"
+                    f"提取码：{session.pwd}\n"
                     f"当前路径：{path}\n\n"
                     f"📂 文件列表如下，点击查看详情："
                 )
                 
-                buttons = build_file_list_buttons(file_list, path)
-                await query.message.edit_text(
+                # 不等待发送完成，连续点击时只发送最后一次的内容
+                await outbox.edit_text(
+                    query.message,
                     response,
-                    reply_markup=InlineKeyboardMarkup(buttons)
+                    reply_markup=build_file_list_buttons(session),
+                    wait=False
                 )
-                logger.info(f"已更新消息内容和按钮")
+                logger.debug("已更新消息内容和按钮")
             else:
                 logger.error(f"获取目录 {path} 内容失败")
                 await query.answer("获取目录内容失败")
         
-        elif action == "file_info":
-            path = data.get('path')
-            logger.info(f"用户 {user.first_name} 查看文件信息: {path}")
+        elif action == ACTION_FILE_INFO:
+            logger.debug("用户 %s 查看文件信息: %s", user.first_name, path)
             
             # 显示文件详细信息
-            for file in session['file_list']:
-                if file.get('server_filename') == path.split('/')[-1]:
-                    size = int(file.get('size', 0))
-                    if size < 1024:
-                        size_str = f"{size}B"
-                    elif size < 1024 * 1024:
-                        size_str = f"{size/1024:.2f}KB"
-                    elif size < 1024 * 1024 * 1024:
-                        size_str = f"{size/1024/1024:.2f}MB"
-                    else:
-                        size_str = f"{size/1024/1024/1024:.2f}GB"
-                    
-                    info = (
-                        f"📄 文件信息\n"
-                        f"名称：{file.get('server_filename')}\n"
-                        f"大小：{size_str}\n"
-                        f"路径：{path}\n"
-                        f"MD5：{file.get('md5', '未知')}"
-                    )
-                    await query.answer(info, show_alert=True)
-                    logger.info(f"已显示文件 {path} 的详细信息")
-                    break
+            name = path.rsplit('/', 1)[-1]
+            file = session.view.find(name)
+            if file is not None:
+                info = (
+                    f"📄 文件信息\n"
+                    f"名称：{name}\n"
+                    f"大小：{session.view.size_strs.get(name, '未知')}\n"
+                    f"路径：{path}\n"
+                    f"MD5：{file.get('md5', '未知')}"
+                )
+                await query.answer(info, show_alert=True)
+                logger.debug("已显示文件 %s 的详细信息", path)
+            else:
+                await query.answer("文件不在当前目录，请刷新后重试")
         
-        elif action == "page":
-            page = data.get('page', 0)
-            logger.info(f"用户 {user.first_name} 翻页到: {page}")
+        elif action == ACTION_PAGE:
+            logger.debug("用户 %s 翻页到: %s", user.first_name, page)
             
-            buttons = build_file_list_buttons(
-                session['file_list'],
-                session['current_path'],
-                page
+            await outbox.edit_reply_markup(
+                query.message,
+                reply_markup=build_file_list_buttons(session, page),
+                wait=False
             )
-            await query.message.edit_reply_markup(
-                reply_markup=InlineKeyboardMarkup(buttons)
+            logger.debug("已更新翻页按钮")
+        
+        elif action == ACTION_CRAWL:
+            logger.info(f"用户 {user.first_name} 开始遍历目录: {path}")
+            
+            task = crawl_tasks.get(user.id)
+            if task is not None and not task.done():
+                await query.answer("已有遍历任务在进行，请等待完成或停止后再试")
+                return
+            
+            # 遍历在后台进行，期间仍可继续浏览
+            message = await outbox.send(
+                query.message.chat_id,
+                f"🌲 正在遍历 {path} ...",
+                reply_markup=build_crawl_cancel_button()
+            )
+            start_crawl(context, user.id, session, path, message)
+            await query.answer("已开始遍历")
+        
+        elif action in (ACTION_EXPORT, ACTION_EXPORT_CRAWL):
+            if page >= len(EXPORT_FORMATS):
+                await query.answer("按钮已过期，请重新发送分享链接")
+                return
+            fmt = EXPORT_FORMATS[page]
+            
+            if action == ACTION_EXPORT_CRAWL:
+                crawl = crawl_results.get(user.id)
+                if not session.owns(crawl):
+                    await query.answer("遍历结果已失效，请重新遍历")
+                    return
+                rows, root = crawl_rows(crawl), crawl.root
+                title = f"🌲 遍历结果：{root}"
+            else:
+                rows, root = listing_rows(session.view), session.current_path
+                title = f"📂 目录列表：{root}"
+            
+            logger.info(f"用户 {user.first_name} 导出 {session.surl}:{root} ({fmt})")
+            await query.answer("⏳ 正在生成导出文件...")
+            await send_export(
+                outbox,
+                query.message.chat_id,
+                rows,
+                fmt,
+                export_filename(session.surl, root, fmt),
+                title
             )
-            logger.info(f"已更新翻页按钮")
         
     except Exception as e:
         logger.error(f"处理回调时出错: {str(e)}")
+        mark_error()
         await query.answer("操作失败，请重试")
 
-# 注册回调处理器
-def setup_baidu_handlers(application):
-    """设置百度网盘相关的处理器"""
-    application.add_handler(CallbackQueryHandler(
-        baidu_callback,
-        pattern=r'^{"action":"(enter_dir|file_info|page)"'
-    )) 
\ No newline at end of file
+@CallbackRegistry.register(CRAWL_CALLBACK_PREFIX)
+async def crawl_cancel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload: str):
+    """停止当前用户的遍历任务"""
+    query = update.callback_query
+    task = crawl_tasks.get(query.from_user.id)
+    if task is None or task.done():
+        await query.answer("没有正在进行的遍历")
+        return
+    task.cancel()
+    await query.answer("已停止遍历")
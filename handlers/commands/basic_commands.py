@@ -3,7 +3,7 @@ from telegram.ext import ContextTypes
 from utils.decorators import CommandRegistry
 from utils.logger import setup_logger
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 @CommandRegistry.register(command="start", description="启动机器人")
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -30,12 +30,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
         logger.info(f"📖 正在生成帮助信息给用户 {user.first_name}")
         
-        commands = CommandRegistry.get_commands()
-        help_text = "📝 可用命令列表：\n\n"
-        
-        for cmd in commands:
-            if not cmd['is_admin']:  # 只显示非管理员命令
-                help_text += f"/{cmd['command']} - {cmd['description']}\n"
+        # 只显示非管理员命令
+        help_text = "📝 可用命令列表：\n\n" + CommandRegistry.help_text(is_admin=False)
         
         await update.message.reply_text(help_text)
         logger.info(f"📚 已发送帮助信息给用户 {user.first_name}")
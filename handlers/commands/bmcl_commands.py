@@ -2,10 +2,20 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from utils.decorators import CommandRegistry
 from utils.logger import setup_logger
-import aiohttp
-import json
+from utils.http_client import get_http_session
+from utils.outbox import get_outbox
+from utils.metrics import mark_error
+from utils.bmcl_stats import RANK_URL, TOTAL, rank_cache, rank_collector
+from typing import Optional
+import time
 
-logger = setup_logger()
+logger = setup_logger(__name__)
+
+# /bmcl 后跟这些参数时显示每小时流量
+HOURLY_ARGS = ('hourly', 'hour', '小时')
+
+# 排名变化中显示的节点数
+TOP_MOVERS = 5
 
 def format_size(bytes_size: int) -> str:
     """格式化文件大小"""
@@ -29,63 +39,132 @@ def format_hits(hits: int) -> str:
     else:
         return f"{hits/100000000:.2f}亿"
 
-@CommandRegistry.register(command="bmcl", description="查看BMCLAPI节点统计")
+def format_change(change: Optional[int]) -> str:
+    """排名变化标记，None 表示上一次未上榜"""
+    if change is None:
+        return " 🆕"
+    if change > 0:
+        return f" ↑{change}"
+    if change < 0:
+        return f" ↓{-change}"
+    return ""
+
+def format_time(timestamp: float, fmt: str = '%H:%M') -> str:
+    """格式化本地时间"""
+    return time.strftime(fmt, time.localtime(timestamp))
+
+def format_hourly(rows) -> str:
+    """每小时流量列表"""
+    if not rows:
+        return "暂无数据（至少需要两次采集）\n"
+    return "".join(
+        f"{format_time(hour)}  {format_size(size)}, {format_hits(hits)} 次请求\n"
+        for hour, size, hits in rows
+    )
+
+def build_overview() -> str:
+    """总流量、前10名节点及排名变化"""
+    history = rank_collector.history
+    response = (
+        f"📊 BMCLAPI 节点统计\n\n"
+        f"今日总流量：{format_size(history.value(TOTAL, 'bytes') or 0)}\n"
+        f"共响应 {format_hits(history.value(TOTAL, 'hits') or 0)} 次请求\n\n"
+        f"节点流量排名：\n"
+    )
+    
+    ranking = rank_collector.ranking()
+    changes = rank_collector.rank_changes()
+    medals = ['🥇', '🥈', '🥉']
+    for i, key in enumerate(ranking[:10]):
+        medal = medals[i] if i < 3 else f"{i+1}."
+        name = rank_collector.names.get(key, key)
+        bytes_size = format_size(history.value(key, 'bytes'))
+        hits = format_hits(history.value(key, 'hits'))
+        response += f"{medal} {name}: {bytes_size}, {hits} 次请求{format_change(changes.get(key, 0))}\n"
+    
+    # 与上一次快照相比排名变化最大的节点
+    movers = sorted(
+        (item for item in changes.items() if item[1]),
+        key=lambda item: abs(item[1]),
+        reverse=True
+    )[:TOP_MOVERS]
+    if movers:
+        current = {key: rank for rank, key in enumerate(ranking)}
+        response += f"\n🔀 排名变化（对比 {format_time(history.timestamp(-2))}）：\n"
+        for key, change in movers:
+            rank = current[key] + 1
+            response += f"{rank_collector.names.get(key, key)}: 第{rank + change}名 → 第{rank}名{format_change(change)}\n"
+    
+    response += (
+        f"\n🕒 更新于 {format_time(rank_collector.updated_at, '%H:%M:%S')}\n"
+        f"/bmcl hourly 查看每小时流量，/bmcl <节点名> 查看节点历史"
+    )
+    return response
+
+def build_hourly() -> str:
+    """最近24小时所有节点合计的每小时流量"""
+    return "📈 BMCLAPI 每小时流量（最近24小时）：\n\n" + format_hourly(rank_collector.hourly())
+
+def build_node(key: str) -> str:
+    """单个节点的当前流量、排名和每小时流量"""
+    history = rank_collector.history
+    response = f"🖥️ 节点 {rank_collector.names.get(key, key)}\n\n"
+    bytes_size = history.value(key, 'bytes')
+    if bytes_size is None:
+        response += "当前未启用\n"
+    else:
+        ranking = rank_collector.ranking()
+        change = rank_collector.rank_changes().get(key, 0)
+        response += (
+            f"今日流量：{format_size(bytes_size)}\n"
+            f"共响应 {format_hits(history.value(key, 'hits'))} 次请求\n"
+            f"流量排名：第{ranking.index(key) + 1}名{format_change(change)}\n"
+        )
+    return response + "\n📈 每小时流量（最近24小时）：\n" + format_hourly(rank_collector.hourly(key))
+
+@CommandRegistry.register(command="bmcl", description="查看BMCLAPI节点统计", rate="6/min", burst=3)
 async def bmcl_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """处理 /bmcl 命令 - 显示BMCLAPI节点统计信息"""
+    """处理 /bmcl 命令 - 显示BMCLAPI节点统计；/bmcl hourly 显示每小时流量，/bmcl <节点名> 显示节点历史"""
     try:
+        outbox = get_outbox(context)
         user = update.effective_user
         logger.info(f"用户 {user.first_name} 请求BMCLAPI节点统计")
         
-        # 发送等待消息
-        message = await update.message.reply_text(
-            "🔄 正在获取BMCLAPI节点统计信息...\n"
-            "请稍候"
-        )
-        
-        # 请求API
-        async with aiohttp.ClientSession() as session:
-            async with session.get('https://bd.bangbang93.com/openbmclapi/metric/rank') as response:
-                if response.status != 200:
-                    await message.edit_text("❌ 获取节点信息失败")
-                    return
-                    
-                data = await response.json()
-        
-        # 计算总流量和总请求次数
-        total_bytes = sum(node.get('metric', {}).get('bytes', 0) for node in data if node.get('isEnabled', False))
-        total_hits = sum(node.get('metric', {}).get('hits', 0) for node in data if node.get('isEnabled', False))
+        # 后台采集正常或数据未超过缓存有效期时直接从内存回复，否则经排行缓存拉取一次
+        message = None
+        if not rank_collector.fresh:
+            # 发送等待消息
+            message = await outbox.reply(
+                update.message,
+                "🔄 正在获取BMCLAPI节点统计信息...\n"
+                "请稍候"
+            )
+            
+            # 请求API（结果写入历史）
+            await rank_cache.get(RANK_URL, lambda: rank_collector.poll(get_http_session(context)))
+            if not len(rank_collector.history):
+                await outbox.edit_text(message, "❌ 获取节点信息失败")
+                return
         
         # 构建响应消息
-        response = (
-            f"📊 BMCLAPI 节点统计\n\n"
-            f"今日总流量：{format_size(total_bytes)}\n"
-            f"共响应 {format_hits(total_hits)} 次请求\n\n"
-            f"节点流量排名：\n"
-        )
-        
-        # 对启用的节点按流量排序
-        enabled_nodes = [node for node in data if node.get('isEnabled', False)]
-        sorted_nodes = sorted(
-            enabled_nodes, 
-            key=lambda x: x.get('metric', {}).get('bytes', 0), 
-            reverse=True
-        )
-        
-        # 添加前10个节点的信息
-        medals = ['🥇', '🥈', '🥉']
-        for i, node in enumerate(sorted_nodes[:10]):
-            medal = medals[i] if i < 3 else f"{i+1}."
-            name = node.get('name', 'Unknown')
-            bytes_size = format_size(node.get('metric', {}).get('bytes', 0))
-            hits = format_hits(node.get('metric', {}).get('hits', 0))
-            
-            response += f"{medal} {name}: {bytes_size}, {hits} 次请求\n"
+        query = ' '.join(context.args) if context.args else ''
+        if not query:
+            response = build_overview()
+        elif query.lower() in HOURLY_ARGS:
+            response = build_hourly()
+        else:
+            key = rank_collector.find(query)
+            response = build_node(key) if key else f"❌ 未找到节点：{query}"
         
         # 更新消息
-        await message.edit_text(response)
+        if message:
+            await outbox.edit_text(message, response)
+        else:
+            await outbox.reply(update.message, response)
         logger.info(f"✅ 已发送BMCLAPI节点统计给用户 {user.first_name}")
         
     except Exception as e:
         error_msg = f"获取BMCLAPI节点统计时出错: {str(e)}"
         logger.error(error_msg)
-        await update.message.reply_text(f"❌ {error_msg}") 
\ No newline at end of file
+        mark_error()
+        await get_outbox(context).reply(update.message, f"❌ {error_msg}")
\ No newline at end of file
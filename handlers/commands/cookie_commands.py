@@ -1,157 +1,412 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, CallbackQueryHandler
-from utils.decorators import CommandRegistry
+from telegram.ext import ContextTypes
+from utils.decorators import CommandRegistry, CallbackRegistry
 from utils.logger import setup_logger
+from utils.http_client import HttpClient, get_http_client, get_http_session
+from utils.outbox import Outbox, get_outbox
+from utils.resilience import call_upstream, check_status
+from utils.metrics import set_action, mark_error
+from utils.baidu_cookie import CookieEntry, cookie_cache, probe_cookie
+from telegram.error import BadRequest
+from typing import Dict, Optional, Tuple
+from http.cookiejar import http2time
+from yarl import URL
 import aiohttp
+import html
 import json
 import time
 import asyncio
-from config.config import ADMIN_IDS
+from config.config import (
+    ADMIN_IDS,
+    COOKIE_QR_TIMEOUT,
+    COOKIE_POLL_TIMEOUT,
+)
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
-# Cookie缓存
-cookie_cache = {}
+# 回调数据前缀
+CALLBACK_PREFIX = "ck"
 
-async def get_qrcode():
-    """获取百度登录二维码"""
+# 旧版本消息上按钮的回调数据：refresh_qr 和 check_status:<sign>
+LEGACY_REFRESH_PREFIX = "refresh_qr"
+LEGACY_CHECK_PREFIX = "check_status"
+
+# 登录过程最多跟随的重定向次数
+LOGIN_MAX_REDIRECTS = 10
+
+# 网盘主页，最终Cookie取访问该地址时携带的部分
+PAN_MAIN_URL = "https://pan.baidu.com/disk/main"
+
+# 熔断器使用的上游名称
+PASSPORT_UPSTREAM = "passport.baidu.com"
+
+# 必须包含的Cookie
+REQUIRED_COOKIES = ('BDUSS', 'STOKEN')
+
+# 扫码状态轮询的退避时间（秒）：通道立即返回或请求出错时逐步加长等待
+POLL_BACKOFF_MIN = 1.0
+POLL_BACKOFF_MAX = 10.0
+
+# 扫码状态通道中的状态值
+QR_STATUS_SCANNED = 1  # 已扫码，等待手机确认
+QR_STATUS_CANCELLED = 2  # 已在手机上取消
+
+async def get_qrcode(session: aiohttp.ClientSession):
+    """获取百度登录二维码（上游故障时重试，熔断期间抛出 CircuitOpenError）"""
     url = f"https://passport.baidu.com/v2/api/getqrcode?lp=pc&qrloginfrom=pc&apiver=v3&tt={int(time.time()*1000)}&tpl=netdisk"
     
-    async with aiohttp.ClientSession() as session:
+    async def request():
         async with session.get(url) as response:
-            if response.status == 200:
-                data = await response.json()
-                if 'imgurl' in data and 'sign' in data:
-                    imgurl = data['imgurl']
-                    if not imgurl.startswith('https://'):
-                        imgurl = 'https://' + imgurl
-                    return {
-                        'qrcode_url': imgurl,
-                        'sign': data['sign']
-                    }
+            check_status(PASSPORT_UPSTREAM, response)
+            return await response.json(content_type=None)
+    
+    data = await call_upstream(PASSPORT_UPSTREAM, request)
+    if 'imgurl' in data and 'sign' in data:
+        imgurl = data['imgurl']
+        if not imgurl.startswith('https://'):
+            imgurl = 'https://' + imgurl
+        return {
+            'qrcode_url': imgurl,
+            'sign': data['sign']
+        }
     return None
 
-async def get_bduss(sign: str):
-    """获取BDUSS"""
+async def poll_channel(session: aiohttp.ClientSession, sign: str, timeout: Optional[float] = None) -> Optional[dict]:
+    """
+    长轮询扫码状态通道，服务端在状态变化或超时后才返回
+    :param session: HTTP会话
+    :param sign: 二维码标识
+    :param timeout: 本次请求的最长等待时间（秒），为空时使用会话默认超时
+    :return: 状态内容（如 {"status": 0, "v": BDUSS}），没有新状态时返回 None
+    """
     url = f"https://passport.baidu.com/channel/unicast?channel_id={sign}&gid=9CBA674-2B66-430E-B271-791EA309B0A4&tpl=netdisk&_sdkFrom=1&apiver=v3&tt={int(time.time()*1000)}"
+    request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
     
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status == 200:
-                data = await response.json()
-                if 'channel_v' in data:
-                    try:
-                        channel_v = json.loads(data['channel_v'])
-                        if 'v' in channel_v:
-                            return channel_v['v']
-                    except json.JSONDecodeError:
-                        pass
+    async with session.get(url, timeout=request_timeout) as response:
+        if response.status != 200:
+            return None
+        # 长轮询超时时可能返回非JSON类型或空内容，都视为本次没有新状态
+        try:
+            data = await response.json(content_type=None)
+        except ValueError:
+            return None
+    if not isinstance(data, dict) or not isinstance(data.get('channel_v'), str):
+        return None
+    try:
+        channel_v = json.loads(data['channel_v'])
+    except json.JSONDecodeError:
+        return None
+    return channel_v if isinstance(channel_v, dict) else None
+
+async def get_bduss(session: aiohttp.ClientSession, sign: str, timeout: Optional[float] = None):
+    """获取BDUSS（扫码并确认后才有）"""
+    channel_v = await poll_channel(session, sign, timeout)
+    if channel_v and 'v' in channel_v:
+        return channel_v['v']
     return None
 
-async def get_cookie_by_bduss(bduss: str):
-    """通过BDUSS获取完整Cookie"""
-    cookies = {}  # 使用字典存储cookie，避免重复
+async def get_cookie_by_bduss(client: HttpClient, bduss: str) -> Optional[Tuple[str, Optional[float]]]:
+    """
+    通过BDUSS获取完整Cookie
+    :param client: 共享HTTP客户端，登录过程使用独立的Cookie容器
+    :param bduss: 扫码确认后得到的BDUSS
+    :return: (网盘Cookie字符串, BDUSS过期时间戳)，失败时返回 None
+    """
+    jar = aiohttp.CookieJar()
     
-    async with aiohttp.ClientSession() as session:
-        # 第一步：通过BDUSS获取初始Cookie
-        url = f"https://passport.baidu.com/v3/login/main/qrbdusslogin?v={int(time.time()*1000)}&bduss={bduss}&loginVersion=v5&qrcode=1&tpl=netdisk&apiver=v3&tt={int(time.time()*1000)}"
-        headers = {"BDUSS": bduss}
-        
-        try:
-            async with session.get(url, headers=headers, allow_redirects=False) as response:
-                # 收集第一次请求的Cookie
-                for cookie in response.cookies.values():
-                    cookies[cookie.key] = cookie.value
-                
-                # 如果有重定向，跟随重定向
-                while response.status in (301, 302, 303, 307, 308):
-                    redirect_url = response.headers.get('Location')
-                    if not redirect_url:
-                        break
-                        
-                    # 确保URL是完整的
-                    if not redirect_url.startswith('http'):
-                        redirect_url = f"https://passport.baidu.com{redirect_url}"
-                    
-                    # 构建新的Cookie头
-                    cookie_header = '; '.join([f"{k}={v}" for k, v in cookies.items()])
-                    headers = {"Cookie": cookie_header}
-                    
-                    # 跟随重定向
-                    async with session.get(redirect_url, headers=headers, allow_redirects=False) as redirect_response:
-                        # 收集重定向过程中的Cookie
-                        for cookie in redirect_response.cookies.values():
-                            cookies[cookie.key] = cookie.value
-                        response = redirect_response
+    async def login():
+        async with client.cookie_session(jar) as session:
+            # 第一步：通过BDUSS登录，重定向过程中的Cookie按域名和路径保存在容器中
+            url = f"https://passport.baidu.com/v3/login/main/qrbdusslogin?v={int(time.time()*1000)}&bduss={bduss}&loginVersion=v5&qrcode=1&tpl=netdisk&apiver=v3&tt={int(time.time()*1000)}"
+            async with session.get(url, headers={"BDUSS": bduss}, max_redirects=LOGIN_MAX_REDIRECTS) as response:
+                await response.read()
             
-            # 第二步：访问网盘主页获取额外Cookie
-            main_url = "https://pan.baidu.com/disk/main"
-            cookie_header = '; '.join([f"{k}={v}" for k, v in cookies.items()])
-            headers = {"Cookie": cookie_header}
+            # 第二步：访问网盘主页获取网盘域名下的Cookie（如STOKEN）
+            async with session.get(PAN_MAIN_URL, max_redirects=LOGIN_MAX_REDIRECTS) as response:
+                await response.read()
+    
+    try:
+        # BDUSS 换取Cookie只尝试一次，受熔断和总期限约束
+        await call_upstream(PASSPORT_UPSTREAM, login, idempotent=False)
+        
+        # 只取访问网盘时会携带的Cookie，同名Cookie以网盘域名下的为准
+        cookies = jar.filter_cookies(URL(PAN_MAIN_URL))
+        
+        # 验证是否包含必要的Cookie
+        missing = [name for name in REQUIRED_COOKIES if name not in cookies]
+        if missing:
+            logger.error(f"获取的Cookie不完整，缺少必要字段: {', '.join(missing)}")
+            return None
+        
+        logger.info("成功获取完整Cookie，包含BDUSS和STOKEN")
+        cookie_str = '; '.join(f"{name}={morsel.value}" for name, morsel in cookies.items())
+        return cookie_str, cookie_expiry(jar, 'BDUSS')
+        
+    except Exception as e:
+        logger.error(f"获取Cookie过程出错: {str(e)}")
+        return None
+
+def cookie_expiry(jar: aiohttp.CookieJar, name: str) -> Optional[float]:
+    """从Cookie容器中读取指定Cookie的过期时间戳，未设置时返回 None"""
+    for morsel in jar:
+        if morsel.key != name:
+            continue
+        if morsel['max-age']:
+            try:
+                return time.time() + int(morsel['max-age'])
+            except ValueError:
+                pass
+        if morsel['expires']:
+            return http2time(morsel['expires'])
+    return None
+
+def build_qr_keyboard(sign: str) -> InlineKeyboardMarkup:
+    """二维码消息的按钮"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔄 刷新二维码", callback_data=CallbackRegistry.pack(CALLBACK_PREFIX, "refresh")),
+        InlineKeyboardButton("❌ 取消", callback_data=CallbackRegistry.pack(CALLBACK_PREFIX, f"cancel:{sign}"))
+    ]])
+
+def build_refresh_keyboard() -> InlineKeyboardMarkup:
+    """只有刷新按钮"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔄 刷新二维码", callback_data=CallbackRegistry.pack(CALLBACK_PREFIX, "refresh"))
+    ]])
+
+def build_qr_text(qrcode_url: str) -> str:
+    """二维码消息的文本"""
+    return (
+        f"请使用百度网盘APP扫描二维码登录\n"
+        f"二维码链接：{qrcode_url}\n\n"
+        f"扫码并确认登录后将自动获取Cookie（{COOKIE_QR_TIMEOUT}秒内有效）"
+    )
+
+class MessageGone(Exception):
+    """二维码消息已被删除，无需继续等待"""
+
+async def edit_login_message(outbox: Outbox, message, text: str, **kwargs):
+    """通过发送队列更新二维码消息，消息已不存在时抛出 MessageGone"""
+    try:
+        await outbox.edit_text(message, text, **kwargs)
+    except BadRequest as e:
+        raise MessageGone(str(e)) from e
+
+class LoginWatchers:
+    """
+    扫码登录的后台任务：同一个二维码只有一个任务，
+    同一条消息刷新二维码时取消旧二维码的任务，任务结束后自动移除
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._by_message: Dict[tuple, str] = {}
+
+    def start(self, sign: str, message_key: tuple, factory) -> asyncio.Task:
+        """
+        为二维码启动等待任务（已在运行时直接返回）
+        :param sign: 二维码标识
+        :param message_key: (chat_id, message_id)
+        :param factory: 返回等待协程的函数
+        """
+        previous = self._by_message.get(message_key)
+        if previous is not None and previous != sign:
+            self.cancel(previous)
+        task = self._tasks.get(sign)
+        if task is None or task.done():
+            task = asyncio.create_task(factory())
+            self._tasks[sign] = task
+            task.add_done_callback(lambda done: self._forget(sign, message_key, done))
+        self._by_message[message_key] = sign
+        return task
+
+    def cancel(self, sign: str) -> bool:
+        """取消二维码的等待任务"""
+        task = self._tasks.get(sign)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    def _forget(self, sign: str, message_key: tuple, task: asyncio.Task):
+        if self._tasks.get(sign) is task:
+            del self._tasks[sign]
+        if self._by_message.get(message_key) == sign:
+            del self._by_message[message_key]
+
+    def __contains__(self, sign: str):
+        task = self._tasks.get(sign)
+        return task is not None and not task.done()
+
+    def __len__(self):
+        return len(self._tasks)
+
+login_watchers = LoginWatchers()
+
+async def watch_login(outbox: Outbox, client: HttpClient, message, sign: str, user_id: int):
+    """
+    后台等待扫码：长轮询扫码状态，扫码确认后立即获取并推送Cookie，同时按账号缓存；
+    二维码过期、手机端取消或消息被删除时结束
+    """
+    session = client.session
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + COOKIE_QR_TIMEOUT
+    backoff = POLL_BACKOFF_MIN
+    scanned = False
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                logger.info(f"二维码已过期: {sign}")
+                await edit_login_message(
+                    outbox, message,
+                    "⌛ 二维码已过期，点击下方按钮重新获取",
+                    reply_markup=build_refresh_keyboard()
+                )
+                return
             
-            async with session.get(main_url, headers=headers, allow_redirects=True) as response:
-                # 收集网盘页面的Cookie
-                for cookie in response.cookies.values():
-                    cookies[cookie.key] = cookie.value
+            started = loop.time()
+            try:
+                channel_v = await poll_channel(session, sign, min(COOKIE_POLL_TIMEOUT, remaining))
+            except asyncio.TimeoutError:
+                # 长轮询到时没有新状态，立即发起下一次
+                continue
+            except aiohttp.ClientError as e:
+                logger.debug("轮询扫码状态出错: %s，%s秒后重试", e, backoff)
+                await asyncio.sleep(min(backoff, remaining))
+                backoff = min(backoff * 2, POLL_BACKOFF_MAX)
+                continue
             
-            # 构建最终的Cookie字符串
-            cookie_str = '; '.join([f"{k}={v}" for k, v in cookies.items()])
+            if channel_v:
+                backoff = POLL_BACKOFF_MIN
+                if channel_v.get('v'):
+                    bduss = channel_v['v']
+                    break
+                status = channel_v.get('status')
+                if status == QR_STATUS_CANCELLED:
+                    await edit_login_message(
+                        outbox, message,
+                        "❌ 已在手机上取消登录",
+                        reply_markup=build_refresh_keyboard()
+                    )
+                    return
+                if status == QR_STATUS_SCANNED and not scanned:
+                    scanned = True
+                    await edit_login_message(
+                        outbox, message,
+                        "📱 已扫码，请在手机上确认登录",
+                        reply_markup=build_qr_keyboard(sign)
+                    )
+                continue
             
-            # 验证是否包含必要的Cookie
-            required_cookies = ['BDUSS', 'STOKEN']
-            if all(cookie in cookie_str for cookie in required_cookies):
-                logger.info("成功获取完整Cookie，包含BDUSS和STOKEN")
-                return cookie_str
-            else:
-                logger.error("获取的Cookie不完整，缺少必要字段")
-                return None
-                
+            # 通道立即返回空结果时退避，避免空转
+            if loop.time() - started < POLL_BACKOFF_MIN:
+                await asyncio.sleep(min(backoff, remaining))
+                backoff = min(backoff * 2, POLL_BACKOFF_MAX)
+        
+        await edit_login_message(outbox, message, "🔄 已确认登录，正在获取Cookie...")
+        login = await get_cookie_by_bduss(client, bduss)
+        if not login:
+            await edit_login_message(
+                outbox, message,
+                "❌ 获取Cookie失败，请重试",
+                reply_markup=build_refresh_keyboard()
+            )
+            return
+        cookie, expires_at = login
+        
+        # 缓存Cookie，同一账号下次获取时无需扫码（无法确认账号时不缓存）
+        entry = None
+        try:
+            account = await probe_cookie(session, cookie)
+            if account:
+                entry = cookie_cache.put(user_id, account, cookie, expires_at)
         except Exception as e:
-            logger.error(f"获取Cookie过程出错: {str(e)}")
-            return None
+            logger.warning(f"获取账号信息失败，本次Cookie不缓存: {str(e)}")
+        
+        # 推送Cookie
+        await edit_login_message(
+            outbox, message,
+            "✅ 获取Cookie成功！\n"
+            f"{format_entry(entry)}\n"
+            f"<code>{cookie}</code>",
+            parse_mode='HTML'
+        )
+        logger.info("✅ 扫码登录完成，已推送Cookie")
+    except MessageGone as e:
+        logger.info(f"二维码消息已不存在，停止等待扫码: {str(e)}")
+    except asyncio.CancelledError:
+        logger.debug("已取消等待扫码: %s", sign)
+        raise
+    except Exception as e:
+        logger.error(f"等待扫码登录时出错: {str(e)}")
+
+def start_login_watch(context: ContextTypes.DEFAULT_TYPE, message, sign: str, user_id: int) -> asyncio.Task:
+    """为二维码消息启动后台等待任务"""
+    client = get_http_client(context)
+    outbox = get_outbox(context)
+    return login_watchers.start(
+        sign,
+        (message.chat_id, message.message_id),
+        lambda: watch_login(outbox, client, message, sign, user_id)
+    )
+
+def format_entry(entry: Optional[CookieEntry]) -> str:
+    """缓存账号的说明文字"""
+    if entry is None:
+        return ""
+    return (
+        f"账号：{html.escape(entry.username)}\n"
+        f"有效期至：{time.strftime('%Y-%m-%d %H:%M', time.localtime(entry.expires_at))}\n"
+    )
 
-@CommandRegistry.register(command="cookie", description="获取百度网盘Cookie", is_admin=True)
+@CommandRegistry.register(command="cookie", description="获取百度网盘Cookie", is_admin=True, rate="3/min", burst=1)
 async def cookie_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 /cookie 命令"""
     try:
         user = update.effective_user
         logger.info(f"用户 {user.first_name} 请求获取Cookie")
         
+        # 同一账号已有有效的缓存Cookie时直接返回，不再扫码
+        username = ' '.join(context.args) if context.args else None
+        entry = await cookie_cache.lookup(get_http_session(context), user.id, username)
+        if entry is not None:
+            logger.info(f"使用缓存的Cookie，账号: {entry.username}")
+            await update.message.reply_text(
+                "✅ 使用已缓存的Cookie\n"
+                f"{format_entry(entry)}\n"
+                f"<code>{entry.cookie}</code>",
+                parse_mode='HTML',
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔄 重新扫码登录", callback_data=CallbackRegistry.pack(CALLBACK_PREFIX, "refresh"))
+                ]])
+            )
+            return
+        if username:
+            await update.message.reply_text(f"未找到账号 {username} 的有效Cookie，请扫码登录")
+        
         # 获取二维码
-        qr_data = await get_qrcode()
+        qr_data = await get_qrcode(get_http_session(context))
         if not qr_data:
             await update.message.reply_text("❌ 获取二维码失败，请重试")
             return
         
-        # 创建二维码消息
-        keyboard = [[
-            InlineKeyboardButton("🔄 刷新二维码", callback_data=f"refresh_qr"),
-            InlineKeyboardButton("✅ 检查状态", callback_data=f"check_status:{qr_data['sign']}")
-        ]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         # 发送二维码和说明
         message = await update.message.reply_text(
-            "🔄 正在获取二维码...\n"
-            "请使用百度网盘APP扫描二维码登录\n"
-            "登录后点击「检查状态」按钮获取Cookie",
-            reply_markup=reply_markup
+            build_qr_text(qr_data['qrcode_url']),
+            reply_markup=build_qr_keyboard(qr_data['sign'])
         )
         
-        # 发送二维码图片
-        await message.edit_text(
-            f"请使用百度网盘APP扫描二维码登录\n"
-            f"二维码链接：{qr_data['qrcode_url']}\n\n"
-            f"登录后点击「检查状态」按钮获取Cookie",
-            reply_markup=reply_markup
-        )
+        # 后台等待扫码，完成后自动推送Cookie
+        start_login_watch(context, message, qr_data['sign'], user.id)
         
     except Exception as e:
         error_msg = f"获取Cookie时出错: {str(e)}"
         logger.error(error_msg)
+        mark_error()
         await update.message.reply_text(f"❌ {error_msg}")
 
-async def cookie_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@CallbackRegistry.register(CALLBACK_PREFIX, rate="12/min", burst=3)
+async def cookie_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload: str):
     """处理Cookie相关的回调查询"""
     try:
         query = update.callback_query
@@ -162,63 +417,53 @@ async def cookie_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.answer("❌ 该操作仅管理员可用")
             return
         
-        if query.data == "refresh_qr":
+        action, _, arg = payload.partition(":")
+        
+        if action == "refresh":
+            set_action(action)
             # 刷新二维码
-            qr_data = await get_qrcode()
+            qr_data = await get_qrcode(get_http_session(context))
             if not qr_data:
                 await query.answer("❌ 获取二维码失败")
                 return
                 
-            keyboard = [[
-                InlineKeyboardButton("🔄 刷新二维码", callback_data=f"refresh_qr"),
-                InlineKeyboardButton("✅ 检查状态", callback_data=f"check_status:{qr_data['sign']}")
-            ]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
             await query.message.edit_text(
-                f"请使用百度网盘APP扫描二维码登录\n"
-                f"二维码链接：{qr_data['qrcode_url']}\n\n"
-                f"登录后点击「检查状态」按钮获取Cookie",
-                reply_markup=reply_markup
+                build_qr_text(qr_data['qrcode_url']),
+                reply_markup=build_qr_keyboard(qr_data['sign'])
             )
             
-        elif query.data.startswith("check_status:"):
-            # 检查登录状态
-            sign = query.data.split(":")[1]
-            await query.answer("🔄 正在检查登录状态...")
+            # 同一条消息上旧二维码的等待任务会被取消
+            start_login_watch(context, query.message, qr_data['sign'], user.id)
             
-            # 获取BDUSS
-            bduss = await get_bduss(sign)
-            if not bduss:
-                await query.message.edit_text(
-                    "❌ 未检测到登录，请重新扫码\n"
-                    "点击下方按钮刷新二维码",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔄 刷新二维码", callback_data="refresh_qr")
-                    ]])
-                )
-                return
-            
-            # 获取完整Cookie
-            cookie = await get_cookie_by_bduss(bduss)
-            if not cookie:
-                await query.message.edit_text("❌ 获取Cookie失败，请重试")
-                return
-            
-            # 发送Cookie
+        elif action == "cancel":
+            set_action(action)
+            # 取消等待扫码
+            login_watchers.cancel(arg)
             await query.message.edit_text(
-                "✅ 获取Cookie成功！\n\n"
-                f"<code>{cookie}</code>",
-                parse_mode='HTML'
+                "已取消扫码登录",
+                reply_markup=build_refresh_keyboard()
             )
             
+        elif action == "check":
+            set_action(action)
+            # 旧版本消息上的「检查状态」按钮（见 legacy_check_callback）：改为后台等待
+            start_login_watch(context, query.message, arg, user.id)
+            await query.answer("⏳ 正在后台等待扫码，完成后会自动推送Cookie")
+            return
+            
         await query.answer()
         
     except Exception as e:
         logger.error(f"处理Cookie回调时出错: {str(e)}")
+        mark_error()
         await query.answer("❌ 操作失败，请重试")
 
-# 注册回调处理器
-def setup_cookie_handlers(application):
-    """设置Cookie相关的处理器"""
-    application.add_handler(CallbackQueryHandler(cookie_callback, pattern="^(refresh_qr|check_status:)")) 
\ No newline at end of file
+@CallbackRegistry.register(LEGACY_REFRESH_PREFIX, rate="12/min", burst=3)
+async def legacy_refresh_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload: str):
+    """旧版本消息上的「刷新二维码」按钮，按新的回调处理"""
+    await cookie_callback(update, context, "refresh")
+
+@CallbackRegistry.register(LEGACY_CHECK_PREFIX, rate="12/min", burst=3)
+async def legacy_check_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload: str):
+    """旧版本消息上的「检查状态」按钮，payload 为二维码的 sign"""
+    await cookie_callback(update, context, f"check:{payload}")
@@ -8,8 +8,4 @@ async def hello_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 @CommandRegistry.register(command="weather", description="查看天气")
 async def weather_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("🌤 今天天气真不错！")
-
-@CommandRegistry.register(command="admin", description="管理员命令", is_admin=True)
-async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("这是管理员命令！") 
\ No newline at end of file
+    await update.message.reply_text("🌤 今天天气真不错！") 
\ No newline at end of file
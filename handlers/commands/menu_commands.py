@@ -3,7 +3,7 @@ from telegram.ext import ContextTypes
 from utils.decorators import CommandRegistry
 from utils.logger import setup_logger
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 # 定义菜单命令列表
 COMMANDS = [
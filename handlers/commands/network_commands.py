@@ -2,131 +2,124 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from utils.decorators import CommandRegistry
 from utils.logger import setup_logger
-import asyncio
-import platform
+from utils.outbox import get_outbox
+from utils.probe import ProbeResult, probe_many
+import ipaddress
 import re
-from config.config import PING_ENABLED
+from config.config import (
+    PING_ENABLED,
+    PING_METHOD,
+    PING_COUNT,
+    PING_TIMEOUT,
+    PING_INTERVAL,
+    PING_TCP_PORT,
+    PING_MAX_HOSTS,
+)
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
-async def async_ping(host, count=4):
-    """异步执行ping命令"""
-    try:
-        # 根据操作系统选择ping命令参数
-        if platform.system().lower() == "windows":
-            cmd = f"ping -n {count} {host}"
-        else:
-            cmd = f"ping -c {count} {host}"
-        
-        # 执行ping命令
-        process = await asyncio.create_subprocess_shell(
-            cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+async def async_ping(hosts, count=PING_COUNT):
+    """并发探测多个主机（进程内完成，不创建子进程）"""
+    return await probe_many(
+        hosts,
+        count=count,
+        timeout=PING_TIMEOUT,
+        interval=PING_INTERVAL,
+        method=PING_METHOD,
+        port=PING_TCP_PORT
+    )
+
+def format_probe_result(result: ProbeResult) -> str:
+    """格式化单个主机的探测结果（与 ping 的统计输出一致）"""
+    if result.error:
+        return f"❌ {result.host}\n错误信息：{result.error}"
+    status = "✅" if result.received else "❌"
+    text = (
+        f"{status} {result.host} ({result.address}) [{result.method}]\n"
+        f"{result.sent} 次发送, {result.received} 次接收, {result.loss:.0f}% 丢包"
+    )
+    if result.received:
+        text += (
+            f"\nrtt min/avg/max/mdev = "
+            f"{result.min:.3f}/{result.avg:.3f}/{result.max:.3f}/{result.mdev:.3f} ms"
         )
-        
-        stdout, stderr = await process.communicate()
-        
-        if process.returncode == 0:
-            return True, stdout.decode()
-        else:
-            return False, stderr.decode()
-            
-    except Exception as e:
-        return False, str(e)
+    return text
 
 def is_valid_domain(domain):
-    """验证域名格式"""
+    """验证域名或IP地址格式"""
+    try:
+        ipaddress.ip_address(domain)
+        return True
+    except ValueError:
+        pass
     pattern = r'^([a-zA-Z0-9]([a-zA-Z0-9\-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}$'
     return bool(re.match(pattern, domain))
 
 @CommandRegistry.register(
     command="ping", 
-    description="Ping指定域名", 
+    description="Ping指定域名（可同时多个）", 
     is_admin=True,  # 设置为管理员命令
-    enabled=PING_ENABLED  # 使用配置控制是否启用
+    enabled=PING_ENABLED,  # 使用配置控制是否启用
+    rate="3/min",  # 每用户每分钟最多3次
+    burst=1
 )
 async def ping_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 /ping 命令"""
     try:
+        outbox = get_outbox(context)
         user = update.effective_user
         
         # 检查是否提供了域名参数
         if not context.args:
-            await update.message.reply_text(
+            await outbox.reply(
+                update.message,
                 "❌ 请提供要ping的域名\n"
-                "例如: /ping google.com"
+                "例如: /ping google.com\n"
+                f"可同时提供最多 {PING_MAX_HOSTS} 个域名或IP，用空格分隔"
             )
             return
         
-        domain = context.args[0].lower()
+        domains = list(dict.fromkeys(arg.lower() for arg in context.args))
+        if len(domains) > PING_MAX_HOSTS:
+            await outbox.reply(update.message, f"❌ 一次最多 ping {PING_MAX_HOSTS} 个主机")
+            return
         
         # 验证域名格式
-        if not is_valid_domain(domain):
-            await update.message.reply_text(
-                "❌ 无效的域名格式\n"
-                "请输入正确的域名，例如: google.com"
+        invalid = [domain for domain in domains if not is_valid_domain(domain)]
+        if invalid:
+            await outbox.reply(
+                update.message,
+                f"❌ 无效的域名格式: {' '.join(invalid)}\n"
+                "请输入正确的域名或IP，例如: google.com"
             )
             return
         
-        logger.info(f"🔍 用户 {user.first_name} 请求 ping {domain}")
+        targets = ' '.join(domains)
+        logger.info(f"🔍 用户 {user.first_name} 请求 ping {targets}")
         
         # 发送等待消息
-        message = await update.message.reply_text(
-            f"🔄 正在 ping {domain}...\n"
+        message = await outbox.reply(
+            update.message,
+            f"🔄 正在 ping {targets}...\n"
             "请稍候，这可能需要几秒钟。"
         )
         
         # 执行ping
-        logger.info(f"开始执行 ping {domain}")
-        success, result = await async_ping(domain)
-        logger.info(f"Ping 执行结果: success={success}, result='{result}'")
+        logger.debug("开始执行 ping %s", targets)
+        results = await async_ping(domains)
+        for result in results:
+            logger.debug("Ping 执行结果: %s", result.to_dict())
         
-        # 处理结果
-        if success:
-            # 提取关键信息
-            if platform.system().lower() == "windows":
-                # Windows格式的ping结果处理
-                try:
-                    lines = result.strip().split('\n')
-                    # 获取统计信息（最后四行）
-                    stats = [line for line in lines[-4:] if line.strip()]
-                    response = (
-                        f"✅ Ping {domain} 结果：\n\n"
-                        f"{stats[0]}\n{stats[1]}\n{stats[2]}\n{stats[3]}"
-                    )
-                except Exception as e:
-                    logger.warning(f"处理Windows ping结果时出错: {str(e)}")
-                    response = f"✅ Ping成功，但无法解析详细结果：\n{result}"
-            else:
-                # Linux/Unix格式的ping结果处理
-                try:
-                    lines = result.strip().split('\n')
-                    # 获取统计信息（最后两行）
-                    stats = [line for line in lines[-2:] if line.strip()]
-                    response = (
-                        f"✅ Ping {domain} 结果：\n\n"
-                        f"{stats[0]}\n{stats[1]}"
-                    )
-                except Exception as e:
-                    logger.warning(f"处理Unix ping结果时出错: {str(e)}")
-                    response = f"✅ Ping成功，但无法解析详细结果：\n{result}"
-        else:
-            # 记录失败原因
-            logger.error(f"Ping失败，原因: {result}")
-            response = (
-                f"❌ Ping {domain} 失败\n"
-                f"错误信息：{result}"
-            )
+        response = "\n\n".join(format_probe_result(result) for result in results)
         
         # 使用代码块格式化输出
         formatted_response = f"```\n{response}\n```"
         
         # 更新消息
-        await message.edit_text(formatted_response, parse_mode='Markdown')
-        logger.info(f"✨ 已发送 ping {domain} 结果给用户 {user.first_name}")
+        await outbox.edit_text(message, formatted_response, parse_mode='Markdown')
+        logger.info(f"✨ 已发送 ping {targets} 结果给用户 {user.first_name}")
         
     except Exception as e:
         error_msg = f"执行ping命令时出错: {str(e)}"
         logger.error(error_msg)
-        await update.message.reply_text(f"❌ {error_msg}") 
\ No newline at end of file
+        await get_outbox(context).reply(update.message, f"❌ {error_msg}") 
\ No newline at end of file
@@ -1,13 +1,41 @@
 from telegram.ext import Application
-from config.config import BOT_TOKEN, PROXY_URL, PROXY_ENABLED
+from config.config import (
+    BOT_TOKEN,
+    PROXY_URL,
+    PROXY_ENABLED,
+    BOT_MODE,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_WORKERS,
+    WEBHOOK_MAX_CONNECTIONS,
+    VERSION_CHECK_ENABLED,
+    METRICS_ENABLED,
+    METRICS_LISTEN,
+    METRICS_PORT,
+    UPDATE_CONCURRENCY,
+    UPDATE_MAX_PENDING,
+    BMCL_COLLECT_ENABLED,
+)
 import asyncio
 from utils.logger import setup_logger
 from handlers.command_loader import setup_commands
+from utils.http_client import HttpClient, BOT_DATA_KEY as HTTP_CLIENT_KEY
+from utils.webhook import WebhookServer
+from utils.outbox import Outbox, BOT_DATA_KEY as OUTBOX_KEY
+from utils.metrics import MetricsServer, register_collector
+from utils.tracing import TracingHTTPXRequest
+from utils.update_processor import KeyedUpdateProcessor
+from utils.version_check import check_version
+from utils.bmcl_stats import rank_collector
+from utils.baidu_share import api_backends, crawl_results, share_sessions
+from utils.baidu_cookie import cookie_cache
 import platform
 from httpx import Proxy, Limits
 import signal
-from github import Github
-from packaging import version
 
 # 当前版本号
 CURRENT_VERSION = "v1.0.1"
@@ -18,25 +46,57 @@ logger = setup_logger()
 class TelegramBot:
     def __init__(self):
         self.application = None
+        self.http_client = None
+        self.outbox = None
+        self.webhook_server = None
+        self.metrics_server = None
+        self._version_task = None
         self._stop_event = None
     
     async def check_version(self):
         """检查GitHub上的最新版本"""
+        await check_version(CURRENT_VERSION, GITHUB_REPO)
+    
+    async def start_webhook(self):
+        """以 Webhook 方式接收更新"""
+        if not WEBHOOK_URL:
+            raise ValueError("未配置 WEBHOOK_URL")
+        
+        # 多个实例共用一个反向代理时，默认按机器人ID区分路径
+        path = WEBHOOK_PATH or f"/telegram/{self.application.bot.id}"
+        self.webhook_server = WebhookServer(
+            self.application,
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            path=path,
+            secret_token=WEBHOOK_SECRET or None,
+            queue_size=WEBHOOK_QUEUE_SIZE,
+            workers=WEBHOOK_WORKERS
+        )
+        await self.webhook_server.start()
+        
         try:
-            logger.info("🔍 正在检查最新版本...")
-            g = Github()
-            repo = g.get_repo(GITHUB_REPO)
-            latest_release = repo.get_latest_release()
-            latest_version = latest_release.tag_name
-            
-            if version.parse(latest_version.lstrip('v')) > version.parse(CURRENT_VERSION.lstrip('v')):
-                logger.info(f"📢 发现新版本: {latest_version} (当前版本: {CURRENT_VERSION})")
-                logger.info(f"📝 更新说明: {latest_release.body}")
-                logger.info(f"🔗 下载地址: {latest_release.html_url}")
-            else:
-                logger.info(f"✅ 当前已是最新版本: {CURRENT_VERSION}")
-        except Exception as e:
-            logger.warning(f"⚠️ 版本检查失败: {str(e)}")
+            await self.application.bot.set_webhook(
+                url=f"{WEBHOOK_URL}{path}",
+                allowed_updates=["message", "callback_query"],
+                drop_pending_updates=True,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                secret_token=WEBHOOK_SECRET or None
+            )
+        except Exception:
+            await self.webhook_server.stop()
+            self.webhook_server = None
+            raise
+        logger.info(f"🔗 Webhook 已设置: {WEBHOOK_URL}{path}")
+    
+    async def start_polling(self):
+        """以长轮询方式接收更新"""
+        await self.application.updater.start_polling(
+            allowed_updates=["message", "callback_query"],
+            drop_pending_updates=True,
+            read_timeout=30,
+            pool_timeout=3
+        )
     
     def _signal_handler(self):
         """处理停止信号"""
@@ -49,8 +109,9 @@ class TelegramBot:
         try:
             logger.info("🚀 开始启动机器人...")
             
-            # 检查版本
-            await self.check_version()
+            # 检查版本（后台执行，不阻塞启动）
+            if VERSION_CHECK_ENABLED:
+                self._version_task = asyncio.create_task(self.check_version())
             
             # 代理状态日志
             if PROXY_ENABLED:
@@ -60,35 +121,59 @@ class TelegramBot:
             
             # 创建应用实例
             logger.info("⚙️ 正在创建应用实例...")
-            builder = (
-                Application.builder()
-                .token(BOT_TOKEN)
-                .connection_pool_size(8)  # 增加连接池大小
-                .connect_timeout(30.0)
-                .read_timeout(30.0)
-                .write_timeout(30.0)
-                .pool_timeout(3.0)  # 减小池超时时间
-                .get_updates_connection_pool_size(8)  # 为updates设置单独的连接池
-                .get_updates_read_timeout(30.0)
-                .get_updates_pool_timeout(3.0)
-            )
-            
             # 配置代理
+            proxy = None
             if PROXY_ENABLED and PROXY_URL:
                 proxy = Proxy(
                     url=PROXY_URL,
                     headers={"User-Agent": "python-telegram-bot"}
                 )
-                builder = (
-                    builder
-                    .proxy(proxy)
-                    .get_updates_proxy(proxy)
-                )
+            
+            # 不同用户的更新并发处理，同一用户的更新按顺序处理
+            update_processor = KeyedUpdateProcessor(UPDATE_CONCURRENCY, UPDATE_MAX_PENDING)
+            register_collector("processor", "updates", update_processor.stats)
+            
+            # 请求对象会为 Bot API 调用记录追踪 span（未启用追踪时与 HTTPXRequest 相同）
+            builder = (
+                Application.builder()
+                .token(BOT_TOKEN)
+                .request(TracingHTTPXRequest(
+                    connection_pool_size=8,  # 增加连接池大小
+                    connect_timeout=30.0,
+                    read_timeout=30.0,
+                    write_timeout=30.0,
+                    pool_timeout=3.0,  # 减小池超时时间
+                    proxy=proxy
+                ))
+                .get_updates_request(TracingHTTPXRequest(
+                    connection_pool_size=8,  # 为updates设置单独的连接池
+                    read_timeout=30.0,
+                    pool_timeout=3.0,
+                    proxy=proxy
+                ))
+                .concurrent_updates(update_processor)
+            )
             
             # 构建应用实例
             self.application = builder.build()
             logger.info("✅ 应用实例创建成功")
             
+            # 创建共享HTTP连接池，供各命令模块通过上下文使用
+            self.http_client = HttpClient()
+            await self.http_client.start()
+            self.application.bot_data[HTTP_CLIENT_KEY] = self.http_client
+            
+            # 创建发送队列，发送和编辑消息时遵守 Telegram 的发送频率
+            self.outbox = Outbox(self.application.bot)
+            self.application.bot_data[OUTBOX_KEY] = self.outbox
+            register_collector("outbox", "telegram", self.outbox.stats)
+            
+            # 启动后台任务：分享会话清理、缓存Cookie有效性检查、解析API健康检查
+            share_sessions.start()
+            crawl_results.start()
+            cookie_cache.start(self.http_client.session)
+            api_backends.start(self.http_client.session)
+            
             # 创建停止事件并绑定到应用实例
             self._stop_event = asyncio.Event()
             self.application._stop_event = self._stop_event
@@ -98,19 +183,35 @@ class TelegramBot:
             await setup_commands(self.application)
             logger.info("✅ 命令加载完成")
             
+            # 后台定期采集BMCLAPI节点统计，/bmcl 直接从内存回复
+            if BMCL_COLLECT_ENABLED:
+                rank_collector.schedule(self.application)
+            
+            # 启动本地指标接口
+            if METRICS_ENABLED:
+                self.metrics_server = MetricsServer(METRICS_LISTEN, METRICS_PORT)
+                try:
+                    await self.metrics_server.start()
+                except OSError as e:
+                    logger.error(f"❌ 指标接口启动失败: {str(e)}")
+                    self.metrics_server = None
+            
             logger.info("✨ 机器人启动成功!")
             logger.info("🤖 Bot is running...")
             
-            # 开始轮询
+            # 开始接收更新
             logger.info("📡 开始监听消息...")
             await self.application.initialize()
             await self.application.start()
-            await self.application.updater.start_polling(
-                allowed_updates=["message", "callback_query"],
-                drop_pending_updates=True,
-                read_timeout=30,
-                pool_timeout=3
-            )
+            if BOT_MODE == 'webhook':
+                try:
+                    await self.start_webhook()
+                except Exception as e:
+                    # Webhook 启动失败时回退到长轮询
+                    logger.error(f"❌ Webhook 启动失败，回退到长轮询: {str(e)}")
+                    await self.start_polling()
+            else:
+                await self.start_polling()
             
             # 等待停止信号
             await self._stop_event.wait()
@@ -123,9 +224,26 @@ class TelegramBot:
 
     async def stop(self):
         """停止机器人"""
+        if self._version_task and not self._version_task.done():
+            self._version_task.cancel()
+        
         if self.application:
             logger.info("正在关闭机器人...")
             try:
+                # 停止 Webhook 服务
+                if self.webhook_server:
+                    try:
+                        await asyncio.wait_for(self.webhook_server.stop(), timeout=0.5)
+                    except (asyncio.TimeoutError, Exception) as e:
+                        logger.warning(f"停止 Webhook 服务时出错: {str(e)}")
+                
+                # 停止指标接口
+                if self.metrics_server:
+                    try:
+                        await asyncio.wait_for(self.metrics_server.stop(), timeout=0.5)
+                    except (asyncio.TimeoutError, Exception) as e:
+                        logger.warning(f"停止指标接口时出错: {str(e)}")
+                
                 # 先停止轮询，不等待清理操作完成
                 if self.application.updater and self.application.updater.running:
                     try:
@@ -138,6 +256,13 @@ class TelegramBot:
                     except Exception as e:
                         logger.warning(f"停止轮询时出错: {str(e)}")
                 
+                # 取消未发送的消息
+                if self.outbox:
+                    try:
+                        await asyncio.wait_for(self.outbox.stop(), timeout=0.5)
+                    except (asyncio.TimeoutError, Exception) as e:
+                        logger.warning(f"停止发送队列时出错: {str(e)}")
+                
                 # 停止应用
                 if self.application.running:
                     try:
@@ -159,6 +284,27 @@ class TelegramBot:
                 except (asyncio.TimeoutError, Exception) as e:
                     logger.warning(f"关闭应用时出错: {str(e)}")
                 
+                # 停止后台任务（在关闭HTTP连接池之前）
+                try:
+                    await asyncio.wait_for(
+                        asyncio.gather(
+                            share_sessions.stop(),
+                            crawl_results.stop(),
+                            cookie_cache.stop(),
+                            api_backends.stop()
+                        ),
+                        timeout=0.5
+                    )
+                except (asyncio.TimeoutError, Exception) as e:
+                    logger.warning(f"停止后台任务时出错: {str(e)}")
+                
+                # 关闭HTTP连接池
+                if self.http_client:
+                    try:
+                        await self.http_client.close()
+                    except Exception as e:
+                        logger.warning(f"关闭HTTP连接池时出错: {str(e)}")
+                
                 logger.info("👋 机器人已关闭")
                 
             except Exception as e:
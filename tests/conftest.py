@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# 测试时日志写入临时目录，不在仓库中留下 bot.log
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'mobot-test.log'))
+
+# 直接运行 pytest 时也能导入仓库中的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,23 @@
+from handlers.commands.admin_commands import split_sections
+
+def test_short_sections_share_a_message():
+    assert split_sections(['a\n', 'b\n'], limit=10) == ['a\nb\n']
+
+def test_sections_are_not_split_when_they_fit():
+    assert split_sections(['aaaa\n', 'bbbb\n', 'cc\n'], limit=10) == ['aaaa\nbbbb\n', 'cc\n']
+
+def test_long_section_is_split_by_line():
+    section = 'aaaa\nbbbb\ncccc\n'
+    assert split_sections([section], limit=10) == ['aaaa\nbbbb\n', 'cccc\n']
+
+def test_long_line_is_truncated():
+    messages = split_sections(['x' * 25], limit=10)
+    assert messages == ['x' * 10]
+
+def test_every_message_fits_limit():
+    sections = [f'{i}: ' + 'y' * (i * 7) + '\n' for i in range(30)]
+    messages = split_sections(sections, limit=100)
+    assert all(0 < len(message) <= 100 for message in messages)
+
+def test_empty_sections():
+    assert split_sections([]) == []
@@ -0,0 +1,137 @@
+import asyncio
+import pytest
+import utils.metrics as metrics
+from utils.backends import Backend, BackendPool
+from utils.resilience import UpstreamError
+
+@pytest.fixture(autouse=True)
+def isolated_registry(monkeypatch):
+    monkeypatch.setattr(BackendPool, 'instances', {})
+    monkeypatch.setattr(metrics, '_collectors', {})
+
+def new_pool(*urls, **kwargs):
+    kwargs.setdefault('hedge', False)
+    return BackendPool('api', urls or ('http://a:1', 'http://b:1'), **kwargs)
+
+def test_ewma_weights_recent_latency():
+    backend = Backend('http://a:1', alpha=0.5)
+    assert backend.ewma is None
+    backend.observe(1.0)
+    assert backend.ewma == 1.0
+    backend.observe(3.0)
+    assert backend.ewma == pytest.approx(2.0)
+    backend.in_flight = 2
+    assert backend.load == pytest.approx(6.0)
+
+def test_failures_mark_backend_unhealthy_until_check_passes():
+    backend = Backend('http://a:1')
+    backend.record_failure(max_failures=2)
+    assert backend.healthy
+    backend.record_failure(max_failures=2)
+    assert not backend.healthy
+    assert backend.stats()['up'] == 0
+    backend.set_healthy(True)
+    assert backend.healthy
+    assert backend.consecutive_failures == 0
+
+def test_pick_prefers_healthy_then_fastest():
+    pool = new_pool('http://a:1', 'http://b:1', 'http://c:1')
+    a, b, c = pool.backends
+    a.observe(0.5)
+    b.observe(0.1)
+    c.observe(0.01)
+    c.healthy = False
+    assert pool.pick() is b
+    # 排队中的请求会拉高预计等待时间
+    b.in_flight = 9
+    assert pool.pick() is a
+    assert pool.pick(exclude=[a, b]) is c
+    assert pool.pick(exclude=pool.backends) is None
+
+def test_pick_falls_back_when_all_unhealthy():
+    pool = new_pool()
+    a, b = pool.backends
+    a.healthy = b.healthy = False
+    a.consecutive_failures = 3
+    assert pool.pick() is b
+
+def test_pool_stats_count_healthy_backends():
+    pool = new_pool()
+    pool.backends[0].healthy = False
+    assert pool.stats()['healthy_backends'] == 1
+    assert ('backend', 'api') in metrics._collectors
+    assert ('backend', 'api/a:1') in metrics._collectors
+
+def test_retryable_failure_counts_against_backend():
+    pool = new_pool(max_failures=1)
+
+    async def request(backend):
+        raise UpstreamError(backend.name, 502)
+
+    with pytest.raises(UpstreamError):
+        asyncio.run(pool.call(request))
+    failed = [backend for backend in pool.backends if backend.failures]
+    assert len(failed) == 1 and not failed[0].healthy
+    assert failed[0].in_flight == 0
+
+def test_client_error_keeps_backend_healthy():
+    pool = new_pool(max_failures=1)
+
+    async def request(backend):
+        raise UpstreamError(backend.name, 404)
+
+    with pytest.raises(UpstreamError):
+        asyncio.run(pool.call(request))
+    assert all(backend.healthy and not backend.failures for backend in pool.backends)
+
+def hedged_pool():
+    pool = new_pool(hedge=True, hedge_min_samples=1, hedge_min_delay=0.01)
+    a, b = pool.backends
+    a.observe(0.01)
+    b.observe(0.02)
+    return pool, a, b
+
+def test_slow_primary_is_hedged():
+    """主实例超过 p95 仍未返回时补发到另一实例，先返回的胜出，落败的请求被取消"""
+    pool, a, b = hedged_pool()
+    cancelled = []
+
+    async def request(backend):
+        if backend is a:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(backend)
+                raise
+        return backend.name
+
+    assert asyncio.run(pool.call(request)) == b.name
+    assert (pool.hedged, pool.hedge_wins) == (1, 1)
+    assert cancelled == [a]
+    assert a.in_flight == b.in_flight == 0
+    assert a.failures == 0
+
+def test_fast_primary_is_not_hedged():
+    pool, a, b = hedged_pool()
+    called = []
+
+    async def request(backend):
+        called.append(backend)
+        return backend.name
+
+    assert asyncio.run(pool.call(request)) == a.name
+    assert called == [a]
+    assert pool.hedged == 0
+
+def test_hedge_uses_other_result_when_one_fails():
+    pool, a, b = hedged_pool()
+
+    async def request(backend):
+        if backend is a:
+            await asyncio.sleep(0.05)
+            raise UpstreamError(backend.name, 502)
+        await asyncio.sleep(0.1)
+        return backend.name
+
+    assert asyncio.run(pool.call(request)) == b.name
+    assert a.failures == 1
@@ -0,0 +1,86 @@
+import base64
+import pytest
+from utils.decorators import CallbackRegistry
+from handlers.commands.baidu_commands import (
+    ACTION_CRAWL,
+    ACTION_ENTER_DIR,
+    ACTION_EXPORT,
+    ACTION_EXPORT_CRAWL,
+    ACTION_FILE_INFO,
+    ACTION_PAGE,
+    CALLBACK_PREFIX,
+    CrawlResult,
+    ShareSession,
+    TOKEN_STRUCT,
+)
+from utils.crawler import CrawlStats
+
+ENTRIES = [
+    {'server_filename': 'docs', 'isdir': '1'},
+    {'server_filename': 'a.txt', 'isdir': '0', 'size': '2048'},
+]
+
+def token_of(callback_data: str) -> str:
+    prefix, _, token = callback_data.partition(CallbackRegistry.SEPARATOR)
+    assert prefix == CALLBACK_PREFIX
+    return token
+
+def new_session() -> ShareSession:
+    return ShareSession('abc', '1234', {'list': ENTRIES}, '/', ENTRIES)
+
+@pytest.mark.parametrize('action', [ACTION_ENTER_DIR, ACTION_FILE_INFO, ACTION_CRAWL])
+def test_path_token_round_trip(action):
+    session = new_session()
+    data = session.make_token(action, '/docs')
+    assert len(data.encode('utf-8')) <= 64
+    assert session.resolve_token(token_of(data)) == (action, '/docs', 0)
+
+@pytest.mark.parametrize('action, page', [(ACTION_PAGE, 3), (ACTION_EXPORT, 1), (ACTION_EXPORT_CRAWL, 0)])
+def test_index_token_round_trip(action, page):
+    session = new_session()
+    data = session.make_token(action, page=page)
+    assert session.resolve_token(token_of(data)) == (action, None, page)
+
+def test_same_path_reuses_index():
+    session = new_session()
+    assert session.make_token(ACTION_ENTER_DIR, '/docs') == session.make_token(ACTION_ENTER_DIR, '/docs')
+    assert len(session.paths) == 1
+
+def test_tokens_of_other_sessions_are_rejected():
+    data = new_session().make_token(ACTION_ENTER_DIR, '/docs')
+    assert new_session().resolve_token(token_of(data)) is None
+
+@pytest.mark.parametrize('token', ['', '!!!', 'AAAA', 'A' * 40])
+def test_malformed_tokens_are_rejected(token):
+    assert new_session().resolve_token(token) is None
+
+def test_unknown_path_index_is_rejected():
+    session = new_session()
+    raw = TOKEN_STRUCT.pack(ACTION_ENTER_DIR, session.generation, 99)
+    token = base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+    assert session.resolve_token(token) is None
+
+def test_set_listing_resets_path_table_and_old_tokens():
+    """切换目录后路径表重建，旧目录的按钮失效而不是解析到其他路径"""
+    session = new_session()
+    old = session.make_token(ACTION_ENTER_DIR, '/docs')
+    session.set_listing('/docs', [{'server_filename': 'b.txt', 'isdir': '0', 'size': '1'}])
+    assert session.paths == [] and session.path_index == {}
+    assert session.resolve_token(token_of(old)) is None
+    new = session.make_token(ACTION_FILE_INFO, '/docs/b.txt')
+    assert session.resolve_token(token_of(new)) == (ACTION_FILE_INFO, '/docs/b.txt', 0)
+
+def test_crawl_export_token_survives_navigation():
+    session = new_session()
+    data = session.make_token(ACTION_EXPORT_CRAWL, page=1)
+    session.set_listing('/docs', [])
+    assert session.resolve_token(token_of(data)) == (ACTION_EXPORT_CRAWL, None, 1)
+
+def test_crawl_result_belongs_to_its_session():
+    session = new_session()
+    crawl = CrawlResult(session, '/', [('/a.txt', 2048, 'md5', 0)], CrawlStats())
+    assert session.owns(crawl)
+    session.set_listing('/docs', [])
+    assert session.owns(crawl)
+    assert not new_session().owns(crawl)
+    assert not session.owns(None)
@@ -0,0 +1,90 @@
+import calendar
+from types import SimpleNamespace
+import pytest
+import utils.bmcl_stats as bmcl_stats
+from utils.bmcl_stats import TOTAL, RankCollector, reset_day
+
+# 北京时间 2026-01-02 00:00，即 BMCLAPI 清零的时刻
+MIDNIGHT = calendar.timegm((2026, 1, 1, 16, 0, 0))
+
+@pytest.fixture
+def now(monkeypatch):
+    clock = SimpleNamespace(now=MIDNIGHT + 3600)
+    monkeypatch.setattr(bmcl_stats, 'time', SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+def rank(*nodes):
+    """由 (ID, 流量, 请求次数) 生成排行数据"""
+    return [
+        {'_id': key, 'name': key.upper(), 'isEnabled': True, 'metric': {'bytes': size, 'hits': hits}}
+        for key, size, hits in nodes
+    ]
+
+def test_reset_day_follows_utc_plus_8():
+    assert reset_day(MIDNIGHT - 1) + 1 == reset_day(MIDNIGHT)
+    assert reset_day(MIDNIGHT) == reset_day(MIDNIGHT + 86399)
+
+def test_hourly_detects_midnight_reset_without_decrease(now):
+    """零点后流量已超过清零前的累计值，仍按清零处理"""
+    collector = RankCollector(interval=600)
+    collector.record(rank(('a', 100, 10)), MIDNIGHT - 1200)
+    collector.record(rank(('a', 150, 15)), MIDNIGHT - 600)
+    collector.record(rank(('a', 200, 20)), MIDNIGHT + 600)
+    assert collector.hourly('a') == [
+        (MIDNIGHT - 3600, 50, 5),
+        (MIDNIGHT, 200, 20),
+    ]
+    assert collector.hourly(TOTAL) == collector.hourly('a')
+
+def test_hourly_treats_decrease_as_reset(now):
+    collector = RankCollector(interval=600)
+    collector.record(rank(('a', 500, 50)), MIDNIGHT + 600)
+    collector.record(rank(('a', 30, 3)), MIDNIGHT + 1200)
+    collector.record(rank(('a', 40, 5)), MIDNIGHT + 1800)
+    assert collector.hourly('a') == [(MIDNIGHT, 40, 5)]
+
+def test_hourly_drops_hours_before_window(now):
+    collector = RankCollector(interval=600)
+    collector.record(rank(('a', 0, 0)), MIDNIGHT - 7200)
+    collector.record(rank(('a', 10, 1)), MIDNIGHT - 3000)
+    collector.record(rank(('a', 20, 2)), MIDNIGHT + 600)
+    assert collector.hourly('a', hours=2) == [(MIDNIGHT, 20, 2)]
+
+def test_record_replaces_on_demand_snapshot():
+    """与前一次间隔不到半个采集间隔的快照被下一次覆盖"""
+    collector = RankCollector(interval=600)
+    collector.record(rank(('a', 1, 1)), MIDNIGHT)
+    collector.record(rank(('a', 2, 2)), MIDNIGHT + 600)
+    collector.record(rank(('a', 3, 3)), MIDNIGHT + 660)
+    assert len(collector.history) == 3
+    collector.record(rank(('a', 4, 4)), MIDNIGHT + 720)
+    assert len(collector.history) == 3
+    assert collector.updated_at == MIDNIGHT + 720
+    assert collector.history.snapshot('bytes')['a'] == 4
+
+def test_disabled_nodes_are_skipped_and_totalled():
+    collector = RankCollector(interval=600)
+    data = rank(('a', 10, 1), ('b', 30, 3))
+    data.append({'_id': 'c', 'name': 'C', 'isEnabled': False, 'metric': {'bytes': 99, 'hits': 9}})
+    collector.record(data, MIDNIGHT)
+    assert collector.ranking() == ['b', 'a']
+    assert collector.history.snapshot('bytes')[TOTAL] == 40
+    assert collector.find('b') == 'b'
+    assert 'c' not in collector.names
+
+def test_rank_changes():
+    collector = RankCollector(interval=600)
+    collector.record(rank(('a', 20, 1), ('b', 10, 1)), MIDNIGHT)
+    assert collector.rank_changes() == {}
+    collector.record(rank(('a', 20, 1), ('b', 30, 1), ('c', 5, 1)), MIDNIGHT + 600)
+    assert collector.rank_changes() == {'b': 1, 'a': -1, 'c': None}
+
+def test_fresh_uses_cache_ttl_unless_scheduled(now):
+    collector = RankCollector(interval=600, cache_ttl=60)
+    assert not collector.fresh
+    collector.record(rank(('a', 1, 1)), now.now - 100)
+    assert not collector.fresh
+    collector.scheduled = True
+    assert collector.fresh
+    now.now += 1200
+    assert not collector.fresh
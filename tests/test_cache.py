@@ -0,0 +1,130 @@
+import asyncio
+import time
+import pytest
+from utils.cache import SingleFlight, TTLCache
+
+def test_single_flight_coalesces_concurrent_calls():
+    """同一键的并发请求只回源一次"""
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.run('k', fetch) for _ in range(5)))
+        assert 'k' not in flight
+        return results
+
+    assert asyncio.run(main()) == [1] * 5
+    assert calls == 1
+
+def test_get_caches_until_ttl():
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        return {'value': calls}
+
+    async def main():
+        cache = TTLCache(ttl=60)
+        first = await cache.get('k', fetch)
+        second = await cache.get('k', fetch)
+        return cache, first, second
+
+    cache, first, second = asyncio.run(main())
+    assert first == second == {'value': 1}
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+def test_failed_fetch_is_not_cached():
+    """回源返回 None 或不可缓存的结果时不写入缓存"""
+    async def main():
+        cache = TTLCache(ttl=60, cacheable=lambda result: result.get('code') == 200)
+        assert await cache.get('none', lambda: asyncio.sleep(0)) is None
+        await cache.get('error', lambda: _value({'code': 500}))
+        return cache
+
+    cache = asyncio.run(main())
+    assert len(cache) == 0
+
+def test_stale_value_returned_when_upstream_fails():
+    async def main():
+        cache = TTLCache(ttl=0.01, stale_ttl=60, stale_timeout=1)
+        await cache.get('k', lambda: _value('old'))
+        await asyncio.sleep(0.02)
+
+        async def failing():
+            raise RuntimeError("upstream down")
+
+        value = await cache.get('k', failing)
+        return cache, value
+
+    cache, value = asyncio.run(main())
+    assert value == 'old'
+    assert cache.stats()['stale_hits'] == 1
+
+def test_stale_value_returned_when_upstream_is_slow():
+    async def main():
+        cache = TTLCache(ttl=0.01, stale_ttl=60, stale_timeout=0.01)
+        await cache.get('k', lambda: _value('old'))
+        await asyncio.sleep(0.02)
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return 'new'
+
+        stale = await cache.get('k', slow)
+        # 刷新在后台继续，完成后写入缓存
+        await asyncio.sleep(0.1)
+        return stale, cache.peek('k', allow_stale=True)
+
+    assert asyncio.run(main()) == ('old', 'new')
+
+def test_lru_eviction_by_bytes():
+    cache = TTLCache(ttl=60, max_bytes=30, sizeof=len)
+    cache.set('a', 'x' * 10)
+    cache.set('b', 'x' * 10)
+    cache.peek('a')
+    cache.set('c', 'x' * 15)
+    # b 最近最少使用，先被淘汰
+    assert 'b' not in cache
+    assert 'a' in cache and 'c' in cache
+    assert cache.stats()['bytes'] == 25
+    assert cache.stats()['evictions'] == 1
+
+def test_value_larger_than_budget_is_not_cached():
+    cache = TTLCache(ttl=60, max_bytes=10, sizeof=len)
+    cache.set('a', 'x' * 5)
+    cache.set('big', 'x' * 11)
+    assert 'big' not in cache
+    assert 'a' in cache
+
+def test_contains_has_no_side_effects():
+    """__contains__ 不调整淘汰顺序，也不清理过期条目"""
+    cache = TTLCache(ttl=60, max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert 'a' in cache
+    cache.set('c', 3)
+    assert 'a' not in cache
+
+    expired = TTLCache(ttl=0.01, stale_ttl=0)
+    expired.set('a', 1)
+    time.sleep(0.02)
+    assert 'a' not in expired
+    assert len(expired) == 1
+
+@pytest.mark.parametrize('ttl', [0.0, 60.0])
+def test_peek_respects_ttl(ttl):
+    cache = TTLCache(ttl=ttl)
+    cache.set('k', 'v')
+    time.sleep(0.001)
+    assert cache.peek('k') == ('v' if ttl else None)
+
+async def _value(value):
+    return value
@@ -0,0 +1,51 @@
+import json
+from handlers.command_loader import (
+    MANIFEST_VERSION,
+    generate_manifest,
+    list_command_modules,
+    load_manifest,
+    module_digest,
+)
+
+def test_digest_ignores_line_endings(tmp_path):
+    lf = tmp_path / 'lf.py'
+    crlf = tmp_path / 'crlf.py'
+    lf.write_bytes(b'a = 1\nb = 2\n')
+    crlf.write_bytes(b'a = 1\r\nb = 2\r\n')
+    assert module_digest(str(lf)) == module_digest(str(crlf))
+
+def test_digest_changes_with_source(tmp_path):
+    path = tmp_path / 'module.py'
+    path.write_text('a = 1\n')
+    before = module_digest(str(path))
+    path.write_text('a = 2\n')
+    assert module_digest(str(path)) != before
+
+def test_committed_manifest_is_up_to_date():
+    """提交的清单与命令模块源码一致，否则启动时会退回立即加载"""
+    manifest = load_manifest()
+    assert manifest is not None
+    modules = list_command_modules()
+    assert set(manifest['modules']) == set(modules)
+    for name, path in modules.items():
+        assert manifest['modules'][name]['digest'] == module_digest(path), name
+
+def test_generate_manifest_lists_commands_and_callbacks(tmp_path):
+    output = tmp_path / 'manifest.json'
+    manifest = generate_manifest(str(output))
+    assert load_manifest(str(output)) == manifest
+    commands = {
+        cmd['command']: name
+        for name, entry in manifest['modules'].items()
+        for cmd in entry['commands']
+    }
+    assert commands['bd'] == 'handlers.commands.baidu_commands'
+    assert commands['stats'] == 'handlers.commands.admin_commands'
+    callbacks = manifest['modules']['handlers.commands.cookie_commands']['callbacks']
+    assert {'ck', 'refresh_qr', 'check_status'} <= set(callbacks)
+
+def test_load_manifest_rejects_other_versions(tmp_path):
+    path = tmp_path / 'manifest.json'
+    path.write_text(json.dumps({'version': MANIFEST_VERSION + 1, 'modules': {}}))
+    assert load_manifest(str(path)) is None
+    assert load_manifest(str(tmp_path / 'missing.json')) is None
@@ -0,0 +1,77 @@
+import pytest
+from utils.metrics import (
+    Histogram,
+    METRIC_PREFIX,
+    get_handler_metrics,
+    mark_error,
+    register_collector,
+    render_prometheus,
+    set_action,
+    track,
+)
+
+def test_empty_histogram_quantile_is_zero():
+    assert Histogram().quantile(0.95) == 0.0
+
+def test_quantile_interpolates_within_bucket():
+    histogram = Histogram(bounds=(1.0, 2.0, 4.0))
+    for value in (0.5, 1.5, 1.5, 3.0):
+        histogram.observe(value)
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(6.5)
+    assert histogram.counts == [1, 2, 1, 0]
+    # 第2个样本落在 (1, 2] 桶的一半处
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    # 不超过观测到的最大值
+    assert histogram.quantile(1.0) == pytest.approx(3.0)
+
+def test_quantile_above_last_bound_uses_max():
+    histogram = Histogram(bounds=(1.0,))
+    histogram.observe(5.0)
+    histogram.observe(9.0)
+    assert histogram.counts == [0, 2]
+    assert 1.0 < histogram.quantile(0.99) <= 9.0
+
+def test_quantiles_are_monotonic():
+    histogram = Histogram()
+    for i in range(1, 1001):
+        histogram.observe(i / 1000)
+    values = [histogram.quantile(q) for q in (0.1, 0.5, 0.9, 0.95, 0.99)]
+    assert values == sorted(values)
+    assert values[1] == pytest.approx(0.5, rel=0.1)
+
+def test_track_records_errors_and_actions():
+    with track('callback', 'test_track') as measurement:
+        set_action('page')
+        mark_error()
+    assert measurement.error
+    with pytest.raises(RuntimeError):
+        with track('callback', 'test_track'):
+            raise RuntimeError()
+    metrics = get_handler_metrics('callback', 'test_track')
+    assert (metrics.latency.count, metrics.errors, metrics.in_flight) == (2, 2, 0)
+    action = get_handler_metrics('callback', 'test_track.page')
+    assert (action.latency.count, action.errors) == (1, 1)
+
+def test_prometheus_output():
+    with track('command', 'test_prometheus'):
+        pass
+    register_collector('test', 'one', lambda: {'hits': 1, 'size': 2})
+    register_collector('test', 'two', lambda: {'hits': 3})
+    text = render_prometheus()
+    duration = f"{METRIC_PREFIX}_handler_duration_seconds"
+    assert f'{duration}_count{{kind="command",name="test_prometheus"}} 1' in text
+    assert f'{duration}_bucket{{kind="command",name="test_prometheus",le="+Inf"}} 1' in text
+    # 同名指标只声明一次类型，样本连续输出
+    lines = text.splitlines()
+    hits = f"{METRIC_PREFIX}_test_hits"
+    assert lines.count(f"# TYPE {hits} gauge") == 1
+    start = lines.index(f"# TYPE {hits} gauge")
+    assert lines[start + 1:start + 3] == [f'{hits}{{name="one"}} 1', f'{hits}{{name="two"}} 3']
+
+def test_failing_collector_is_skipped():
+    def broken():
+        raise RuntimeError("boom")
+
+    register_collector('test', 'broken', broken)
+    assert 'name="broken"' not in render_prometheus()
@@ -0,0 +1,145 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from telegram.error import BadRequest, RetryAfter
+import utils.outbox as outbox_module
+from utils.outbox import EDIT_REPLY_MARKUP, EDIT_TEXT, Outbox
+
+class FakeBot:
+    """记录调用的 Bot，可按顺序预设每次调用抛出的异常"""
+
+    def __init__(self, errors=()):
+        self.calls = []
+        self.errors = list(errors)
+
+    async def _call(self, method, **params):
+        self.calls.append((method, params))
+        await asyncio.sleep(0)
+        if self.errors:
+            error = self.errors.pop(0)
+            if error is not None:
+                raise error
+        return SimpleNamespace(method=method, **params)
+
+    async def send_message(self, **params):
+        return await self._call('send_message', **params)
+
+    async def edit_message_text(self, **params):
+        return await self._call(EDIT_TEXT, **params)
+
+    async def edit_message_reply_markup(self, **params):
+        return await self._call(EDIT_REPLY_MARKUP, **params)
+
+def new_outbox(bot, max_retries=3):
+    return Outbox(bot, global_rate='1000/s', chat_rate='1000/s', chat_burst=1000, group_rate='1000/s',
+                  max_retries=max_retries)
+
+def message(chat_id=1, message_id=10):
+    return SimpleNamespace(chat_id=chat_id, message_id=message_id)
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(outbox_module, 'retry_delay', lambda error: 0.001)
+
+def test_pending_edits_are_merged():
+    """尚未发出的编辑只发送最后一次"""
+    async def main():
+        bot = FakeBot()
+        outbox = new_outbox(bot)
+        for text in ('1', '2'):
+            await outbox.edit_text(message(), text, wait=False)
+        await outbox.edit_text(message(), '3')
+        return bot, outbox
+
+    bot, outbox = asyncio.run(main())
+    assert [params['text'] for _, params in bot.calls] == ['3']
+    assert outbox.coalesced == 2
+    assert outbox.sent == 1
+
+def test_markup_edit_keeps_pending_text():
+    async def main():
+        bot = FakeBot()
+        outbox = new_outbox(bot)
+        await outbox.edit_text(message(), 'text', wait=False)
+        await outbox.edit_reply_markup(message(), reply_markup='buttons')
+        return bot
+
+    bot = asyncio.run(main())
+    assert bot.calls == [(EDIT_TEXT, {'text': 'text', 'reply_markup': 'buttons', 'chat_id': 1, 'message_id': 10})]
+
+def test_text_edit_replaces_pending_markup():
+    async def main():
+        bot = FakeBot()
+        outbox = new_outbox(bot)
+        await outbox.edit_reply_markup(message(), reply_markup='buttons', wait=False)
+        await outbox.edit_text(message(), 'text')
+        return bot
+
+    bot = asyncio.run(main())
+    assert bot.calls == [(EDIT_TEXT, {'text': 'text', 'chat_id': 1, 'message_id': 10})]
+
+def test_retry_merges_newer_edit_into_requeued_op():
+    """429 重试前又有新编辑时，重试直接发送最新内容，两个调用方都得到结果"""
+    async def main():
+        bot = FakeBot(errors=[RetryAfter(1)])
+        outbox = new_outbox(bot)
+        first = asyncio.create_task(outbox.edit_text(message(), 'old'))
+        while not bot.calls:
+            await asyncio.sleep(0)
+        second = asyncio.create_task(outbox.edit_text(message(), 'new'))
+        results = await asyncio.gather(first, second)
+        return bot, outbox, results
+
+    bot, outbox, results = asyncio.run(main())
+    assert [params['text'] for _, params in bot.calls] == ['old', 'new']
+    assert results[0] is results[1]
+    assert results[0].text == 'new'
+    assert outbox.retried == 1
+    assert outbox.stats()['queued'] == 0
+
+def test_gives_up_after_max_retries():
+    async def main():
+        bot = FakeBot(errors=[RetryAfter(1)] * 3)
+        outbox = new_outbox(bot, max_retries=2)
+        with pytest.raises(RetryAfter):
+            await outbox.send(1, 'hello')
+        return bot, outbox
+
+    bot, outbox = asyncio.run(main())
+    assert len(bot.calls) == 3
+    assert (outbox.retried, outbox.failed) == (2, 1)
+
+def test_not_modified_counts_as_success():
+    async def main():
+        bot = FakeBot(errors=[BadRequest("Message is not modified")])
+        outbox = new_outbox(bot)
+        return await outbox.edit_text(message(), 'same'), outbox
+
+    result, outbox = asyncio.run(main())
+    assert result is True
+    assert outbox.failed == 0
+
+def test_messages_keep_order_per_chat():
+    async def main():
+        bot = FakeBot()
+        outbox = new_outbox(bot)
+        await asyncio.gather(*(outbox.send(chat_id, str(i)) for i in range(3) for chat_id in (1, 2)))
+        return bot
+
+    bot = asyncio.run(main())
+    for chat_id in (1, 2):
+        texts = [params['text'] for _, params in bot.calls if params['chat_id'] == chat_id]
+        assert texts == ['0', '1', '2']
+
+def test_stop_cancels_pending_callers():
+    async def main():
+        bot = FakeBot()
+        outbox = new_outbox(bot)
+        pending = [asyncio.create_task(outbox.send(1, str(i))) for i in range(3)]
+        await asyncio.sleep(0)
+        await outbox.stop()
+        return await asyncio.gather(*pending, return_exceptions=True), outbox
+
+    results, outbox = asyncio.run(main())
+    assert any(isinstance(result, asyncio.CancelledError) for result in results)
+    assert outbox.stats()['chats'] == 0
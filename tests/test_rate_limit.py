@@ -0,0 +1,61 @@
+import pytest
+from utils.rate_limit import RateLimit, TokenBucketStore, acquire_all, parse_rate
+
+@pytest.mark.parametrize('rate, expected', [
+    ('5/min', (5.0, 60.0)),
+    ('1/s', (1.0, 1.0)),
+    ('100/hour', (100.0, 3600.0)),
+    ('3 / 10s', (3.0, 10.0)),
+    ('0.5/day', (0.5, 86400.0)),
+])
+def test_parse_rate(rate, expected):
+    assert parse_rate(rate) == expected
+
+@pytest.mark.parametrize('rate', ['', '5', '5/fortnight', 'x/min', '/min'])
+def test_parse_rate_rejects_invalid(rate):
+    with pytest.raises(ValueError):
+        parse_rate(rate)
+
+def test_bucket_allows_burst_then_refills():
+    store = TokenBucketStore()
+    refill, capacity = 1.0, 2.0
+    assert store.peek('k', refill, capacity, 0.0)
+    store.take('k', refill, capacity, 0.0)
+    store.take('k', refill, capacity, 0.0)
+    assert not store.peek('k', refill, capacity, 0.0)
+    assert store.wait_time('k', refill, capacity, 0.0) == pytest.approx(1.0)
+    assert store.wait_time('k', refill, capacity, 0.5) == pytest.approx(0.5)
+    assert store.peek('k', refill, capacity, 1.0)
+    # 补满后不会超过容量
+    assert store._level('k', refill, capacity, 100.0) == capacity
+
+def test_sweep_drops_only_full_buckets():
+    store = TokenBucketStore(sweep_interval=1000)
+    store.take('a', 1.0, 1.0, 0.0)
+    store.take('b', 1.0, 1.0, 5.0)
+    assert store.sweep(now=2.0) == 1
+    assert len(store) == 1
+
+def make_limit(name, rate, burst=None):
+    return RateLimit(name, rate, burst, store=TokenBucketStore())
+
+def test_rate_limit_counts_allowed_and_rejected():
+    limit = make_limit('test:count', '1/min', burst=2)
+    assert limit.acquire('user')
+    assert limit.acquire('user')
+    assert not limit.acquire('user')
+    # 不同键使用各自的桶
+    assert limit.acquire('other')
+    assert (limit.allowed, limit.rejected) == (3, 1)
+    assert limit.delay('user') > 0
+
+def test_acquire_all_is_all_or_nothing():
+    """任意一条规则不通过时，其他规则也不消耗令牌"""
+    per_user = make_limit('test:user', '10/min', burst=10)
+    per_chat = make_limit('test:chat', '1/min', burst=1)
+    assert acquire_all([(per_user, 1), (per_chat, -100)])
+    assert not acquire_all([(per_user, 1), (per_chat, -100)])
+    assert per_user.allowed == 1
+    assert per_chat.rejected == 1
+    # per_user 的令牌没有被失败的检查消耗
+    assert per_user.store._buckets[per_user._key(1)][0] == pytest.approx(9.0)
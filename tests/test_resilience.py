@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+import utils.resilience as resilience
+from utils.resilience import CircuitBreaker, CircuitOpenError, UpstreamError, call_upstream
+
+class Clock:
+    """可手动推进的 time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, 'monotonic', clock)
+    return clock
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(CircuitBreaker, 'instances', {})
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker('up', failure_threshold=3, reset_timeout=10)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    # 中间的成功会清零连续失败次数
+    breaker.record_success()
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+    assert breaker.retry_in == pytest.approx(10)
+
+def test_half_open_allows_single_trial(clock):
+    breaker = CircuitBreaker('up', failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # 试探未结束前拒绝其他请求
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+def test_failed_trial_reopens(clock):
+    breaker = CircuitBreaker('up', failure_threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened == 2
+    assert not breaker.allow()
+
+def test_abandoned_trial_is_retried_after_timeout(clock):
+    """试探请求被取消没有结果时，超过 reset_timeout 后再放行一次"""
+    breaker = CircuitBreaker('up', failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    clock.now += 5
+    assert not breaker.allow()
+    clock.now += 5
+    assert breaker.allow()
+
+def failing_request(errors, result='ok'):
+    """依次抛出 errors 中的异常，之后返回 result"""
+    calls = []
+
+    async def request():
+        calls.append(len(calls))
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    return request, calls
+
+def test_call_upstream_retries_retryable_errors():
+    request, calls = failing_request([UpstreamError('up', 502), asyncio.TimeoutError()])
+    result = asyncio.run(call_upstream('up', request, attempts=3, base_delay=0, max_delay=0))
+    assert result == 'ok'
+    assert len(calls) == 3
+    assert CircuitBreaker.instances['up'].state == CircuitBreaker.CLOSED
+
+def test_call_upstream_does_not_retry_client_errors():
+    request, calls = failing_request([UpstreamError('up', 404)])
+    with pytest.raises(UpstreamError):
+        asyncio.run(call_upstream('up', request, attempts=3, base_delay=0, max_delay=0))
+    assert len(calls) == 1
+    # 上游正常响应了 4xx，不计入失败
+    assert CircuitBreaker.instances['up'].failures == 0
+
+def test_call_upstream_tries_non_idempotent_once():
+    request, calls = failing_request([UpstreamError('up', 503)])
+    with pytest.raises(UpstreamError):
+        asyncio.run(call_upstream('up', request, idempotent=False, attempts=3, base_delay=0, max_delay=0))
+    assert len(calls) == 1
+
+def test_call_upstream_rejects_when_open():
+    CircuitBreaker.instances['up'] = breaker = CircuitBreaker('up', failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    request, calls = failing_request([])
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(call_upstream('up', request))
+    assert calls == []
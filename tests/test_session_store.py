@@ -0,0 +1,72 @@
+import asyncio
+import time
+from utils.session_store import SessionStore
+
+def test_idle_sessions_expire_on_get():
+    store = SessionStore(idle_timeout=0.01)
+    store.put(1, 'session')
+    assert store.get(1) == 'session'
+    time.sleep(0.02)
+    assert store.get(1) is None
+    assert store.stats()['expired'] == 1
+    assert len(store) == 0
+
+def test_get_refreshes_idle_timer():
+    store = SessionStore(idle_timeout=0.05)
+    store.put(1, 'session')
+    for _ in range(3):
+        time.sleep(0.03)
+        assert store.get(1) == 'session'
+
+def test_sweep_removes_only_expired():
+    store = SessionStore(idle_timeout=0.02)
+    store.put(1, 'old')
+    time.sleep(0.03)
+    store.put(2, 'new')
+    assert store.sweep() == 1
+    assert 1 not in store
+    assert store.get(2) == 'new'
+
+def test_evicts_least_recently_used_by_count():
+    store = SessionStore(idle_timeout=60, max_entries=2)
+    store.put(1, 'a')
+    store.put(2, 'b')
+    store.get(1)
+    store.put(3, 'c')
+    assert 2 not in store
+    assert 1 in store and 3 in store
+    assert store.stats()['evicted'] == 1
+
+def test_byte_budget_keeps_newest_session():
+    """超出字节预算时淘汰旧会话，刚写入的会话即使单独超出预算也保留"""
+    store = SessionStore(idle_timeout=60, max_bytes=10, sizeof=len)
+    store.put(1, 'x' * 6)
+    store.put(2, 'x' * 6)
+    assert 1 not in store
+    assert store.nbytes == 6
+    store.put(3, 'x' * 20)
+    assert 3 in store
+    assert store.nbytes == 20
+
+def test_put_again_recomputes_size():
+    store = SessionStore(idle_timeout=60, sizeof=len)
+    value = ['a']
+    store.put(1, value)
+    value.extend('bcd')
+    store.put(1, value)
+    assert store.nbytes == 4
+    assert store.pop(1) is value
+    assert store.nbytes == 0
+
+def test_sweeper_runs_until_stopped():
+    async def main():
+        store = SessionStore(idle_timeout=0.01, sweep_interval=0.01)
+        store.put(1, 'session')
+        store.start()
+        await asyncio.sleep(0.05)
+        await store.stop()
+        return store
+
+    store = asyncio.run(main())
+    assert len(store) == 0
+    assert store._sweeper is None
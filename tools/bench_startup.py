@@ -0,0 +1,101 @@
+"""
+启动耗时基准测试
+
+在独立子进程中测量：
+- import: 导入 main 模块的耗时
+- ready: 从进程开始到可以开始轮询（应用构建、连接池创建、命令加载完成）的耗时
+
+用法：
+    python tools/bench_startup.py                      # 使用命令清单（延迟加载）
+    python tools/bench_startup.py --eager              # 忽略清单，立即导入所有命令模块
+    python tools/bench_startup.py --max-ready-ms 800   # 超过阈值时返回非零退出码，可用于防止退化
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_CODE = r'''
+import time
+_t0 = time.perf_counter()
+import asyncio, json, sys
+import main
+_t_import = time.perf_counter()
+
+from telegram.ext import Application
+from handlers import command_loader
+from utils.http_client import HttpClient, BOT_DATA_KEY
+
+if sys.argv[1] == 'eager':
+    command_loader.load_manifest = lambda *args, **kwargs: None
+
+async def ready():
+    application = Application.builder().token(main.BOT_TOKEN).build()
+    http_client = HttpClient()
+    await http_client.start()
+    application.bot_data[BOT_DATA_KEY] = http_client
+    await command_loader.setup_commands(application)
+    t_ready = time.perf_counter()
+    await http_client.close()
+    return t_ready
+
+_t_ready = asyncio.run(ready())
+modules = sorted(name for name in sys.modules if name.startswith('handlers.commands.'))
+print(json.dumps({
+    'import_ms': (_t_import - _t0) * 1000,
+    'ready_ms': (_t_ready - _t0) * 1000,
+    'command_modules': modules,
+}))
+'''
+
+def run_once(mode: str, log_file: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault('BOT_TOKEN', '123456:BENCHMARK')
+    env['LOG_FILE'] = log_file
+    env['LOG_LEVEL'] = 'WARNING'
+    env['VERSION_CHECK_ENABLED'] = 'false'
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD_CODE, mode],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="测量机器人启动耗时")
+    parser.add_argument('--runs', type=int, default=5, help="重复次数，取中位数")
+    parser.add_argument('--eager', action='store_true', help="忽略命令清单，立即导入所有命令模块")
+    parser.add_argument('--max-import-ms', type=float, help="导入耗时阈值（毫秒）")
+    parser.add_argument('--max-ready-ms', type=float, help="就绪耗时阈值（毫秒）")
+    args = parser.parse_args()
+
+    mode = 'eager' if args.eager else 'lazy'
+    with tempfile.TemporaryDirectory() as tmp:
+        samples = [run_once(mode, os.path.join(tmp, 'bench.log')) for _ in range(args.runs)]
+
+    import_ms = statistics.median(s['import_ms'] for s in samples)
+    ready_ms = statistics.median(s['ready_ms'] for s in samples)
+    print(f"模式: {mode}（{args.runs} 次取中位数）")
+    print(f"导入耗时: {import_ms:.1f} ms")
+    print(f"就绪耗时: {ready_ms:.1f} ms")
+    print(f"启动时已导入的命令模块: {len(samples[-1]['command_modules'])}")
+
+    failed = False
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"❌ 导入耗时超过阈值 {args.max_import_ms} ms")
+        failed = True
+    if args.max_ready_ms is not None and ready_ms > args.max_ready_ms:
+        print(f"❌ 就绪耗时超过阈值 {args.max_ready_ms} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional, TypeVar
+import aiohttp
+from utils.logger import setup_logger
+from utils.metrics import Histogram, register_collector
+from utils.resilience import is_retryable, upstream_name
+from config.config import (
+    API_HEALTH_PATH,
+    API_HEALTH_INTERVAL,
+    API_HEALTH_TIMEOUT,
+    API_MAX_FAILURES,
+    API_EWMA_ALPHA,
+    API_HEDGE_ENABLED,
+    API_HEDGE_MIN_SAMPLES,
+    API_HEDGE_MIN_DELAY,
+)
+
+logger = setup_logger(__name__)
+
+T = TypeVar('T')
+
+class Backend:
+    """一个上游实例：延迟滑动平均、延迟直方图、进行中请求数和可用状态"""
+
+    def __init__(self, url: str, alpha: float = API_EWMA_ALPHA):
+        """
+        :param url: 实例地址，如 http://10.0.0.2:5244
+        :param alpha: 延迟滑动平均的权重
+        """
+        self.url = url
+        self.name = upstream_name(url)
+        self.alpha = alpha
+        # 尚无请求记录时为 None，选择时优先尝试
+        self.ewma: Optional[float] = None
+        self.latency = Histogram()
+        self.in_flight = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.checked_at = 0.0
+
+    @property
+    def load(self) -> float:
+        """预计等待时间：平均延迟乘以排队中的请求数"""
+        return (self.ewma or 0.0) * (self.in_flight + 1)
+
+    def observe(self, seconds: float):
+        """记录一次请求耗时"""
+        self.latency.observe(seconds)
+        self.ewma = seconds if self.ewma is None else self.alpha * seconds + (1 - self.alpha) * self.ewma
+
+    def record_success(self, seconds: float):
+        self.requests += 1
+        self.observe(seconds)
+        self.consecutive_failures = 0
+
+    def record_failure(self, max_failures: int):
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.healthy and self.consecutive_failures >= max_failures:
+            self.healthy = False
+            logger.warning(f"🩺 上游实例 {self.name} 连续失败 {self.consecutive_failures} 次，暂停使用")
+
+    def set_healthy(self, healthy: bool):
+        """记录健康检查结果"""
+        self.checked_at = time.time()
+        if healthy:
+            # 偶发失败后检查通过，恢复正常排序
+            self.consecutive_failures = 0
+        if healthy == self.healthy:
+            return
+        self.healthy = healthy
+        if healthy:
+            logger.info(f"🩺 上游实例 {self.name} 已恢复")
+        else:
+            logger.warning(f"🩺 上游实例 {self.name} 健康检查失败，暂停使用")
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            # 单个实例是否可用（0/1），与实例组的 healthy_backends 分开命名
+            'up': int(self.healthy),
+            'ewma_ms': round((self.ewma or 0.0) * 1000),
+            'p95_ms': round(self.latency.quantile(0.95) * 1000),
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'failures': self.failures,
+        }
+
+class BackendPool:
+    """
+    同一服务的多个实例：定期健康检查，每次请求选择可用实例中预计最快的一个；
+    开启对冲时，请求超过该实例的 p95 延迟仍未返回，就向另一实例补发一次，取先成功的结果
+    """
+
+    # 已创建的实例组，按名称索引
+    instances: Dict[str, "BackendPool"] = {}
+
+    def __init__(
+        self,
+        name: str,
+        urls: Iterable[str],
+        health_path: str = API_HEALTH_PATH,
+        health_interval: float = API_HEALTH_INTERVAL,
+        health_timeout: float = API_HEALTH_TIMEOUT,
+        max_failures: int = API_MAX_FAILURES,
+        hedge: bool = API_HEDGE_ENABLED,
+        hedge_min_samples: int = API_HEDGE_MIN_SAMPLES,
+        hedge_min_delay: float = API_HEDGE_MIN_DELAY,
+    ):
+        """
+        :param name: 名称，同时作为整组请求的熔断器名称
+        :param urls: 实例地址列表
+        :param health_path: 健康检查请求的路径
+        :param health_interval: 健康检查间隔（秒）
+        :param health_timeout: 健康检查超时（秒）
+        :param max_failures: 连续失败多少次后暂停使用，直到健康检查通过
+        :param hedge: 是否开启对冲请求
+        :param hedge_min_samples: 实例至少有多少次请求记录后才对冲
+        :param hedge_min_delay: 对冲前的最短等待（秒）
+        """
+        self.name = name
+        self.backends = [Backend(url) for url in urls]
+        if not self.backends:
+            raise ValueError(f"{name} 没有配置任何实例")
+        self.health_path = health_path
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.max_failures = max_failures
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._checker: Optional[asyncio.Task] = None
+        BackendPool.instances[name] = self
+        register_collector("backend", name, self.stats)
+        for backend in self.backends:
+            register_collector("backend", f"{name}/{backend.name}", backend.stats)
+
+    def pick(self, exclude: Iterable[Backend] = ()) -> Optional[Backend]:
+        """
+        选择实例：可用的优先，其次是最近没有失败的，再按预计等待时间；
+        全部不可用时仍返回其中最好的一个，不直接拒绝请求
+        """
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda b: (not b.healthy, b.consecutive_failures, b.load))
+
+    def hedge_delay(self, backend: Backend) -> Optional[float]:
+        """补发前的等待时间（该实例的 p95 延迟），记录不足或未开启对冲时返回 None"""
+        if not self.hedge or len(self.backends) < 2 or backend.latency.count < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, backend.latency.quantile(0.95))
+
+    async def call(self, request: Callable[[Backend], Awaitable[T]]) -> T:
+        """
+        选择实例发起请求，需要时对冲
+        :param request: 向指定实例发起一次请求的函数（需在内部读完响应体，失败时抛出异常）
+        """
+        primary = self.pick()
+        delay = self.hedge_delay(primary)
+        if delay is None:
+            return await self._attempt(primary, request)
+
+        first = asyncio.create_task(self._attempt(primary, request))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                secondary = self.pick(exclude=[primary])
+                if secondary is not None and secondary.healthy:
+                    self.hedged += 1
+                    logger.debug("%s 请求 %s 超过 %.2f 秒，补发到 %s", self.name, primary.name, delay, secondary.name)
+                    tasks.add(asyncio.create_task(self._attempt(secondary, request)))
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            # 先返回的请求胜出，另一个取消（被取消的请求不计入失败）
+            for task in tasks:
+                task.cancel()
+
+    async def _attempt(self, backend: Backend, request: Callable[[Backend], Awaitable[T]]) -> T:
+        backend.in_flight += 1
+        started = time.monotonic()
+        try:
+            result = await request(backend)
+        except asyncio.CancelledError:
+            # 超时或对冲落败被取消：实际耗时至少这么长，计入延迟使慢实例降低优先级
+            backend.observe(time.monotonic() - started)
+            raise
+        except Exception as e:
+            if is_retryable(e):
+                backend.record_failure(self.max_failures)
+            else:
+                # 实例正常响应了（如 4xx），延迟仍然有效
+                backend.record_success(time.monotonic() - started)
+            raise
+        finally:
+            backend.in_flight -= 1
+        backend.record_success(time.monotonic() - started)
+        return result
+
+    def start(self, session: aiohttp.ClientSession):
+        """启动后台健康检查（由应用启动时调用，重复调用无影响）"""
+        self._session = session
+        if self._checker is None or self._checker.done():
+            self._checker = asyncio.get_running_loop().create_task(self._check_loop())
+
+    async def stop(self):
+        """停止后台健康检查"""
+        if self._checker and not self._checker.done():
+            self._checker.cancel()
+            try:
+                await self._checker
+            except asyncio.CancelledError:
+                pass
+        self._checker = None
+
+    async def check(self, backend: Backend) -> bool:
+        """检查一个实例：能连上且没有返回 5xx 即视为可用"""
+        timeout = aiohttp.ClientTimeout(total=self.health_timeout)
+        try:
+            async with self._session.get(backend.url + self.health_path, timeout=timeout) as response:
+                healthy = response.status < 500
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.debug("检查实例 %s 出错: %r", backend.name, e)
+            healthy = False
+        backend.set_healthy(healthy)
+        return healthy
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'backends': len(self.backends),
+            'healthy_backends': sum(backend.healthy for backend in self.backends),
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+        }
+
+    async def _check_loop(self):
+        while True:
+            try:
+                await asyncio.gather(*(self.check(backend) for backend in self.backends))
+            except Exception as e:
+                logger.error(f"检查上游实例时出错: {str(e)}")
+            await asyncio.sleep(self.health_interval)
@@ -0,0 +1,200 @@
+import asyncio
+import time
+from typing import Dict, Optional
+import aiohttp
+from utils.logger import setup_logger
+from utils.metrics import register_collector
+from utils.resilience import UpstreamError, call_upstream, check_status
+from config.config import COOKIE_CACHE_TTL, COOKIE_CHECK_INTERVAL
+
+logger = setup_logger(__name__)
+
+# /cookie 的长期状态：在启动时创建并登记统计，后台检查由 main 启动和停止，
+# 命令模块本身仍在首次使用时才加载
+
+# 熔断器使用的上游名称
+PAN_UPSTREAM = "pan.baidu.com"
+
+# Cookie有效性检查：请求网盘用户信息，失效时 errno 不为 0
+PROBE_URL = 'https://pan.baidu.com/api/gettemplatevariable?clienttype=0&app_id=250528&web=1&fields=["username","uk"]'
+PROBE_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+async def probe_cookie(session: aiohttp.ClientSession, cookie: str) -> Optional[dict]:
+    """
+    检查Cookie是否仍然有效（只请求一次用户信息接口）
+    :return: 有效时返回 {"uk": ..., "username": ...}，已失效时返回 None，网络错误时抛出异常
+    """
+    async def request():
+        async with session.get(PROBE_URL, headers={"Cookie": cookie, "User-Agent": PROBE_USER_AGENT}) as response:
+            check_status(PAN_UPSTREAM, response)
+            return await response.json(content_type=None)
+    
+    data = await call_upstream(PAN_UPSTREAM, request)
+    result = data.get('result') or {}
+    if data.get('errno') != 0 or not result.get('uk'):
+        return None
+    return {'uk': result['uk'], 'username': result.get('username') or str(result['uk'])}
+
+class CookieEntry:
+    """一个百度账号的缓存Cookie"""
+
+    __slots__ = ('uk', 'username', 'cookie', 'expires_at', 'obtained_at', 'checked_at', 'owners')
+
+    def __init__(self, uk: int, username: str, cookie: str, expires_at: float):
+        self.uk = uk
+        self.username = username
+        self.cookie = cookie
+        # 时间均为 time.time() 时间戳
+        self.expires_at = expires_at
+        self.obtained_at = time.time()
+        self.checked_at = self.obtained_at
+        # 扫码登录过该账号的用户，只有他们能取到缓存的Cookie
+        self.owners = set()
+
+    @property
+    def expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+class CookieCache:
+    """
+    按百度账号缓存Cookie，并在后台定期检查是否仍然有效，
+    同一账号再次获取时无需重新扫码
+    """
+
+    def __init__(self, ttl: float = COOKIE_CACHE_TTL, check_interval: float = COOKIE_CHECK_INTERVAL):
+        """
+        :param ttl: Cookie未声明过期时间时的缓存时间（秒）
+        :param check_interval: 有效性检查间隔（秒）
+        """
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._entries: Dict[int, CookieEntry] = {}
+        # 每个用户最近一次使用的账号
+        self._recent: Dict[int, int] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._checker: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.probes = 0
+        self.invalidated = 0
+
+    def put(self, user_id: int, account: dict, cookie: str, expires_at: Optional[float] = None) -> CookieEntry:
+        """
+        保存账号的Cookie（同一账号覆盖旧值）
+        :param user_id: 扫码登录的用户
+        :param account: probe_cookie 返回的账号信息
+        :param cookie: Cookie字符串
+        :param expires_at: BDUSS过期时间戳
+        """
+        uk = account['uk']
+        previous = self._entries.get(uk)
+        entry = CookieEntry(uk, account['username'], cookie, expires_at or time.time() + self.ttl)
+        if previous is not None:
+            entry.owners = previous.owners
+        entry.owners.add(user_id)
+        self._entries[uk] = entry
+        self._recent[user_id] = uk
+        return entry
+
+    def find(self, user_id: int, username: Optional[str] = None) -> Optional[CookieEntry]:
+        """
+        查找用户可用的缓存Cookie
+        :param user_id: 请求的用户
+        :param username: 百度用户名，为空时返回该用户最近一次使用的账号
+        """
+        if username:
+            entry = next((item for item in self._entries.values() if item.username == username), None)
+        else:
+            entry = self._entries.get(self._recent.get(user_id))
+        if entry is None or user_id not in entry.owners:
+            return None
+        if entry.expired:
+            self._remove(entry.uk)
+            return None
+        return entry
+
+    async def lookup(
+        self,
+        session: aiohttp.ClientSession,
+        user_id: int,
+        username: Optional[str] = None,
+    ) -> Optional[CookieEntry]:
+        """
+        查找用户可用的缓存Cookie并确认仍然有效，计入命中/未命中统计
+        参数同 find，找不到或已失效时返回 None
+        """
+        entry = self.find(user_id, username)
+        if entry is not None and await self.validate(session, entry):
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    async def validate(self, session: aiohttp.ClientSession, entry: CookieEntry) -> bool:
+        """
+        检查Cookie是否有效，距上次检查未超过检查间隔时直接视为有效；
+        确认失效时从缓存中移除，网络错误时保留
+        """
+        if time.time() - entry.checked_at < self.check_interval:
+            return True
+        self.probes += 1
+        try:
+            account = await probe_cookie(session, entry.cookie)
+        except (UpstreamError, aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.debug("检查账号 %s 的Cookie出错: %s", entry.username, e)
+            return True
+        if account is None or account['uk'] != entry.uk:
+            logger.info(f"🍪 账号 {entry.username} 的Cookie已失效，已移出缓存")
+            self.invalidated += 1
+            self._remove(entry.uk)
+            return False
+        entry.checked_at = time.time()
+        return True
+
+    def start(self, session: aiohttp.ClientSession):
+        """启动后台检查任务（由应用启动时调用，重复调用无影响）"""
+        self._session = session
+        if self._checker is None or self._checker.done():
+            self._checker = asyncio.get_running_loop().create_task(self._check_loop())
+
+    async def stop(self):
+        """停止后台检查任务"""
+        if self._checker and not self._checker.done():
+            self._checker.cancel()
+            try:
+                await self._checker
+            except asyncio.CancelledError:
+                pass
+        self._checker = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'probes': self.probes,
+            'invalidated': self.invalidated,
+        }
+
+    async def _check_loop(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            for entry in list(self._entries.values()):
+                if entry.expired:
+                    self._remove(entry.uk)
+                    continue
+                try:
+                    await self.validate(self._session, entry)
+                except Exception as e:
+                    logger.error(f"检查缓存Cookie时出错: {str(e)}")
+
+    def _remove(self, uk: int):
+        self._entries.pop(uk, None)
+        for user_id in [user_id for user_id, recent in self._recent.items() if recent == uk]:
+            del self._recent[user_id]
+
+    def __len__(self):
+        return len(self._entries)
+
+cookie_cache = CookieCache()
+register_collector("cache", "baidu_cookie", cookie_cache.stats)
@@ -0,0 +1,55 @@
+from utils.cache import TTLCache
+from utils.session_store import SessionStore
+from utils.backends import BackendPool
+from utils.metrics import register_collector
+from config.config import (
+    API_DOMAINS,
+    SHARE_CACHE_TTL,
+    SHARE_CACHE_MAX_BYTES,
+    SHARE_SESSION_IDLE_TIMEOUT,
+    SHARE_SESSION_MAX_ENTRIES,
+    SHARE_SESSION_MAX_BYTES,
+    SHARE_SESSION_SWEEP_INTERVAL,
+    CRAWL_RESULTS_MAX_BYTES,
+)
+
+# /bd 的长期状态：在启动时创建并登记统计，后台任务由 main 启动和停止，
+# 命令模块本身仍在首次使用时才加载
+
+# 存储用户的分享信息（空闲过期 + 容量上限）
+share_sessions = SessionStore(
+    idle_timeout=SHARE_SESSION_IDLE_TIMEOUT,
+    max_entries=SHARE_SESSION_MAX_ENTRIES,
+    max_bytes=SHARE_SESSION_MAX_BYTES,
+    sizeof=lambda session: session.nbytes,
+    sweep_interval=SHARE_SESSION_SWEEP_INTERVAL,
+    name="分享会话"
+)
+
+# 目录列表缓存，键为 (surl, pwd, dir)，仅缓存解析成功的结果
+listing_cache = TTLCache(
+    ttl=SHARE_CACHE_TTL,
+    max_bytes=SHARE_CACHE_MAX_BYTES,
+    cacheable=lambda result: result.get('code') == 200
+)
+
+register_collector("cache", "baidu_listing", listing_cache.stats)
+
+# 各用户最近一次的遍历结果，单独计算容量，大的遍历结果只会挤掉其他遍历结果而不会挤掉分享会话
+crawl_results = SessionStore(
+    idle_timeout=SHARE_SESSION_IDLE_TIMEOUT,
+    max_entries=SHARE_SESSION_MAX_ENTRIES,
+    max_bytes=CRAWL_RESULTS_MAX_BYTES,
+    sizeof=lambda result: result.nbytes,
+    sweep_interval=SHARE_SESSION_SWEEP_INTERVAL,
+    name="遍历结果"
+)
+
+register_collector("session", "baidu_share", share_sessions.stats)
+register_collector("session", "baidu_crawl", crawl_results.stats)
+
+# 解析API的各个实例，每次请求选择可用实例中预计最快的一个
+api_backends = BackendPool("parser_api", API_DOMAINS)
+
+# 遍历请求使用单独的熔断器，遍历出错不会让浏览请求也被熔断
+CRAWL_UPSTREAM = f"{api_backends.name}:crawl"
@@ -0,0 +1,225 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+import aiohttp
+from utils.logger import setup_logger
+from utils.http_client import get_http_session
+from utils.metrics import register_collector
+from utils.resilience import UpstreamError, call_upstream, check_status, upstream_name
+from utils.cache import TTLCache
+from utils.timeseries import SnapshotRing
+from config.config import (
+    BMCL_CACHE_TTL,
+    BMCL_STALE_TTL,
+    BMCL_STALE_TIMEOUT,
+    BMCL_COLLECT_INTERVAL,
+    BMCL_HISTORY_HOURS,
+    BMCL_MAX_NODES,
+)
+
+logger = setup_logger(__name__)
+
+RANK_URL = 'https://bd.bangbang93.com/openbmclapi/metric/rank'
+
+# 记录的字段（BMCLAPI 给出的是当天累计值，每天北京时间零点清零）
+FIELDS = ('bytes', 'hits')
+
+# BMCLAPI 清零所用时区（UTC+8）相对 UTC 的秒数
+RESET_UTC_OFFSET = 8 * 3600
+
+# 所有启用节点的合计，与节点 ID 不会重复
+TOTAL = ''
+
+async def fetch_rank(session: aiohttp.ClientSession):
+    """请求BMCLAPI节点排行数据（上游故障时重试，熔断期间直接失败）"""
+    async def request():
+        async with session.get(RANK_URL) as response:
+            check_status(upstream, response)
+            return await response.json()
+
+    upstream = upstream_name(RANK_URL)
+    try:
+        return await call_upstream(upstream, request)
+    except (UpstreamError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"获取BMCLAPI节点排行失败: {str(e) or type(e).__name__}")
+        return None
+
+def hour_of(timestamp: float) -> int:
+    """所在整点的时间戳"""
+    return int(timestamp // 3600 * 3600)
+
+def reset_day(timestamp: float) -> int:
+    """按 BMCLAPI 清零时间（北京时间零点）划分的日序号，与服务器所在时区无关"""
+    return int((timestamp + RESET_UTC_OFFSET) // 86400)
+
+class RankCollector:
+    """
+    BMCLAPI 节点排行的采集器：定期拉取排行，把每个启用节点的流量和请求次数写入定长快照，
+    查询时直接从内存计算排名、排名变化和每小时流量
+    """
+
+    def __init__(
+        self,
+        interval: float = BMCL_COLLECT_INTERVAL,
+        history_hours: float = BMCL_HISTORY_HOURS,
+        max_nodes: int = BMCL_MAX_NODES,
+        cache_ttl: float = BMCL_CACHE_TTL,
+    ):
+        """
+        :param interval: 采集间隔（秒）
+        :param cache_ttl: 未在后台采集时，查询时获取的数据可直接使用的时长（秒）
+        :param history_hours: 保留多少小时的历史
+        :param max_nodes: 最多记录的节点数
+        """
+        self.interval = interval
+        self.cache_ttl = cache_ttl
+        # 是否已在 JobQueue 中定期采集
+        self.scheduled = False
+        # 多留一个位置给合计
+        self.history = SnapshotRing(int(history_hours * 3600 / interval), FIELDS, max_nodes + 1)
+        # 节点 ID -> 名称
+        self.names: Dict[str, str] = {}
+        self.polls = 0
+        self.failures = 0
+
+    @property
+    def updated_at(self) -> float:
+        """最近一次快照的时间，尚无快照时为 0"""
+        return self.history.timestamp() if len(self.history) else 0.0
+
+    @property
+    def fresh(self) -> bool:
+        """
+        最近一次快照是否仍可直接使用：后台采集正常时始终为真；
+        未在后台采集时与排行缓存的有效期一致，不会比 BMCL_CACHE_TTL 更旧
+        """
+        max_age = self.interval * 2 if self.scheduled else self.cache_ttl
+        return time.time() - self.updated_at < max_age
+
+    def record(self, data: list, timestamp: Optional[float] = None):
+        """
+        写入一次排行数据
+        最新一次快照与前一次间隔不到半个采集间隔时（如查询时按需获取的），由这次的数据覆盖，
+        既能显示刚获取的数据，保留的快照之间又不会太密而缩短可保留的历史
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        history = self.history
+        replace = len(history) > 1 and history.timestamp(-1) - history.timestamp(-2) < self.interval / 2
+        values = {}
+        total_bytes = total_hits = 0
+        for node in data:
+            key = node.get('_id') or node.get('name')
+            if not node.get('isEnabled', False) or not key:
+                continue
+            metric = node.get('metric') or {}
+            row = (int(metric.get('bytes', 0)), int(metric.get('hits', 0)))
+            values[key] = row
+            self.names[key] = node.get('name') or key
+            total_bytes += row[0]
+            total_hits += row[1]
+        values[TOTAL] = (total_bytes, total_hits)
+        history.record(timestamp, values, replace=replace)
+        for key in [key for key in self.names if key not in self.history]:
+            del self.names[key]
+
+    async def poll(self, session: aiohttp.ClientSession) -> Optional[list]:
+        """拉取一次排行并记录，失败时返回 None"""
+        self.polls += 1
+        data = await fetch_rank(session)
+        if data is None:
+            self.failures += 1
+            return None
+        self.record(data)
+        return data
+
+    def schedule(self, application) -> bool:
+        """在 JobQueue 中定期采集，未安装 job-queue 依赖时返回 False"""
+        job_queue = application.job_queue
+        if job_queue is None:
+            logger.error(
+                "❌ 已开启 BMCL_COLLECT_ENABLED 但未安装 python-telegram-bot[job-queue]，"
+                "BMCLAPI统计无法后台采集，改为查询时获取；请执行 pip install -r requirements.txt "
+                "或设置 BMCL_COLLECT_ENABLED=false"
+            )
+            return False
+        job_queue.run_repeating(self._job, interval=self.interval, first=1, name="bmcl_rank")
+        self.scheduled = True
+        logger.info(f"📈 已启动BMCLAPI统计采集，间隔 {self.interval:.0f} 秒")
+        return True
+
+    async def _job(self, context):
+        try:
+            await self.poll(get_http_session(context))
+        except Exception as e:
+            logger.error(f"采集BMCLAPI统计时出错: {str(e)}")
+
+    def ranking(self, index: int = -1) -> List[str]:
+        """某次快照中按流量从高到低排列的节点 ID"""
+        snapshot = self.history.snapshot('bytes', index)
+        snapshot.pop(TOTAL, None)
+        return sorted(snapshot, key=snapshot.get, reverse=True)
+
+    def rank_changes(self) -> Dict[str, Optional[int]]:
+        """
+        各节点相对上一次快照的排名变化（正数为上升），上一次未上榜的为 None；
+        只有一次快照时返回空字典
+        """
+        if len(self.history) < 2:
+            return {}
+        previous = {key: rank for rank, key in enumerate(self.ranking(-2))}
+        return {
+            key: previous[key] - rank if key in previous else None
+            for rank, key in enumerate(self.ranking())
+        }
+
+    def hourly(self, key: str = TOTAL, hours: int = 24) -> List[Tuple[int, int, int]]:
+        """
+        最近若干小时每小时的 (整点时间戳, 流量, 请求次数)，由相邻快照的差值累加；
+        数值变小或跨过北京时间零点时说明已清零，差值取新值本身
+        """
+        cutoff = hour_of(time.time()) - (hours - 1) * 3600
+        buckets: Dict[int, List[int]] = {}
+        previous = None
+        for (timestamp, size), (_, hits) in zip(self.history.history(key, 'bytes'), self.history.history(key, 'hits')):
+            if previous is not None:
+                last_time, last_size, last_hits = previous
+                reset = size < last_size or hits < last_hits or reset_day(timestamp) != reset_day(last_time)
+                if reset:
+                    delta = (size, hits)
+                else:
+                    delta = (size - last_size, hits - last_hits)
+                hour = hour_of(timestamp)
+                if hour >= cutoff:
+                    bucket = buckets.setdefault(hour, [0, 0])
+                    bucket[0] += delta[0]
+                    bucket[1] += delta[1]
+            previous = (timestamp, size, hits)
+        return [(hour, size, hits) for hour, (size, hits) in sorted(buckets.items())]
+
+    def find(self, query: str) -> Optional[str]:
+        """按名称（不区分大小写）或 ID 查找节点，找不到完全匹配时取名称包含关键字的排名最高者"""
+        query = query.strip().lower()
+        for key, name in self.names.items():
+            if name.lower() == query or key.lower() == query:
+                return key
+        if not len(self.history):
+            return None
+        for key in self.ranking():
+            if query in self.names.get(key, '').lower():
+                return key
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.history.stats(), polls=self.polls, failures=self.failures)
+
+rank_collector = RankCollector()
+register_collector("timeseries", "bmcl_rank", rank_collector.stats)
+
+# 后台采集未运行时按需拉取排行，多个用户同时查询时只请求一次上游
+rank_cache = TTLCache(
+    ttl=BMCL_CACHE_TTL,
+    stale_ttl=BMCL_STALE_TTL,
+    stale_timeout=BMCL_STALE_TIMEOUT
+)
+
+register_collector("cache", "bmcl_rank", rank_cache.stats)
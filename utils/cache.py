@@ -0,0 +1,219 @@
+import asyncio
+import json
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class SingleFlight:
+    """合并同一键的并发请求，同一时刻只有一个上游请求在执行"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def run(self, key: Hashable, fetcher: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """
+        获取（或创建）该键对应的上游请求任务
+        :param key: 请求键
+        :param fetcher: 无参协程工厂，仅在没有进行中的请求时调用
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetcher())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._release(k, t))
+        return task
+
+    def _release(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 取出异常，避免无人等待时出现 "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def __contains__(self, key: Hashable):
+        return key in self._inflight
+
+    def __len__(self):
+        return len(self._inflight)
+
+def json_sizeof(value: Any) -> int:
+    """按JSON序列化后的字节数估算缓存值占用"""
+    try:
+        return len(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+class TTLCache:
+    """
+    带过期时间、请求合并和过期数据回退（stale-while-revalidate）的异步缓存
+    可选按条目数或字节数限制容量，超出时按最近最少使用（LRU）淘汰
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        stale_ttl: float = 0,
+        stale_timeout: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Callable[[Any], int] = json_sizeof,
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ):
+        """
+        :param ttl: 数据新鲜期（秒），期内直接命中
+        :param stale_ttl: 过期后仍可作为回退数据的时长（秒）
+        :param stale_timeout: 存在过期数据时等待上游的最长时间（秒），超时先返回过期数据
+        :param max_entries: 最大条目数，None 表示不限制
+        :param max_bytes: 最大字节数，None 表示不限制
+        :param sizeof: 估算单个缓存值字节数的函数（仅在设置 max_bytes 时使用）
+        :param cacheable: 判断回源结果是否可以写入缓存的函数
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.stale_timeout = stale_timeout
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.cacheable = cacheable
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._flight = SingleFlight()
+
+        # 统计计数
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def peek(self, key: Hashable, allow_stale: bool = False) -> Optional[Any]:
+        """
+        读取缓存值（不触发回源）
+        :param key: 缓存键
+        :param allow_stale: 是否允许返回已过新鲜期但仍在回退期内的数据
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, stored_at, _ = entry
+        age = time.monotonic() - stored_at
+        if age > self.ttl + self.stale_ttl:
+            self._remove(key)
+            return None
+        if age > self.ttl and not allow_stale:
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        """是否有新鲜期内的缓存值（不调整淘汰顺序，也不清理过期条目）"""
+        entry = self._entries.get(key)
+        return entry is not None and time.monotonic() - entry[1] <= self.ttl
+
+    def set(self, key: Hashable, value: Any):
+        """写入缓存"""
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # 单个值超过总预算，不缓存
+            self._remove(key)
+            return
+        self._remove(key)
+        self._entries[key] = (value, time.monotonic(), size)
+        self._bytes += size
+        self._evict()
+
+    def invalidate(self, key: Hashable):
+        """删除缓存"""
+        self._remove(key)
+
+    def clear(self):
+        """清空缓存"""
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """获取缓存统计信息"""
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'inflight': len(self._flight),
+        }
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _evict(self):
+        """按LRU顺序淘汰，直到满足容量限制"""
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    async def get(self, key: Hashable, fetcher: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        读取缓存，未命中或过期时通过 fetcher 回源
+        fetcher 返回 None 表示本次回源失败，结果不会写入缓存
+        :param key: 缓存键
+        :param fetcher: 无参协程工厂
+        """
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, stored_at, _ = entry
+            age = now - stored_at
+            if age <= self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return value
+            if age > self.ttl + self.stale_ttl:
+                self._remove(key)
+                entry = None
+
+        if key in self._flight:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        task = self._flight.run(key, lambda: self._refresh(key, fetcher))
+
+        if entry is None:
+            return await asyncio.shield(task)
+
+        # 存在过期数据：限时等待上游，超时或失败时先返回过期数据，刷新在后台继续
+        stale_value = entry[0]
+        try:
+            value = await asyncio.wait_for(asyncio.shield(task), timeout=self.stale_timeout)
+        except asyncio.TimeoutError:
+            self.stale_hits += 1
+            logger.warning(f"⚠️ 上游响应缓慢，返回过期缓存: {key}")
+            return stale_value
+        except Exception as e:
+            self.stale_hits += 1
+            logger.warning(f"⚠️ 刷新缓存失败，返回过期缓存: {key}, 错误: {str(e)}")
+            return stale_value
+        if value is None:
+            self.stale_hits += 1
+            return stale_value
+        return value
+
+    async def _refresh(self, key: Hashable, fetcher: Callable[[], Awaitable[Any]]) -> Any:
+        value = await fetcher()
+        if value is not None and (self.cacheable is None or self.cacheable(value)):
+            self.set(key, value)
+        return value
+
+    def __len__(self):
+        return len(self._entries)
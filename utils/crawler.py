@@ -0,0 +1,115 @@
+import asyncio
+import time
+from contextlib import nullcontext
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 目录列表函数：返回 (子目录路径列表, 文件列表, 文件总字节数)，失败时返回 None
+ListDir = Callable[[str], Awaitable[Optional[Tuple[List[str], list, int]]]]
+
+# 每个上游的并发请求上限，所有遍历任务共用
+_upstreams: Dict[str, asyncio.Semaphore] = {}
+
+def upstream_limit(name: str, limit: int) -> asyncio.Semaphore:
+    """获取上游共用的并发信号量（首次使用时按 limit 创建）"""
+    semaphore = _upstreams.get(name)
+    if semaphore is None:
+        semaphore = _upstreams[name] = asyncio.Semaphore(limit)
+    return semaphore
+
+class CrawlStats:
+    """遍历进度，遍历过程中实时更新"""
+
+    __slots__ = ('dirs', 'files', 'bytes', 'depth', 'max_depth', 'pending', 'errors', 'truncated', 'started')
+
+    def __init__(self):
+        self.dirs = 0
+        self.files = 0
+        self.bytes = 0
+        # 最近完成的目录深度和已到达的最大深度
+        self.depth = 0
+        self.max_depth = 0
+        # 已发现但尚未列出的目录数
+        self.pending = 0
+        self.errors = 0
+        # 达到文件数上限而提前结束
+        self.truncated = False
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+async def crawl_tree(
+    list_dir: ListDir,
+    root: str = '/',
+    concurrency: int = 8,
+    upstream: Optional[asyncio.Semaphore] = None,
+    max_files: Optional[int] = None,
+    stats: Optional[CrawlStats] = None,
+) -> AsyncIterator[Tuple[str, int, list]]:
+    """
+    并发遍历目录树，每列出一个目录产出一次 (目录路径, 深度, 文件列表)
+    :param list_dir: 目录列表函数
+    :param root: 起始目录
+    :param concurrency: 本次遍历同时列出的目录数
+    :param upstream: 上游共用的信号量，多个遍历任务同时进行时限制对上游的总并发
+    :param max_files: 文件数上限，达到后停止遍历并标记 truncated
+    :param stats: 进度对象，调用方可在产出之间读取
+    """
+    stats = stats if stats is not None else CrawlStats()
+    # 已发现的目录，同一路径只列出一次
+    seen = {root}
+    todo: asyncio.Queue = asyncio.Queue()
+    results: asyncio.Queue = asyncio.Queue()
+    done = object()
+    todo.put_nowait((root, 0))
+    stats.pending = 1
+
+    async def worker():
+        while True:
+            path, depth = await todo.get()
+            try:
+                async with upstream or nullcontext():
+                    listing = await list_dir(path)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug("列出目录 %s 出错: %s", path, e)
+                listing = None
+            if listing is None:
+                stats.errors += 1
+            else:
+                subdirs, files, size = listing
+                for child in subdirs:
+                    if child not in seen:
+                        seen.add(child)
+                        stats.pending += 1
+                        todo.put_nowait((child, depth + 1))
+                stats.dirs += 1
+                stats.files += len(files)
+                stats.bytes += size
+                stats.depth = depth
+                stats.max_depth = max(stats.max_depth, depth)
+                results.put_nowait((path, depth, files))
+            # 子目录入队后才减少，pending 为 0 时整棵树已遍历完
+            stats.pending -= 1
+            if not stats.pending:
+                results.put_nowait(done)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    try:
+        while True:
+            item = await results.get()
+            if item is done:
+                return
+            yield item
+            if max_files is not None and stats.files >= max_files:
+                stats.truncated = True
+                return
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -1,24 +1,64 @@
+import importlib
 from functools import wraps
-from typing import List, Callable
+from types import MappingProxyType
+from typing import Dict, List, Callable, Mapping, Optional
 from utils.logger import setup_logger
-from config.config import ADMIN_IDS, PING_ENABLED
+from utils.rate_limit import RateLimit, acquire_all
+from utils.metrics import track
+from utils.tracing import trace_update
+from config.config import ADMIN_IDS, PING_ENABLED, RATE_LIMIT_ENABLED, LOG_SAMPLE_RATE
 
-logger = setup_logger()
+logger = setup_logger(__name__)
+
+# 触发限流时的提示
+RATE_LIMITED_TEXT = "⏳ 操作太频繁，请稍后再试"
+
+def build_rate_limits(name: str, rate: Optional[str], burst: Optional[int],
+                      chat_rate: Optional[str] = None, chat_burst: Optional[int] = None):
+    """根据注册参数创建每用户、每聊天的限流规则，未声明的返回 None"""
+    user_limit = RateLimit(f"{name}:user", rate, burst) if rate else None
+    chat_limit = RateLimit(f"{name}:chat", chat_rate, chat_burst) if chat_rate else None
+    return user_limit, chat_limit
+
+def check_rate_limits(update, user_limit: Optional[RateLimit], chat_limit: Optional[RateLimit]) -> bool:
+    """检查更新是否在限流范围内，通过时消耗令牌"""
+    if not RATE_LIMIT_ENABLED:
+        return True
+    checks = []
+    if user_limit is not None and update.effective_user is not None:
+        checks.append((user_limit, update.effective_user.id))
+    if chat_limit is not None and update.effective_chat is not None:
+        checks.append((chat_limit, update.effective_chat.id))
+    return not checks or acquire_all(checks)
 
 class CommandRegistry:
     """命令注册中心"""
-    _commands: List[dict] = []
+    _commands: Dict[str, dict] = {}
+    
+    # 编译后的只读分发表 {命令名: 处理函数}，注册表变化时失效
+    _dispatch_table: Optional[Mapping[str, Callable]] = None
+    
+    # 按角色缓存的命令列表文本
+    _help_cache: Dict[str, str] = {}
     
     @classmethod
-    def register(cls, command: str, description: str = "", is_admin: bool = False, enabled: bool = True):
+    def register(cls, command: str, description: str = "", is_admin: bool = False, enabled: bool = True,
+                 rate: Optional[str] = None, burst: Optional[int] = None,
+                 chat_rate: Optional[str] = None, chat_burst: Optional[int] = None):
         """
         命令注册装饰器
         :param command: 命令名称（不含/）
         :param description: 命令描述
         :param is_admin: 是否仅管理员可用
         :param enabled: 命令是否启用
+        :param rate: 每用户限流，如 "5/min"，为空时不限流
+        :param burst: 每用户允许的突发次数（令牌桶容量），默认等于每周期次数
+        :param chat_rate: 每聊天限流，如 "20/min"，为空时不限流
+        :param chat_burst: 每聊天允许的突发次数
         """
         def decorator(func: Callable):
+            user_limit, chat_limit = build_rate_limits(f"/{command}", rate, burst, chat_rate, chat_burst)
+            
             @wraps(func)
             async def wrapper(update, context, *args, **kwargs):
                 user = update.effective_user
@@ -40,26 +80,217 @@ class CommandRegistry:
                         logger.warning(f"⚠️ 用户 {user.first_name}({user.id}) 尝试使用管理员命令 /{command}")
                         return
                 
+                # 检查限流
+                if not check_rate_limits(update, user_limit, chat_limit):
+                    logger.sample(LOG_SAMPLE_RATE).warning(f"⚠️ 用户 {user.first_name}({user.id}) 触发限流: /{command}")
+                    await update.message.reply_text(RATE_LIMITED_TEXT)
+                    return
+                
                 try:
-                    logger.info(f"⚡ 正在处理命令: /{command}")
-                    result = await func(update, context, *args, **kwargs)
+                    logger.debug("⚡ 正在处理命令: /%s", command)
+                    with track("command", command):
+                        result = await func(update, context, *args, **kwargs)
                     logger.info(f"✅ 命令 /{command} 处理完成")
                     return result
                 except Exception as e:
                     logger.error(f"❌ 处理命令 /{command} 时出错: {str(e)}")
                     await update.message.reply_text(f"抱歉，处理命令时出现错误: {str(e)}")
             
-            cls._commands.append({
+            entry = {
                 'command': command,
                 'handler': wrapper,
                 'description': description,
                 'is_admin': is_admin,
-                'enabled': enabled
-            })
+                'enabled': enabled,
+                'module': func.__module__,
+                'lazy': False
+            }
+            
+            # 模块首次导入时替换清单中登记的占位命令，其他情况的重名视为错误
+            existing = cls._commands.get(command)
+            if existing is not None and not (existing['lazy'] and existing['module'] == entry['module']):
+                raise ValueError(
+                    f"命令重复注册: /{command}（{existing['module']} 与 {entry['module']}）"
+                )
+            cls._commands[command] = entry
+            cls._invalidate()
             return wrapper
         return decorator
     
+    @classmethod
+    def register_lazy(cls, command: str, module: str, description: str = "", is_admin: bool = False):
+        """
+        登记延迟加载的占位命令，首次调用时才导入所在模块
+        :param command: 命令名称（不含/）
+        :param module: 命令所在模块
+        :param description: 命令描述
+        :param is_admin: 是否仅管理员可用
+        """
+        resolved = []
+        
+        async def stub(update, context, *args, **kwargs):
+            if not resolved:
+                importlib.import_module(module)
+                entry = cls.find(command, module)
+                if entry is None or entry['lazy']:
+                    logger.error(f"❌ 模块 {module} 中未找到命令 /{command}")
+                    await update.message.reply_text("❌ 该命令当前不可用")
+                    return
+                logger.info(f"✅ 已按需加载命令模块: {module}")
+                resolved.append(entry['handler'])
+            return await resolved[0](update, context, *args, **kwargs)
+        
+        existing = cls._commands.get(command)
+        if existing is not None:
+            raise ValueError(f"命令重复注册: /{command}（{existing['module']} 与 {module}）")
+        cls._commands[command] = {
+            'command': command,
+            'handler': stub,
+            'description': description,
+            'is_admin': is_admin,
+            'enabled': True,
+            'module': module,
+            'lazy': True
+        }
+        cls._invalidate()
+    
+    @classmethod
+    def find(cls, command: str, module: Optional[str] = None) -> Optional[dict]:
+        """查找已注册的命令"""
+        cmd = cls._commands.get(command)
+        if cmd is None or (module is not None and cmd['module'] != module):
+            return None
+        return cmd
+    
     @classmethod
     def get_commands(cls) -> List[dict]:
         """获取所有已注册的命令"""
-        return [cmd for cmd in cls._commands if cmd['enabled']]
\ No newline at end of file
+        return [cmd for cmd in cls._commands.values() if cmd['enabled']]
+    
+    @classmethod
+    def compile(cls) -> Mapping[str, Callable]:
+        """将已启用的命令编译为只读分发表"""
+        if cls._dispatch_table is None:
+            cls._dispatch_table = MappingProxyType({
+                cmd['command']: cmd['handler']
+                for cmd in cls._commands.values()
+                if cmd['enabled']
+            })
+        return cls._dispatch_table
+    
+    @classmethod
+    def _invalidate(cls):
+        cls._dispatch_table = None
+        cls._help_cache.clear()
+    
+    @classmethod
+    def help_text(cls, is_admin: bool = False) -> str:
+        """
+        获取命令列表文本（按角色缓存，注册表变化时重新生成）
+        :param is_admin: True 返回管理员命令列表，False 返回普通命令列表
+        """
+        role = 'admin' if is_admin else 'user'
+        text = cls._help_cache.get(role)
+        if text is None:
+            lines = []
+            for cmd in cls.get_commands():
+                if cmd['is_admin'] != is_admin:
+                    continue
+                if is_admin:
+                    enabled = "✅" if cmd['enabled'] else "❌"
+                    lines.append(f"{enabled} /{cmd['command']} - {cmd['description']}\n")
+                else:
+                    lines.append(f"/{cmd['command']} - {cmd['description']}\n")
+            text = "".join(lines)
+            cls._help_cache[role] = text
+        return text
+    
+    @classmethod
+    async def dispatch(cls, update, context):
+        """单一入口：按命令名 O(1) 查表分发"""
+        message = update.effective_message
+        if message is None or not message.text:
+            return
+        parts = message.text.split()
+        command, _, target = parts[0][1:].partition('@')
+        # 群组中发给其他机器人的命令不处理
+        if target and context.bot.username and target.lower() != context.bot.username.lower():
+            return
+        handler = cls.compile().get(command.lower())
+        if handler is None:
+            return
+        context.args = parts[1:]
+        with trace_update(update, f"command /{command.lower()}"):
+            return await handler(update, context)
+
+class CallbackRegistry:
+    """回调查询注册中心，按 callback_data 前缀分发到对应处理函数"""
+    _handlers: Dict[str, Callable] = {}
+    _lazy_modules: Dict[str, str] = {}
+    
+    # 每个前缀的限流规则 {前缀: (每用户规则, 每聊天规则)}
+    _limits: Dict[str, tuple] = {}
+    
+    # 前缀与数据之间的分隔符
+    SEPARATOR = ":"
+    
+    @classmethod
+    def register(cls, prefix: str, rate: Optional[str] = None, burst: Optional[int] = None,
+                 chat_rate: Optional[str] = None, chat_burst: Optional[int] = None):
+        """
+        回调处理注册装饰器
+        被注册的函数签名为 handler(update, context, payload)，payload 为去掉前缀后的数据
+        :param prefix: callback_data 前缀（不含分隔符）
+        :param rate: 每用户限流，如 "30/min"，为空时不限流
+        :param burst: 每用户允许的突发次数
+        :param chat_rate: 每聊天限流，为空时不限流
+        :param chat_burst: 每聊天允许的突发次数
+        """
+        def decorator(func: Callable):
+            if prefix in cls._handlers:
+                raise ValueError(f"回调前缀重复注册: {prefix}")
+            cls._handlers[prefix] = func
+            if rate or chat_rate:
+                cls._limits[prefix] = build_rate_limits(f"callback:{prefix}", rate, burst, chat_rate, chat_burst)
+            return func
+        return decorator
+    
+    @classmethod
+    def register_lazy(cls, prefix: str, module: str):
+        """
+        登记延迟加载的回调前缀，首次收到该前缀的回调时才导入所在模块
+        :param prefix: callback_data 前缀
+        :param module: 回调处理函数所在模块
+        """
+        cls._lazy_modules[prefix] = module
+    
+    @classmethod
+    def prefixes(cls) -> Dict[str, str]:
+        """获取已注册的回调前缀及其所在模块"""
+        return {prefix: handler.__module__ for prefix, handler in cls._handlers.items()}
+    
+    @classmethod
+    def pack(cls, prefix: str, payload: str = "") -> str:
+        """构建 callback_data"""
+        return f"{prefix}{cls.SEPARATOR}{payload}"
+    
+    @classmethod
+    async def dispatch(cls, update, context):
+        """根据前缀分发回调查询"""
+        query = update.callback_query
+        prefix, _, payload = (query.data or "").partition(cls.SEPARATOR)
+        handler = cls._handlers.get(prefix)
+        if handler is None and prefix in cls._lazy_modules:
+            importlib.import_module(cls._lazy_modules.pop(prefix))
+            handler = cls._handlers.get(prefix)
+        if handler is None:
+            logger.warning(f"⚠️ 未知的回调数据: {query.data}")
+            await query.answer("❌ 按钮已失效")
+            return
+        with trace_update(update, f"callback {prefix}"):
+            limits = cls._limits.get(prefix)
+            if limits is not None and not check_rate_limits(update, *limits):
+                await query.answer(RATE_LIMITED_TEXT)
+                return
+            with track("callback", prefix):
+                return await handler(update, context, payload)
@@ -0,0 +1,93 @@
+import asyncio
+import csv
+import io
+import json
+import tempfile
+from typing import IO, Iterable, Iterator, Sequence, Tuple
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 支持的导出格式，按下标编码在按钮中
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# 每次写入临时文件的行数
+WRITE_BATCH = 512
+
+class ExportTooLarge(Exception):
+    """导出文件超过大小上限"""
+
+def csv_lines(rows: Iterable[Sequence], fields: Sequence[str]) -> Iterator[str]:
+    """逐行生成 CSV 文本（第一行为表头）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in _prepend(fields, rows):
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def jsonl_lines(rows: Iterable[Sequence], fields: Sequence[str]) -> Iterator[str]:
+    """逐行生成 JSON Lines 文本，每行一个对象"""
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n'
+
+def _prepend(first, rows: Iterable) -> Iterator:
+    yield first
+    yield from rows
+
+def spool_lines(lines: Iterable[str], max_memory: int, max_bytes: int, prefix: bytes = b'') -> Tuple[IO[bytes], int]:
+    """
+    把文本行分批写入临时文件：不超过 max_memory 时留在内存，超过后自动转存到磁盘
+    :param lines: 文本行生成器
+    :param max_memory: 保留在内存中的最大字节数
+    :param max_bytes: 文件大小上限，超过时抛出 ExportTooLarge
+    :param prefix: 写在文件开头的字节（如 UTF-8 BOM）
+    :return: (已回到开头的文件, 字节数)
+    """
+    file = tempfile.SpooledTemporaryFile(max_size=max_memory, mode='w+b')
+    try:
+        size = file.write(prefix)
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) >= WRITE_BATCH:
+                size += file.write(''.join(batch).encode('utf-8'))
+                batch.clear()
+                if size > max_bytes:
+                    raise ExportTooLarge(size)
+        if batch:
+            size += file.write(''.join(batch).encode('utf-8'))
+        if size > max_bytes:
+            raise ExportTooLarge(size)
+        file.seek(0)
+        return file, size
+    except BaseException:
+        file.close()
+        raise
+
+async def export_rows(
+    rows: Iterable[Sequence],
+    fields: Sequence[str],
+    fmt: str,
+    max_memory: int,
+    max_bytes: int,
+) -> Tuple[IO[bytes], int]:
+    """
+    把行流式导出为 CSV 或 JSONL 临时文件（在线程中生成，不阻塞事件循环）
+    :param rows: 行生成器，每行与 fields 一一对应
+    :param fields: 列名
+    :param fmt: csv 或 jsonl
+    :param max_memory: 保留在内存中的最大字节数，超过后写入磁盘
+    :param max_bytes: 文件大小上限
+    :return: (已回到开头的文件, 字节数)，文件由调用方关闭
+    """
+    if fmt == 'csv':
+        # 带 BOM，方便 Excel 正确识别中文文件名
+        lines, prefix = csv_lines(rows, fields), b'\xef\xbb\xbf'
+    elif fmt == 'jsonl':
+        lines, prefix = jsonl_lines(rows, fields), b''
+    else:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, spool_lines, lines, max_memory, max_bytes, prefix)
@@ -0,0 +1,105 @@
+import aiohttp
+from typing import Optional
+from utils.logger import setup_logger
+from utils.tracing import create_trace_config
+from config.config import (
+    HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_DNS_CACHE_TTL,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_TIMEOUT,
+    TRACE_ENABLED,
+)
+
+logger = setup_logger(__name__)
+
+# 在 application.bot_data 中保存客户端的键名
+BOT_DATA_KEY = 'http_client'
+
+class HttpClient:
+    """共享的上游HTTP客户端，统一管理连接池的创建与关闭"""
+
+    def __init__(
+        self,
+        limit: int = HTTP_POOL_LIMIT,
+        limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST,
+        keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT,
+        dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        timeout: float = HTTP_TIMEOUT,
+    ):
+        """
+        :param limit: 连接池总连接数
+        :param limit_per_host: 单个主机最大连接数
+        :param keepalive_timeout: 空闲连接保持时间（秒）
+        :param dns_cache_ttl: DNS缓存时间（秒）
+        :param connect_timeout: 连接超时（秒）
+        :param timeout: 单次请求总超时（秒）
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = aiohttp.ClientTimeout(
+            total=timeout,
+            connect=connect_timeout,
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self):
+        """创建连接池（需在事件循环中调用）"""
+        if self._session and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+        )
+        # 各调用方自行管理Cookie，共享会话不保存任何Cookie，避免在用户之间串号
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            trace_configs=[create_trace_config()] if TRACE_ENABLED else None,
+        )
+        logger.info(
+            f"🌐 HTTP连接池已创建 (总连接数: {self.limit}, 单主机: {self.limit_per_host})"
+        )
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+            logger.info("🌐 HTTP连接池已关闭")
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """获取共享会话"""
+        if self._session is None or self._session.closed:
+            raise RuntimeError("HTTP客户端尚未启动")
+        return self._session
+
+    def cookie_session(self, cookie_jar: Optional[aiohttp.abc.AbstractCookieJar] = None) -> aiohttp.ClientSession:
+        """
+        创建带独立Cookie容器的会话，与共享会话使用同一个连接池（关闭时不会关闭连接池）
+        :param cookie_jar: Cookie容器，为空时新建一个
+        """
+        return aiohttp.ClientSession(
+            connector=self.session.connector,
+            connector_owner=False,
+            timeout=self.timeout,
+            cookie_jar=cookie_jar if cookie_jar is not None else aiohttp.CookieJar(),
+            trace_configs=[create_trace_config()] if TRACE_ENABLED else None,
+        )
+
+def get_http_client(context) -> HttpClient:
+    """从应用上下文中获取共享HTTP客户端"""
+    return context.application.bot_data[BOT_DATA_KEY]
+
+def get_http_session(context) -> aiohttp.ClientSession:
+    """从应用上下文中获取共享会话"""
+    return get_http_client(context).session
@@ -1,13 +1,59 @@
+import atexit
+import copy
+import gzip
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
 import sys
-from datetime import datetime
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
 from colorama import init, Fore, Style
+from config.config import (
+    LOG_FILE,
+    LOG_LEVEL,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_PAYLOAD_LIMIT,
+)
 
 init()  # 初始化colorama
 
+LOGGER_NAME = 'TelegramBot'
+
+# 当前正在处理的更新ID，由更新入口设置，每行日志都会带上
+update_id_var: ContextVar[Optional[int]] = ContextVar('update_id', default=None)
+
+class UpdateIdFilter(logging.Filter):
+    """在入队前（处理更新的协程中）读取更新ID，写入日志记录"""
+
+    def filter(self, record):
+        update_id = update_id_var.get()
+        record.update_tag = f"[#{update_id}] " if update_id is not None else ""
+        return True
+
+class _TimestampCache:
+    """按秒缓存格式化后的时间字符串，同一秒内的日志不再重复格式化"""
+
+    def __init__(self, fmt: str = "%Y-%m-%d %H:%M:%S"):
+        self.fmt = fmt
+        self._second = None
+        self._text = ""
+
+    def format(self, created: float) -> str:
+        second = int(created)
+        if second != self._second:
+            # 只在监听线程中调用，无需加锁
+            self._text = time.strftime(self.fmt, time.localtime(second))
+            self._second = second
+        return self._text
+
 class ColoredFormatter(logging.Formatter):
     """自定义彩色日志格式器"""
-    
+
     COLORS = {
         'INFO': Fore.GREEN,
         'WARNING': Fore.YELLOW,
@@ -16,42 +62,214 @@ class ColoredFormatter(logging.Formatter):
         'DEBUG': Fore.BLUE
     }
 
+    def __init__(self):
+        super().__init__()
+        self._timestamps = _TimestampCache()
+
     def format(self, record):
         # 获取对应的颜色
         color = self.COLORS.get(record.levelname, '')
-        
+
         # 自定义时间格式
-        time_format = datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S")
-        
+        time_format = self._timestamps.format(record.created)
+        update_tag = getattr(record, 'update_tag', '')
+
         # 格式化日志信息
         if record.levelname == 'INFO':
-            log_fmt = f"{Fore.WHITE}[{time_format}]{Style.RESET_ALL} {color}● {record.levelname}{Style.RESET_ALL}: {record.getMessage()}"
+            log_fmt = f"{Fore.WHITE}[{time_format}]{Style.RESET_ALL} {color}● {record.levelname}{Style.RESET_ALL}: {update_tag}{record.getMessage()}"
         else:
-            log_fmt = f"{Fore.WHITE}[{time_format}]{Style.RESET_ALL} {color}▲ {record.levelname}{Style.RESET_ALL}: {record.getMessage()}"
-        
+            log_fmt = f"{Fore.WHITE}[{time_format}]{Style.RESET_ALL} {color}▲ {record.levelname}{Style.RESET_ALL}: {update_tag}{record.getMessage()}"
+
         return log_fmt
 
-def setup_logger():
-    """配置日志"""
-    logger = logging.getLogger('TelegramBot')
-    logger.setLevel(logging.INFO)
-    
-    # 如果logger已经有处理器，先清除
-    if logger.handlers:
-        logger.handlers.clear()
-    
+class FileFormatter(logging.Formatter):
+    """文件日志格式器，时间戳按秒缓存"""
+
+    def __init__(self):
+        super().__init__('[%(asctime)s] %(levelname)s: %(update_tag)s%(message)s')
+        self._timestamps = _TimestampCache()
+
+    def format(self, record):
+        if not hasattr(record, 'update_tag'):
+            record.update_tag = ''
+        return super().format(record)
+
+    def formatTime(self, record, datefmt=None):
+        return self._timestamps.format(record.created)
+
+class DeferredArg:
+    """
+    延迟转换的日志参数基类：带有这类参数的日志不在调用线程中格式化，
+    由后台线程输出时才调用 __str__（参数在记录日志之后不应再被修改）
+    """
+    __slots__ = ()
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    入队前不格式化含 DeferredArg 参数的日志：QueueHandler 默认在 prepare 中
+    （即调用日志的线程里）拼接消息，会让延迟参数在事件循环中就被转换
+    """
+
+    def prepare(self, record):
+        if isinstance(record.args, tuple) and any(isinstance(arg, DeferredArg) for arg in record.args):
+            # 消息和异常信息都留给后台线程的格式器处理
+            return copy.copy(record)
+        return super().prepare(record)
+
+def _gzip_namer(name: str) -> str:
+    """轮转文件名追加 .gz 后缀"""
+    return name + ".gz"
+
+def _gzip_rotator(source: str, dest: str):
+    """压缩轮转出的日志文件（在日志线程中执行）"""
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+_listener = None
+_configured = False
+_lock = threading.Lock()
+
+def _configure(logger: logging.Logger):
+    """只执行一次：主线程只负责入队，磁盘和控制台写入由后台线程完成"""
+    global _listener, _configured
+
     # 控制台处理器
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(ColoredFormatter())
-    logger.addHandler(console_handler)
-    
-    # 文件处理器
-    file_formatter = logging.Formatter(
-        '[%(asctime)s] %(levelname)s: %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
+
+    # 文件处理器，按大小轮转并压缩
+    file_handler = logging.handlers.RotatingFileHandler(
+        LOG_FILE,
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUP_COUNT,
+        encoding='utf-8'
+    )
+    file_handler.namer = _gzip_namer
+    file_handler.rotator = _gzip_rotator
+    file_handler.setFormatter(FileFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(UpdateIdFilter())
+    logger.addHandler(queue_handler)
+    logger.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue,
+        console_handler,
+        file_handler,
+        respect_handler_level=True
     )
-    file_handler = logging.FileHandler('bot.log', encoding='utf-8')
-    file_handler.setFormatter(file_formatter)
-    logger.addHandler(file_handler)
-    
-    return logger 
\ No newline at end of file
+    _listener.start()
+    _configured = True
+    atexit.register(shutdown_logging)
+
+class Truncated(DeferredArg):
+    """延迟截断的日志参数，只有日志真正输出时才在后台线程中转换为字符串"""
+    __slots__ = ('value', 'limit', '_text')
+
+    def __init__(self, value: Any, limit: int = LOG_PAYLOAD_LIMIT):
+        self.value = value
+        self.limit = limit
+        self._text: Optional[str] = None
+
+    def __str__(self):
+        # 控制台和文件各格式化一次，只转换第一次
+        if self._text is None:
+            text = self.value if isinstance(self.value, str) else str(self.value)
+            if len(text) > self.limit:
+                text = f"{text[:self.limit]}...(共{len(text)}字符)"
+            self._text = text
+        return self._text
+
+    __repr__ = __str__
+
+def truncate(value: Any, limit: int = LOG_PAYLOAD_LIMIT) -> Truncated:
+    """截断过长的日志内容（如API响应体）"""
+    return Truncated(value, limit)
+
+class _DroppedLogger:
+    """被采样丢弃的日志调用"""
+
+    def _drop(self, *args, **kwargs):
+        pass
+
+    debug = info = warning = error = exception = critical = log = _drop
+
+_DROPPED = _DroppedLogger()
+
+class BotLogger(logging.LoggerAdapter):
+    """
+    日志门面：参数按 %s 延迟格式化，级别不满足时不做任何格式化；
+    支持按调用位置采样，高频日志每 N 次只输出一次
+    """
+
+    def __init__(self, logger: logging.Logger):
+        super().__init__(logger, {})
+        self._sample_counters: Dict[tuple, int] = {}
+
+    def process(self, msg, kwargs):
+        return msg, kwargs
+
+    def sample(self, every: int):
+        """
+        按调用位置采样：同一行代码每调用 every 次只输出第一次
+        用法：logger.sample(20).info("收到回调: %s", data)
+        """
+        if every <= 1:
+            return self
+        frame = sys._getframe(1)
+        key = (frame.f_code, frame.f_lineno)
+        count = self._sample_counters.get(key, 0)
+        self._sample_counters[key] = count + 1
+        return self if count % every == 0 else _DROPPED
+
+def setup_logger(name: Optional[str] = None):
+    """
+    获取日志记录器（首次调用时完成配置，之后直接返回）
+    :param name: 模块名（通常传 __name__），传入后返回可单独调整级别的子记录器
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    if not _configured:
+        with _lock:
+            if not _configured:
+                _configure(logger)
+    if name is None:
+        return logger
+    return BotLogger(logger.getChild(name))
+
+def get_module_loggers() -> Dict[str, logging.Logger]:
+    """获取所有模块子记录器，键为模块名"""
+    prefix = LOGGER_NAME + "."
+    return {
+        name[len(prefix):]: logger
+        for name, logger in logging.Logger.manager.loggerDict.items()
+        if name.startswith(prefix) and isinstance(logger, logging.Logger)
+    }
+
+def set_module_level(module: str, level: str) -> Optional[str]:
+    """
+    运行时调整模块日志级别，模块名可以只写末段（如 baidu_commands）
+    返回实际匹配的模块名，找不到时返回 None
+    """
+    level_no = logging.getLevelName(level.upper())
+    if not isinstance(level_no, int):
+        raise ValueError(f"无效的日志级别: {level}")
+    loggers = get_module_loggers()
+    matched = module if module in loggers else next(
+        (name for name in loggers if name.rsplit('.', 1)[-1] == module),
+        None
+    )
+    if matched is None:
+        return None
+    loggers[matched].setLevel(level_no)
+    return matched
+
+def shutdown_logging():
+    """停止后台日志线程，写完队列中剩余的日志"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
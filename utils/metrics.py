@@ -0,0 +1,255 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from aiohttp import web
+from utils.logger import setup_logger
+from utils.rate_limit import rate_limit_stats
+
+logger = setup_logger(__name__)
+
+# 耗时直方图的桶上界（秒），固定数量，内存占用与调用次数无关
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5,
+    0.75, 1.0, 2.5, 5.0, 7.5, 10.0, 30.0, 60.0,
+)
+
+# Prometheus 指标名前缀
+METRIC_PREFIX = "mobot"
+
+# Prometheus 文本格式的内容类型
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class Histogram:
+    """固定桶直方图，分位数按桶内线性插值估算"""
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        # 最后一个桶对应 +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """估算分位数，如 q=0.95"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                value = lower + (upper - lower) * (rank - cumulative) / bucket_count
+                return min(value, self.max)
+            cumulative += bucket_count
+        return self.max
+
+class HandlerMetrics:
+    """单个命令或回调的统计：耗时直方图、错误数、进行中数量"""
+
+    __slots__ = ('kind', 'name', 'latency', 'errors', 'in_flight')
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.latency = Histogram()
+        self.errors = 0
+        self.in_flight = 0
+
+class Measurement:
+    """一次进行中的处理，处理函数可通过 set_action / mark_error 补充信息"""
+
+    __slots__ = ('kind', 'name', 'action', 'error')
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.action: Optional[str] = None
+        self.error = False
+
+# 当前协程正在统计的处理
+_current: ContextVar[Optional[Measurement]] = ContextVar('current_measurement', default=None)
+
+# 所有处理统计 {(类型, 名称): HandlerMetrics}
+_handlers: Dict[Tuple[str, str], HandlerMetrics] = {}
+
+# 额外的统计来源 {(类型, 名称): 返回 {指标: 数值} 的函数}，如缓存统计
+_collectors: Dict[Tuple[str, str], Callable[[], Dict[str, float]]] = {}
+
+def get_handler_metrics(kind: str, name: str) -> HandlerMetrics:
+    """获取（不存在时创建）处理统计"""
+    key = (kind, name)
+    metrics = _handlers.get(key)
+    if metrics is None:
+        metrics = _handlers[key] = HandlerMetrics(kind, name)
+    return metrics
+
+@contextmanager
+def track(kind: str, name: str) -> Iterator[Measurement]:
+    """
+    统计一次处理的耗时、错误和进行中数量
+    处理函数调用 set_action 后，耗时会同时计入 "名称.动作" 的统计
+    :param kind: 类型，如 command / callback
+    :param name: 名称，如命令名或回调前缀
+    """
+    metrics = get_handler_metrics(kind, name)
+    measurement = Measurement(kind, name)
+    token = _current.set(measurement)
+    metrics.in_flight += 1
+    start = time.perf_counter()
+    try:
+        yield measurement
+    except BaseException:
+        measurement.error = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.in_flight -= 1
+        _current.reset(token)
+        targets = [metrics]
+        if measurement.action:
+            targets.append(get_handler_metrics(kind, f"{name}.{measurement.action}"))
+        for target in targets:
+            target.latency.observe(elapsed)
+            if measurement.error:
+                target.errors += 1
+
+def set_action(action: str):
+    """为当前处理标注具体动作（如回调中的翻页、进入目录）"""
+    measurement = _current.get()
+    if measurement is not None:
+        measurement.action = action
+
+def mark_error():
+    """将当前处理计为失败（用于处理函数内部已捕获的异常）"""
+    measurement = _current.get()
+    if measurement is not None:
+        measurement.error = True
+
+def register_collector(kind: str, name: str, collect: Callable[[], Dict[str, float]]):
+    """
+    登记额外的统计来源，在 /stats 和指标接口中一并展示
+    :param kind: 类型，如 cache / session
+    :param name: 名称
+    :param collect: 返回 {指标: 数值} 的函数
+    """
+    _collectors[(kind, name)] = collect
+
+def handler_stats() -> List[dict]:
+    """获取所有处理统计的快照，按类型和名称排序"""
+    return [
+        {
+            'kind': m.kind,
+            'name': m.name,
+            'count': m.latency.count,
+            'errors': m.errors,
+            'in_flight': m.in_flight,
+            'p50': m.latency.quantile(0.5),
+            'p95': m.latency.quantile(0.95),
+            'p99': m.latency.quantile(0.99),
+            'max': m.latency.max,
+        }
+        for _, m in sorted(_handlers.items())
+    ]
+
+def collector_stats() -> Dict[Tuple[str, str], Dict[str, float]]:
+    """获取所有额外统计来源的当前数值"""
+    result = {}
+    for key, collect in sorted(_collectors.items()):
+        try:
+            result[key] = collect()
+        except Exception as e:
+            logger.warning(f"⚠️ 读取统计 {key[0]}/{key[1]} 失败: {str(e)}")
+    return result
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_bound(bound: float) -> str:
+    return repr(float(bound))
+
+def render_prometheus() -> str:
+    """以 Prometheus 文本格式输出所有指标"""
+    duration = f"{METRIC_PREFIX}_handler_duration_seconds"
+    errors = f"{METRIC_PREFIX}_handler_errors_total"
+    in_flight = f"{METRIC_PREFIX}_handler_in_flight"
+    lines = [
+        f"# HELP {duration} 处理耗时",
+        f"# TYPE {duration} histogram",
+    ]
+    gauge_lines = [f"# HELP {in_flight} 进行中的处理数", f"# TYPE {in_flight} gauge"]
+    error_lines = [f"# HELP {errors} 处理失败次数", f"# TYPE {errors} counter"]
+    for (kind, name), m in sorted(_handlers.items()):
+        labels = f'kind="{_escape(kind)}",name="{_escape(name)}"'
+        cumulative = 0
+        for bound, bucket_count in zip(m.latency.bounds, m.latency.counts):
+            cumulative += bucket_count
+            lines.append(f'{duration}_bucket{{{labels},le="{_format_bound(bound)}"}} {cumulative}')
+        lines.append(f'{duration}_bucket{{{labels},le="+Inf"}} {m.latency.count}')
+        lines.append(f'{duration}_sum{{{labels}}} {m.latency.sum}')
+        lines.append(f'{duration}_count{{{labels}}} {m.latency.count}')
+        error_lines.append(f'{errors}{{{labels}}} {m.errors}')
+        gauge_lines.append(f'{in_flight}{{{labels}}} {m.in_flight}')
+    lines += error_lines + gauge_lines
+
+    limited = f"{METRIC_PREFIX}_rate_limited_total"
+    lines += [f"# HELP {limited} 被限流拒绝的请求数", f"# TYPE {limited} counter"]
+    for item in rate_limit_stats():
+        lines.append(f'{limited}{{rule="{_escape(item["name"])}"}} {item["rejected"]}')
+
+    # 额外统计来源统一输出为 gauge，如 mobot_cache_hits{name="bmcl_rank"}，同名指标需连续输出
+    series: Dict[str, List[str]] = {}
+    for (kind, name), values in collector_stats().items():
+        for key, value in values.items():
+            metric = f"{METRIC_PREFIX}_{kind}_{key}"
+            series.setdefault(metric, []).append(f'{metric}{{name="{_escape(name)}"}} {value}')
+    for metric, samples in series.items():
+        lines.append(f"# TYPE {metric} gauge")
+        lines += samples
+    return "\n".join(lines) + "\n"
+
+class MetricsServer:
+    """本地指标接口，供 Prometheus 抓取"""
+
+    def __init__(self, listen: str, port: int, path: str = "/metrics"):
+        """
+        :param listen: 监听地址
+        :param port: 监听端口
+        :param path: 指标路径
+        """
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get(self.path, self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        logger.info(f"📈 指标接口已启动: http://{self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=render_prometheus().encode('utf-8'),
+            headers={"Content-Type": CONTENT_TYPE}
+        )
@@ -0,0 +1,259 @@
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from telegram import Message
+from telegram.error import BadRequest, RetryAfter
+from utils.logger import setup_logger
+from utils.rate_limit import RateLimit, acquire_all
+from config.config import (
+    OUTBOX_GLOBAL_RATE,
+    OUTBOX_CHAT_RATE,
+    OUTBOX_CHAT_BURST,
+    OUTBOX_GROUP_RATE,
+    OUTBOX_MAX_RETRIES,
+)
+
+logger = setup_logger(__name__)
+
+# 在 application.bot_data 中保存发送队列的键名
+BOT_DATA_KEY = 'outbox'
+
+# 编辑同一条消息的方法
+EDIT_TEXT = 'edit_message_text'
+EDIT_REPLY_MARKUP = 'edit_message_reply_markup'
+
+class _Op:
+    """一次待发送的 Bot API 调用"""
+
+    __slots__ = ('method', 'chat_id', 'message_id', 'kwargs', 'futures', 'attempts')
+
+    def __init__(self, method: str, chat_id: int, message_id: Optional[int], kwargs: dict):
+        self.method = method
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.kwargs = kwargs
+        # 等待结果的调用方（合并后的编辑共用一个结果）
+        self.futures: List[asyncio.Future] = []
+        self.attempts = 0
+
+    @property
+    def key(self) -> Optional[Tuple[int, int]]:
+        return (self.chat_id, self.message_id) if self.message_id is not None else None
+
+    def merge(self, newer: "_Op"):
+        """
+        合并同一条消息上更新的编辑，只保留最终状态：
+        编辑文本会整体替换（不带按钮时 Telegram 会移除按钮），只改按钮时保留待发送的文本
+        """
+        if newer.method == EDIT_TEXT or self.method == EDIT_REPLY_MARKUP:
+            self.method = newer.method
+            self.kwargs = newer.kwargs
+        else:
+            self.kwargs['reply_markup'] = newer.kwargs.get('reply_markup')
+        self.futures.extend(newer.futures)
+
+    def resolve(self, result: Any = None, error: Optional[BaseException] = None):
+        for future in self.futures:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+def retry_delay(error: RetryAfter) -> float:
+    """RetryAfter 中要求等待的秒数"""
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+class Outbox:
+    """
+    发送队列：发送和编辑消息按会话排队，同时遵守全局、每会话和群组的发送频率，
+    遇到 429 时按 retry_after 等待后重试；
+    同一条消息尚未发出的编辑会合并为最新的一次，连续翻页或进度更新只发送最终状态
+    """
+
+    def __init__(
+        self,
+        bot,
+        global_rate: str = OUTBOX_GLOBAL_RATE,
+        chat_rate: str = OUTBOX_CHAT_RATE,
+        chat_burst: int = OUTBOX_CHAT_BURST,
+        group_rate: str = OUTBOX_GROUP_RATE,
+        max_retries: int = OUTBOX_MAX_RETRIES,
+    ):
+        """
+        :param bot: telegram Bot 实例
+        :param global_rate: 所有会话合计的发送频率，如 "30/s"
+        :param chat_rate: 单个会话的发送频率
+        :param chat_burst: 单个会话允许的突发次数
+        :param group_rate: 群组额外的发送频率限制
+        :param max_retries: 遇到 429 时的最大重试次数
+        """
+        self.bot = bot
+        self.global_limit = RateLimit("outbox:global", global_rate)
+        self.chat_limit = RateLimit("outbox:chat", chat_rate, chat_burst)
+        self.group_limit = RateLimit("outbox:group", group_rate)
+        self.max_retries = max_retries
+        self._queues: Dict[int, Deque[_Op]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        # 尚未发出的编辑，新编辑合并到这里
+        self._edits: Dict[Tuple[int, int], _Op] = {}
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def send(self, chat_id: int, text: str, **kwargs) -> Message:
+        """发送消息，返回发出的消息"""
+        return await self._submit(_Op('send_message', chat_id, None, dict(text=text, **kwargs)), True)
+
+    async def send_document(self, chat_id: int, document, **kwargs) -> Message:
+        """发送文件，返回发出的消息"""
+        return await self._submit(_Op('send_document', chat_id, None, dict(document=document, **kwargs)), True)
+
+    async def reply(self, message: Message, text: str, **kwargs) -> Message:
+        """回复消息（与 Message.reply_text 相同，群组中引用原消息）"""
+        if message.chat.type != 'private':
+            kwargs.setdefault('reply_to_message_id', message.message_id)
+        return await self.send(message.chat_id, text, **kwargs)
+
+    async def edit_text(self, message: Message, text: str, wait: bool = True, **kwargs):
+        """
+        编辑消息文本
+        :param message: 要编辑的消息
+        :param wait: 是否等待发送完成；不等待时可与之后的编辑合并，出错只记录日志
+        """
+        op = _Op(EDIT_TEXT, message.chat_id, message.message_id, dict(text=text, **kwargs))
+        return await self._submit(op, wait)
+
+    async def edit_reply_markup(self, message: Message, reply_markup=None, wait: bool = True):
+        """编辑消息按钮，参数同 edit_text"""
+        op = _Op(EDIT_REPLY_MARKUP, message.chat_id, message.message_id, dict(reply_markup=reply_markup))
+        return await self._submit(op, wait)
+
+    async def stop(self):
+        """取消所有发送任务，未发送的调用方收到 CancelledError"""
+        workers = list(self._workers.values())
+        for task in workers:
+            task.cancel()
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
+        # 尚未开始运行就被取消的任务不会执行 finally，剩余队列在这里清理
+        for chat_id in list(self._queues):
+            self._discard(chat_id, self._queues[chat_id])
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'queued': sum(len(queue) for queue in self._queues.values()),
+            'chats': len(self._queues),
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'retried': self.retried,
+            'failed': self.failed,
+        }
+
+    async def _submit(self, op: _Op, wait: bool):
+        future = asyncio.get_running_loop().create_future() if wait else None
+        if future is not None:
+            op.futures.append(future)
+
+        pending = self._edits.get(op.key) if op.key else None
+        if pending is not None:
+            pending.merge(op)
+            self.coalesced += 1
+        else:
+            self._queues.setdefault(op.chat_id, deque()).append(op)
+            if op.key:
+                self._edits[op.key] = op
+            if op.chat_id not in self._workers:
+                self._workers[op.chat_id] = asyncio.create_task(self._drain(op.chat_id))
+
+        if future is not None:
+            return await future
+        return None
+
+    async def _drain(self, chat_id: int):
+        """逐个发送会话的队列，队列为空后结束"""
+        queue = self._queues[chat_id]
+        op = None
+        try:
+            while queue:
+                # 等待发送额度时操作仍留在队列中，期间的新编辑会合并进来
+                await self._wait_budget(chat_id)
+                op = queue.popleft()
+                if op.key and self._edits.get(op.key) is op:
+                    del self._edits[op.key]
+                params = dict(op.kwargs, chat_id=chat_id)
+                if op.message_id is not None:
+                    params['message_id'] = op.message_id
+                try:
+                    result = await getattr(self.bot, op.method)(**params)
+                except RetryAfter as e:
+                    delay = retry_delay(e)
+                    op.attempts += 1
+                    if op.attempts > self.max_retries:
+                        self._fail(op, e)
+                        continue
+                    self.retried += 1
+                    logger.warning(f"⚠️ 会话 {chat_id} 触发发送频率限制，{delay:.0f}秒后重试")
+                    self._requeue(queue, op)
+                    await asyncio.sleep(delay)
+                    continue
+                except BadRequest as e:
+                    if "not modified" in str(e).lower():
+                        # 合并后的编辑与当前内容相同
+                        op.resolve(True)
+                    else:
+                        self._fail(op, e)
+                    continue
+                except Exception as e:
+                    self._fail(op, e)
+                    continue
+                self.sent += 1
+                op.resolve(result)
+        finally:
+            # 被取消时正在发送的和队列中未发送的操作都通知调用方
+            self._discard(chat_id, ([op] if op else []) + list(queue))
+
+    def _discard(self, chat_id: int, ops):
+        """取消操作的调用方并移除会话的队列和任务"""
+        for pending in ops:
+            if pending.key and self._edits.get(pending.key) is pending:
+                del self._edits[pending.key]
+            for future in pending.futures:
+                future.cancel()
+        self._queues.pop(chat_id, None)
+        self._workers.pop(chat_id, None)
+
+    def _requeue(self, queue: Deque[_Op], op: _Op):
+        """把重试的操作放回队首；重试前同一条消息又有新编辑时合并进来"""
+        if op.key:
+            newer = self._edits.get(op.key)
+            if newer is not None:
+                queue.remove(newer)
+                op.merge(newer)
+            self._edits[op.key] = op
+        queue.appendleft(op)
+
+    async def _wait_budget(self, chat_id: int):
+        checks = [(self.global_limit, None), (self.chat_limit, chat_id)]
+        if chat_id < 0:
+            checks.append((self.group_limit, chat_id))
+        while True:
+            delay = max(limit.delay(key) for limit, key in checks)
+            if delay <= 0 and acquire_all(checks):
+                return
+            await asyncio.sleep(max(delay, 0.01))
+
+    def _fail(self, op: _Op, error: Exception):
+        self.failed += 1
+        if not op.futures:
+            logger.error(f"❌ 发送到会话 {op.chat_id} 失败: {str(error)}")
+        op.resolve(error=error)
+
+def get_outbox(context) -> Outbox:
+    """从应用上下文中获取发送队列"""
+    return context.application.bot_data[BOT_DATA_KEY]
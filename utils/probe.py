@@ -0,0 +1,281 @@
+import asyncio
+import itertools
+import math
+import os
+import socket
+import struct
+import time
+from typing import List, Optional, Sequence
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# ICMP 回显请求/应答类型
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMP_HEADER = struct.Struct('!BBHHH')
+
+# 每次 ICMP 探测使用不同的标识，原始套接字会收到所有回显应答，需据此区分
+_identifiers = itertools.count(os.getpid())
+
+# UDP 探测使用的目标端口（与 traceroute 相同，通常无服务监听，目标会回 ICMP 端口不可达）
+UDP_PROBE_PORT = 33434
+
+# 支持的探测方式
+METHODS = ('auto', 'icmp', 'tcp', 'udp')
+
+class ProbeResult:
+    """单个主机的探测结果"""
+
+    __slots__ = ('host', 'address', 'method', 'sent', 'rtts', 'error')
+
+    def __init__(self, host: str, method: str, address: Optional[str] = None):
+        self.host = host
+        self.address = address
+        self.method = method
+        self.sent = 0
+        # 每次成功探测的往返时间（毫秒）
+        self.rtts: List[float] = []
+        self.error: Optional[str] = None
+
+    @property
+    def received(self) -> int:
+        return len(self.rtts)
+
+    @property
+    def loss(self) -> float:
+        """丢包率（百分比）"""
+        if not self.sent:
+            return 100.0
+        return (self.sent - self.received) * 100.0 / self.sent
+
+    @property
+    def min(self) -> Optional[float]:
+        return min(self.rtts) if self.rtts else None
+
+    @property
+    def max(self) -> Optional[float]:
+        return max(self.rtts) if self.rtts else None
+
+    @property
+    def avg(self) -> Optional[float]:
+        return sum(self.rtts) / len(self.rtts) if self.rtts else None
+
+    @property
+    def mdev(self) -> Optional[float]:
+        """平均偏差，与 ping 的计算方式相同：sqrt(E[x²] - E[x]²)"""
+        if not self.rtts:
+            return None
+        avg = self.avg
+        return math.sqrt(max(0.0, sum(r * r for r in self.rtts) / len(self.rtts) - avg * avg))
+
+    def to_dict(self) -> dict:
+        return {
+            'host': self.host,
+            'address': self.address,
+            'method': self.method,
+            'sent': self.sent,
+            'received': self.received,
+            'loss': self.loss,
+            'min': self.min,
+            'avg': self.avg,
+            'max': self.max,
+            'mdev': self.mdev,
+            'error': self.error,
+        }
+
+def _checksum(data: bytes) -> int:
+    """ICMP 校验和（16位反码和）"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+def _build_echo(identifier: int, sequence: int) -> bytes:
+    payload = struct.pack('!d', time.perf_counter()) + b'MoBot-probe'
+    header = ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    checksum = _checksum(header + payload)
+    return ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, checksum, identifier, sequence) + payload
+
+def _open_icmp_socket() -> Optional[socket.socket]:
+    """
+    打开 ICMP 套接字：优先使用无需 root 的 ICMP 数据报套接字（Linux ping_group_range），
+    其次使用原始套接字（需要 root 或 CAP_NET_RAW），都不可用时返回 None
+    """
+    for sock_type in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+        try:
+            sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+        except (PermissionError, OSError):
+            continue
+        sock.setblocking(False)
+        return sock
+    return None
+
+def icmp_available() -> bool:
+    """当前进程是否有权限发送 ICMP"""
+    sock = _open_icmp_socket()
+    if sock is None:
+        return False
+    sock.close()
+    return True
+
+async def _resolve(host: str, family: int = socket.AF_UNSPEC) -> str:
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(host, None, family=family, type=socket.SOCK_STREAM)
+    return infos[0][4][0]
+
+async def _icmp_probe(result: ProbeResult, count: int, timeout: float, interval: float):
+    loop = asyncio.get_running_loop()
+    sock = _open_icmp_socket()
+    if sock is None:
+        raise PermissionError("没有发送 ICMP 的权限")
+    raw = sock.type == socket.SOCK_RAW
+    identifier = next(_identifiers) & 0xFFFF
+    waiters = {}
+
+    def on_readable():
+        while True:
+            try:
+                packet = sock.recv(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            received_at = time.perf_counter()
+            # 原始套接字收到的数据包含 IP 头
+            if raw:
+                packet = packet[(packet[0] & 0x0F) * 4:]
+            if len(packet) < ICMP_HEADER.size:
+                continue
+            icmp_type, _, _, reply_id, sequence = ICMP_HEADER.unpack_from(packet)
+            if icmp_type != ICMP_ECHO_REPLY:
+                continue
+            # 数据报套接字的标识由内核改写，只需匹配序号
+            if raw and reply_id != identifier:
+                continue
+            waiter = waiters.pop(sequence, None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(received_at)
+
+    loop.add_reader(sock.fileno(), on_readable)
+    try:
+        for sequence in range(1, count + 1):
+            if sequence > 1:
+                await asyncio.sleep(interval)
+            waiter = loop.create_future()
+            waiters[sequence] = waiter
+            sent_at = time.perf_counter()
+            sock.sendto(_build_echo(identifier, sequence), (result.address, 0))
+            result.sent += 1
+            try:
+                received_at = await asyncio.wait_for(waiter, timeout)
+                result.rtts.append((received_at - sent_at) * 1000)
+            except asyncio.TimeoutError:
+                waiters.pop(sequence, None)
+    finally:
+        loop.remove_reader(sock.fileno())
+        sock.close()
+
+async def _tcp_probe(result: ProbeResult, count: int, timeout: float, interval: float, port: int):
+    for sequence in range(count):
+        if sequence:
+            await asyncio.sleep(interval)
+        result.sent += 1
+        start = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(result.address, port), timeout)
+        except ConnectionRefusedError:
+            # 收到 RST 同样说明主机可达
+            result.rtts.append((time.perf_counter() - start) * 1000)
+            continue
+        except (asyncio.TimeoutError, OSError):
+            continue
+        result.rtts.append((time.perf_counter() - start) * 1000)
+        writer.close()
+
+class _UdpProbeProtocol(asyncio.DatagramProtocol):
+    """收到应答或 ICMP 端口不可达（表现为 ConnectionRefusedError）都视为可达"""
+
+    def __init__(self):
+        self.waiter: Optional[asyncio.Future] = None
+
+    def _wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(time.perf_counter())
+
+    def datagram_received(self, data, addr):
+        self._wake()
+
+    def error_received(self, exc):
+        if isinstance(exc, ConnectionRefusedError):
+            self._wake()
+
+async def _udp_probe(result: ProbeResult, count: int, timeout: float, interval: float):
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        _UdpProbeProtocol,
+        remote_addr=(result.address, UDP_PROBE_PORT)
+    )
+    try:
+        for sequence in range(count):
+            if sequence:
+                await asyncio.sleep(interval)
+            protocol.waiter = loop.create_future()
+            sent_at = time.perf_counter()
+            transport.sendto(b'MoBot-probe')
+            result.sent += 1
+            try:
+                received_at = await asyncio.wait_for(protocol.waiter, timeout)
+                result.rtts.append((received_at - sent_at) * 1000)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        transport.close()
+
+async def probe(
+    host: str,
+    count: int = 4,
+    timeout: float = 2.0,
+    interval: float = 0.5,
+    method: str = 'auto',
+    port: int = 443,
+) -> ProbeResult:
+    """
+    探测单个主机的连通性和往返时间，不创建任何子进程
+    :param host: 域名或IP
+    :param count: 探测次数
+    :param timeout: 单次探测超时（秒）
+    :param interval: 两次探测之间的间隔（秒）
+    :param method: auto / icmp / tcp / udp，auto 在有权限时使用 ICMP，否则使用 TCP 连接
+    :param port: TCP 探测的端口
+    """
+    if method not in METHODS:
+        raise ValueError(f"不支持的探测方式: {method}")
+    if method == 'auto':
+        method = 'icmp' if icmp_available() else 'tcp'
+
+    result = ProbeResult(host, method)
+    try:
+        # ICMP 套接字仅支持 IPv4
+        family = socket.AF_INET if method == 'icmp' else socket.AF_UNSPEC
+        result.address = await _resolve(host, family)
+        if method == 'icmp':
+            await _icmp_probe(result, count, timeout, interval)
+        elif method == 'tcp':
+            await _tcp_probe(result, count, timeout, interval, port)
+        else:
+            await _udp_probe(result, count, timeout, interval)
+    except socket.gaierror as e:
+        result.error = f"无法解析主机: {e.strerror or e}"
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        result.error = str(e)
+        logger.debug("探测 %s 出错: %s", host, e)
+    return result
+
+async def probe_many(hosts: Sequence[str], **kwargs) -> List[ProbeResult]:
+    """并发探测多个主机，结果顺序与 hosts 相同"""
+    return list(await asyncio.gather(*(probe(host, **kwargs) for host in hosts)))
@@ -0,0 +1,134 @@
+import re
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+# 时间单位（秒）
+_UNITS = {
+    's': 1, 'sec': 1, 'second': 1,
+    'm': 60, 'min': 60, 'minute': 60,
+    'h': 3600, 'hour': 3600,
+    'd': 86400, 'day': 86400,
+}
+
+def parse_rate(rate: str) -> Tuple[float, float]:
+    """
+    解析限流声明，如 "5/min"、"1/s"、"100/hour"
+    返回 (次数, 周期秒数)
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*/\s*(\d*)\s*([a-z]+)\s*', rate.lower())
+    if not match or match.group(3) not in _UNITS:
+        raise ValueError(f"无效的限流声明: {rate}")
+    count = float(match.group(1))
+    period = float(match.group(2) or 1) * _UNITS[match.group(3)]
+    return count, period
+
+class TokenBucketStore:
+    """
+    令牌桶存储：每个键一个 [剩余令牌, 上次更新时间] 列表
+    桶补满后与新桶等价，定期清理以保持内存有界
+    """
+
+    def __init__(self, sweep_interval: float = 60):
+        self._buckets: Dict[Hashable, list] = {}
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def _level(self, key: Hashable, refill: float, capacity: float, now: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return capacity
+        return min(capacity, bucket[0] + (now - bucket[1]) * refill)
+
+    def peek(self, key: Hashable, refill: float, capacity: float, now: float) -> bool:
+        """是否还有可用令牌（不消耗）"""
+        return self._level(key, refill, capacity, now) >= 1
+
+    def wait_time(self, key: Hashable, refill: float, capacity: float, now: float) -> float:
+        """距离有可用令牌还需等待的时间（秒），有令牌时为 0"""
+        level = self._level(key, refill, capacity, now)
+        return 0.0 if level >= 1 else (1 - level) / refill
+
+    def take(self, key: Hashable, refill: float, capacity: float, now: float):
+        """消耗一个令牌，并记录补满所需时间用于过期清理"""
+        level = self._level(key, refill, capacity, now) - 1
+        # 第三个元素为桶补满的时间点，超过后该桶可直接删除
+        self._buckets[key] = [level, now, now + (capacity - level) / refill]
+        if now >= self._next_sweep:
+            self.sweep(now)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """删除已经补满的桶"""
+        now = time.monotonic() if now is None else now
+        full = [key for key, bucket in self._buckets.items() if bucket[2] <= now]
+        for key in full:
+            del self._buckets[key]
+        self._next_sweep = now + self.sweep_interval
+        return len(full)
+
+    def __len__(self):
+        return len(self._buckets)
+
+# 所有限流规则共用的令牌桶存储
+bucket_store = TokenBucketStore()
+
+class RateLimit:
+    """一条限流规则，如 /bd 每用户 5次/分钟、突发 2 次"""
+
+    # 已创建的限流规则，用于统计展示
+    instances: List["RateLimit"] = []
+
+    def __init__(self, name: str, rate: str, burst: Optional[int] = None, store: TokenBucketStore = bucket_store):
+        """
+        :param name: 规则名称，同时作为桶键的命名空间
+        :param rate: 限流声明，如 "5/min"
+        :param burst: 桶容量（允许的突发次数），默认等于每周期次数
+        :param store: 令牌桶存储
+        """
+        count, period = parse_rate(rate)
+        self.name = name
+        self.rate = rate
+        self.refill = count / period
+        self.capacity = float(burst if burst is not None else max(1, count))
+        self.store = store
+        self.allowed = 0
+        self.rejected = 0
+        RateLimit.instances.append(self)
+
+    def _key(self, key: Hashable) -> tuple:
+        return (self.name, key)
+
+    def acquire(self, key: Hashable) -> bool:
+        """尝试为 key 消耗一个令牌"""
+        return acquire_all([(self, key)])
+
+    def delay(self, key: Hashable) -> float:
+        """key 距离有可用令牌还需等待的时间（秒），不消耗令牌"""
+        return self.store.wait_time(self._key(key), self.refill, self.capacity, time.monotonic())
+
+def acquire_all(checks: List[Tuple[RateLimit, Hashable]]) -> bool:
+    """
+    同时检查多条规则（如每用户 + 每群组），全部通过才消耗令牌
+    任意一条不通过时不消耗任何令牌，并计入该规则的拒绝次数
+    """
+    now = time.monotonic()
+    for limit, key in checks:
+        if not limit.store.peek(limit._key(key), limit.refill, limit.capacity, now):
+            limit.rejected += 1
+            return False
+    for limit, key in checks:
+        limit.store.take(limit._key(key), limit.refill, limit.capacity, now)
+        limit.allowed += 1
+    return True
+
+def rate_limit_stats() -> List[dict]:
+    """获取所有限流规则的统计"""
+    return [
+        {
+            'name': limit.name,
+            'rate': limit.rate,
+            'burst': int(limit.capacity),
+            'allowed': limit.allowed,
+            'rejected': limit.rejected,
+        }
+        for limit in RateLimit.instances
+    ]
@@ -0,0 +1,208 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+import aiohttp
+from utils.logger import setup_logger
+from utils.tracing import span
+from config.config import (
+    UPSTREAM_RETRY_ATTEMPTS,
+    UPSTREAM_ATTEMPT_TIMEOUT,
+    UPSTREAM_DEADLINE,
+    UPSTREAM_RETRY_BASE_DELAY,
+    UPSTREAM_RETRY_MAX_DELAY,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_TIMEOUT,
+)
+
+logger = setup_logger(__name__)
+
+class UpstreamError(Exception):
+    """上游请求失败（状态码异常或熔断中）"""
+
+    def __init__(self, upstream: str, status: Optional[int] = None, message: str = ""):
+        self.upstream = upstream
+        self.status = status
+        super().__init__(message or f"{upstream} 返回状态码 {status}")
+
+    @property
+    def retryable(self) -> bool:
+        """5xx 和 429 说明上游暂时不可用，可以重试；其他 4xx 重试也无济于事"""
+        return self.status is not None and (self.status >= 500 or self.status == 429)
+
+class CircuitOpenError(UpstreamError):
+    """熔断器已打开，请求未发出"""
+
+    def __init__(self, upstream: str, retry_in: float):
+        self.retry_in = retry_in
+        super().__init__(upstream, message=f"{upstream} 暂时不可用，{retry_in:.0f}秒后重试")
+
+class CircuitBreaker:
+    """
+    上游熔断器：连续失败达到阈值后打开，期间直接拒绝请求；
+    经过 reset_timeout 后进入半开状态放行一次试探，成功则关闭，失败则重新打开
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    # 已创建的熔断器，按上游名称索引
+    instances: Dict[str, "CircuitBreaker"] = {}
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        """
+        :param name: 上游名称（通常为主机名）
+        :param failure_threshold: 连续失败多少次后打开
+        :param reset_timeout: 打开后多久放行试探请求（秒）
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.failures = 0
+        self.successes = 0
+        self.rejected = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        # 半开状态下试探请求的发出时间，试探未结束前不放行其他请求
+        self._trial_at: Optional[float] = None
+
+    @property
+    def retry_in(self) -> float:
+        """距离下次放行试探还需等待的时间（秒）"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """是否放行本次请求"""
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            if now < self._opened_at + self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._trial_at = None
+        if self.state == self.HALF_OPEN:
+            # 试探请求被取消时不会有结果，超过 reset_timeout 后再放行一次
+            if self._trial_at is not None and now < self._trial_at + self.reset_timeout:
+                self.rejected += 1
+                return False
+            self._trial_at = now
+        return True
+
+    def record_success(self):
+        self.successes += 1
+        self.consecutive_failures = 0
+        if self.state != self.CLOSED:
+            logger.info(f"🔌 上游 {self.name} 已恢复，熔断器关闭")
+        self.state = self.CLOSED
+        self._trial_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or (
+            self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold
+        ):
+            self.state = self.OPEN
+            self.opened += 1
+            self._opened_at = time.monotonic()
+            self._trial_at = None
+            logger.warning(
+                f"🔌 上游 {self.name} 连续失败 {self.consecutive_failures} 次，熔断 {self.reset_timeout:.0f} 秒"
+            )
+
+    def stats(self) -> dict:
+        return {
+            'name': self.name,
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'failures': self.failures,
+            'successes': self.successes,
+            'rejected': self.rejected,
+            'opened': self.opened,
+            'retry_in': self.retry_in,
+        }
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """获取上游的熔断器（首次使用时创建）"""
+    breaker = CircuitBreaker.instances.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker.instances[name] = CircuitBreaker(name)
+    return breaker
+
+def breaker_stats() -> List[dict]:
+    """获取所有熔断器的状态"""
+    return [breaker.stats() for breaker in CircuitBreaker.instances.values()]
+
+def upstream_name(url: str) -> str:
+    """由URL得到上游名称（主机名）"""
+    return urlsplit(url).netloc or url
+
+def check_status(upstream: str, response: aiohttp.ClientResponse, expected: int = 200):
+    """状态码不符合预期时抛出 UpstreamError"""
+    if response.status != expected:
+        raise UpstreamError(upstream, response.status)
+
+def is_retryable(error: BaseException) -> bool:
+    """网络错误、超时和上游 5xx/429 视为上游故障"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, UpstreamError):
+        return error.retryable
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+async def call_upstream(
+    upstream: str,
+    request: Callable[[], Awaitable[Any]],
+    idempotent: bool = True,
+    attempts: int = UPSTREAM_RETRY_ATTEMPTS,
+    attempt_timeout: float = UPSTREAM_ATTEMPT_TIMEOUT,
+    deadline: float = UPSTREAM_DEADLINE,
+    base_delay: float = UPSTREAM_RETRY_BASE_DELAY,
+    max_delay: float = UPSTREAM_RETRY_MAX_DELAY,
+) -> Any:
+    """
+    经熔断器调用上游：每次尝试有单独的超时，全部尝试共享总期限，
+    幂等请求在上游故障时按带随机抖动的指数退避重试
+    :param upstream: 上游名称，同名请求共用一个熔断器
+    :param request: 发起一次请求的函数（需在内部读完响应体，状态码异常时抛出 UpstreamError）
+    :param idempotent: 是否幂等，非幂等请求只尝试一次
+    :param attempts: 最多尝试次数
+    :param attempt_timeout: 单次尝试超时（秒）
+    :param deadline: 所有尝试的总期限（秒）
+    :param base_delay: 首次重试前的最大等待（秒），之后每次翻倍
+    :param max_delay: 重试等待的上限（秒）
+    """
+    breaker = get_breaker(upstream)
+    loop = asyncio.get_running_loop()
+    give_up_at = loop.time() + deadline
+    attempts = attempts if idempotent else 1
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(upstream, breaker.retry_in)
+        attempt += 1
+        remaining = give_up_at - loop.time()
+        try:
+            with span("upstream.attempt", upstream=upstream, attempt=attempt):
+                result = await asyncio.wait_for(request(), min(attempt_timeout, remaining))
+        except Exception as e:
+            if not is_retryable(e):
+                # 上游正常响应了（如 4xx 或内容错误），不计入失败
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            # 全抖动：在 [0, base_delay * 2^n] 内随机等待，避免大量请求同时重试
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            if attempt >= attempts or loop.time() + delay >= give_up_at:
+                raise
+            logger.debug("请求 %s 失败（第%s次）: %r，%.2f秒后重试", upstream, attempt, e, delay)
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class SessionStore:
+    """有容量上限、空闲过期的会话存储，超出容量时按最近最少使用（LRU）淘汰"""
+
+    def __init__(
+        self,
+        idle_timeout: float,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+        sweep_interval: float = 60,
+        name: str = "session",
+    ):
+        """
+        :param idle_timeout: 空闲过期时间（秒），超过该时间未访问的会话将被清理
+        :param max_entries: 最大会话数，None 表示不限制
+        :param max_bytes: 最大总字节数，None 表示不限制
+        :param sizeof: 估算单个会话字节数的函数
+        :param sweep_interval: 后台清理间隔（秒）
+        :param name: 存储名称，用于日志
+        """
+        self.idle_timeout = idle_timeout
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.sweep_interval = sweep_interval
+        self.name = name
+        # 值为 [会话, 最后访问时间, 字节数]，按访问顺序排列
+        self._items: "OrderedDict[Hashable, list]" = OrderedDict()
+        self._bytes = 0
+        self._sweeper: Optional[asyncio.Task] = None
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """获取会话并刷新访问时间，已过期的会话视为不存在"""
+        item = self._items.get(key)
+        if item is None:
+            return None
+        now = time.monotonic()
+        if now - item[1] > self.idle_timeout:
+            self._remove(key)
+            self.expired += 1
+            return None
+        item[1] = now
+        self._items.move_to_end(key)
+        return item[0]
+
+    def put(self, key: Hashable, value: Any):
+        """
+        写入会话；会话内容变化后再次调用可重新计算占用
+        :param key: 会话键（通常为用户ID）
+        :param value: 会话对象
+        """
+        size = self.sizeof(value) if self.sizeof else 0
+        self._remove(key)
+        self._items[key] = [value, time.monotonic(), size]
+        self._bytes += size
+        self._evict(keep=key)
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """删除并返回会话"""
+        item = self._items.get(key)
+        self._remove(key)
+        return item[0] if item else None
+
+    def __contains__(self, key: Hashable):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def nbytes(self) -> int:
+        """当前估算的总字节数"""
+        return self._bytes
+
+    def stats(self) -> Dict[str, int]:
+        """获取会话统计信息"""
+        return {
+            'entries': len(self._items),
+            'bytes': self._bytes,
+            'expired': self.expired,
+            'evicted': self.evicted,
+        }
+
+    def sweep(self) -> int:
+        """清理所有已过期的会话，返回清理数量"""
+        deadline = time.monotonic() - self.idle_timeout
+        expired = [key for key, item in self._items.items() if item[1] < deadline]
+        for key in expired:
+            self._remove(key)
+        self.expired += len(expired)
+        return len(expired)
+
+    def start(self):
+        """启动后台清理任务（需在事件循环中调用，由应用启动时调用，重复调用无影响）"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+
+    async def stop(self):
+        """停止后台清理任务"""
+        if self._sweeper and not self._sweeper.done():
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+        self._sweeper = None
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                count = self.sweep()
+                if count:
+                    logger.info(f"🧹 已清理 {count} 个过期{self.name}，剩余 {len(self._items)} 个")
+            except Exception as e:
+                logger.error(f"清理{self.name}时出错: {str(e)}")
+
+    def _remove(self, key: Hashable):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self._bytes -= item[2]
+
+    def _evict(self, keep: Hashable = None):
+        """按LRU顺序淘汰，直到满足容量限制（刚写入的会话除外）"""
+        while len(self._items) > 1 and (
+            (self.max_entries is not None and len(self._items) > self.max_entries)
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            key = next(iter(self._items))
+            if key == keep:
+                break
+            self._remove(key)
+            self.evicted += 1
@@ -0,0 +1,127 @@
+from array import array
+from typing import Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+# 序列在某次快照中缺失时的取值
+MISSING = -1
+
+class SnapshotRing:
+    """
+    多个序列的定时快照，容量固定，写满后覆盖最旧的一次：
+    每个序列的每个字段是一段定长的 array('q')，内存只与序列数和容量有关；
+    序列在整个窗口内都没有出现时自动回收
+    """
+
+    def __init__(self, capacity: int, fields: Sequence[str], max_series: int):
+        """
+        :param capacity: 保留的快照次数
+        :param fields: 每个序列记录的字段，如 ('bytes', 'hits')
+        :param max_series: 序列数上限，超过后新出现的序列不再记录
+        """
+        self.capacity = max(2, capacity)
+        self.fields = tuple(fields)
+        self.max_series = max_series
+        self.timestamps = array('d', [0.0]) * self.capacity
+        # 序列 -> 每个字段一段数组
+        self._series: Dict[Hashable, List[array]] = {}
+        # 序列最后一次出现时的快照序号，用于回收
+        self._last_seen: Dict[Hashable, int] = {}
+        # 已写入的快照总数，下一次写入位置为 _seq % capacity
+        self._seq = 0
+        self.dropped = 0
+
+    def record(self, timestamp: float, values: Dict[Hashable, Sequence[int]], replace: bool = False):
+        """
+        写入一次快照
+        :param timestamp: 快照时间
+        :param values: 序列 -> 与 fields 对应的数值
+        :param replace: 是否覆盖最新一次快照而不是新增一次
+        """
+        if replace and self._seq:
+            self._seq -= 1
+        slot = self._seq % self.capacity
+        self.timestamps[slot] = timestamp
+        for columns in self._series.values():
+            for column in columns:
+                column[slot] = MISSING
+        for key, row in values.items():
+            columns = self._series.get(key)
+            if columns is None:
+                if len(self._series) >= self.max_series:
+                    self.dropped += 1
+                    continue
+                columns = self._series[key] = [array('q', [MISSING]) * self.capacity for _ in self.fields]
+            for column, value in zip(columns, row):
+                column[slot] = value
+            self._last_seen[key] = self._seq
+        self._seq += 1
+        # 最后一次出现已被覆盖的序列不再有数据
+        for key in [key for key, seen in self._last_seen.items() if seen <= self._seq - 1 - self.capacity]:
+            del self._series[key]
+            del self._last_seen[key]
+
+    def __len__(self) -> int:
+        """已保存的快照次数"""
+        return min(self._seq, self.capacity)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._series
+
+    def keys(self) -> List[Hashable]:
+        return list(self._series)
+
+    def _slot(self, index: int) -> int:
+        """按时间顺序的下标（负数从最新一次往前数）换算为数组位置"""
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError(index)
+        return (self._seq - count + index) % self.capacity
+
+    def timestamp(self, index: int = -1) -> float:
+        return self.timestamps[self._slot(index)]
+
+    def value(self, key: Hashable, field: str, index: int = -1) -> Optional[int]:
+        """某个序列在某次快照中的取值，缺失时返回 None"""
+        columns = self._series.get(key)
+        if columns is None:
+            return None
+        value = columns[self.fields.index(field)][self._slot(index)]
+        return None if value == MISSING else value
+
+    def snapshot(self, field: str, index: int = -1) -> Dict[Hashable, int]:
+        """某次快照中所有序列的取值（不含缺失的）"""
+        slot = self._slot(index)
+        position = self.fields.index(field)
+        result = {}
+        for key, columns in self._series.items():
+            value = columns[position][slot]
+            if value != MISSING:
+                result[key] = value
+        return result
+
+    def history(self, key: Hashable, field: str, since: float = 0.0) -> Iterator[Tuple[float, int]]:
+        """按时间顺序产出某个序列的 (时间, 取值)，跳过缺失的快照"""
+        columns = self._series.get(key)
+        if columns is None:
+            return
+        column = columns[self.fields.index(field)]
+        for index in range(len(self)):
+            slot = self._slot(index)
+            timestamp = self.timestamps[slot]
+            if timestamp >= since and column[slot] != MISSING:
+                yield timestamp, column[slot]
+
+    def memory(self) -> int:
+        """数组占用的字节数"""
+        per_series = len(self.fields) * self.capacity * array('q').itemsize
+        return len(self._series) * per_series + self.capacity * self.timestamps.itemsize
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'snapshots': len(self),
+            'capacity': self.capacity,
+            'series': len(self._series),
+            'dropped': self.dropped,
+            'bytes': self.memory(),
+        }
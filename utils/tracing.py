@@ -0,0 +1,268 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+import aiohttp
+from telegram.request import HTTPXRequest
+from utils.logger import DeferredArg, DeferredQueueHandler, setup_logger, update_id_var
+from config.config import TRACE_ENABLED, TRACE_FILE, TRACE_MAX_BYTES
+
+logger = setup_logger(__name__)
+
+class Span:
+    """一段被追踪的操作，结束时以一行JSON导出"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'start', 'duration', 'attrs', 'error')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, **attrs):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.attrs: Dict[str, Any] = attrs
+        self.error: Optional[str] = None
+
+    def set(self, **attrs):
+        """补充属性"""
+        self.attrs.update(attrs)
+
+    def finish(self):
+        self.duration = time.time() - self.start
+        _export(self)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'duration_ms': round((self.duration or 0) * 1000, 3),
+            'attrs': self.attrs,
+            'error': self.error,
+        }, ensure_ascii=False, default=str)
+
+# 当前协程所在的 span，子 span 和 HTTP 请求据此关联到同一条追踪
+_current_span: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+
+# span 导出：与日志相同，主线程只负责入队，由后台线程写入 JSONL 文件
+_exporter: Optional[logging.Logger] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def _get_exporter() -> logging.Logger:
+    global _exporter, _listener
+    if _exporter is None:
+        file_handler = logging.handlers.RotatingFileHandler(
+            TRACE_FILE,
+            maxBytes=TRACE_MAX_BYTES,
+            backupCount=3,
+            encoding='utf-8'
+        )
+        file_handler.setFormatter(logging.Formatter('%(message)s'))
+        span_queue = queue.SimpleQueue()
+        exporter = logging.getLogger('TelegramBotTrace')
+        exporter.propagate = False
+        exporter.setLevel(logging.INFO)
+        exporter.addHandler(DeferredQueueHandler(span_queue))
+        _listener = logging.handlers.QueueListener(span_queue, file_handler)
+        _listener.start()
+        _exporter = exporter
+        atexit.register(shutdown_tracing)
+        logger.info(f"🧭 追踪已启用，span 写入: {TRACE_FILE}")
+    return _exporter
+
+def _export(span: Span):
+    # DeferredQueueHandler 不在入队时格式化，JSON 序列化在后台线程中进行，事件循环中只做入队
+    _get_exporter().info('%s', _SpanLine(span))
+
+class _SpanLine(DeferredArg):
+    """日志参数包装，在后台线程格式化时才序列化为JSON（span 结束后不再修改）"""
+    __slots__ = ('span',)
+
+    def __init__(self, span: Span):
+        self.span = span
+
+    def __str__(self):
+        return self.span.to_json()
+
+def shutdown_tracing():
+    """写完队列中剩余的 span"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def current_span() -> Optional[Span]:
+    """获取当前 span"""
+    return _current_span.get()
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """
+    追踪一段操作，自动挂到当前 span 之下；当前没有追踪或追踪未启用时不做任何事
+    用法：with span("baidu.parse_json"): ...
+    """
+    parent = _current_span.get()
+    if not TRACE_ENABLED or parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace_id, parent.span_id, **attrs)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        child.finish()
+
+@contextmanager
+def trace_update(update, name: str, **attrs) -> Iterator[Optional[Span]]:
+    """
+    为一个收到的更新开启追踪，并把更新ID写入日志上下文
+    :param update: telegram Update
+    :param name: 根 span 名称，如 "command /bd"
+    """
+    update_id = getattr(update, 'update_id', None)
+    id_token = update_id_var.set(update_id)
+    if not TRACE_ENABLED:
+        try:
+            yield None
+        finally:
+            update_id_var.reset(id_token)
+        return
+    user = getattr(update, 'effective_user', None)
+    root = Span(
+        name,
+        trace_id=os.urandom(16).hex(),
+        update_id=update_id,
+        user_id=user.id if user else None,
+        **attrs
+    )
+    token = _current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        update_id_var.reset(id_token)
+        root.finish()
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 3)
+
+async def _on_request_start(session, ctx, params):
+    ctx.start = time.perf_counter()
+    ctx.span = None
+    parent = _current_span.get()
+    if TRACE_ENABLED and parent is not None:
+        # 只记录主机和路径，避免把查询参数中的敏感信息写入文件
+        ctx.span = Span(
+            f"http {params.method}",
+            parent.trace_id,
+            parent.span_id,
+            host=params.url.host,
+            path=params.url.path,
+        )
+
+async def _on_dns_start(session, ctx, params):
+    ctx.dns_start = time.perf_counter()
+
+async def _on_dns_end(session, ctx, params):
+    if getattr(ctx, 'span', None) is not None:
+        ctx.span.set(dns_ms=_elapsed_ms(ctx.dns_start))
+
+async def _on_dns_cache_hit(session, ctx, params):
+    if getattr(ctx, 'span', None) is not None:
+        ctx.span.set(dns_cached=True)
+
+async def _on_connection_start(session, ctx, params):
+    ctx.connect_start = time.perf_counter()
+
+async def _on_connection_end(session, ctx, params):
+    # aiohttp 不单独报告 TLS 握手，connect_ms 包含 TCP 连接和 TLS 握手
+    if getattr(ctx, 'span', None) is not None:
+        ctx.span.set(connect_ms=_elapsed_ms(ctx.connect_start))
+
+async def _on_connection_reused(session, ctx, params):
+    if getattr(ctx, 'span', None) is not None:
+        ctx.span.set(reused=True)
+
+async def _on_request_end(session, ctx, params):
+    # 收到响应头时触发，即首字节时间
+    if getattr(ctx, 'span', None) is not None:
+        ctx.span.set(status=params.response.status, ttfb_ms=_elapsed_ms(ctx.start))
+        ctx.span.finish()
+
+async def _on_request_exception(session, ctx, params):
+    if getattr(ctx, 'span', None) is not None:
+        ctx.span.error = f"{type(params.exception).__name__}: {params.exception}"
+        ctx.span.finish()
+
+def create_trace_config() -> aiohttp.TraceConfig:
+    """创建 aiohttp 追踪配置，记录 DNS、连接（含TLS）和首字节耗时"""
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_dns_resolvehost_start.append(_on_dns_start)
+    trace_config.on_dns_resolvehost_end.append(_on_dns_end)
+    trace_config.on_dns_cache_hit.append(_on_dns_cache_hit)
+    trace_config.on_connection_create_start.append(_on_connection_start)
+    trace_config.on_connection_create_end.append(_on_connection_end)
+    trace_config.on_connection_reuseconn.append(_on_connection_reused)
+    trace_config.on_request_end.append(_on_request_end)
+    trace_config.on_request_exception.append(_on_request_exception)
+    return trace_config
+
+# httpcore 追踪阶段到 span 属性的对应关系，每个阶段有 started / complete / failed 三个事件
+_HTTPCORE_PHASES = {
+    'connection.connect_tcp': 'connect_ms',
+    'connection.start_tls': 'tls_ms',
+    'http11.receive_response_headers': 'ttfb_ms',
+    'http2.receive_response_headers': 'ttfb_ms',
+}
+
+async def _httpcore_trace(event_name: str, info: dict):
+    current = _current_span.get()
+    if current is None:
+        return
+    phase, _, stage = event_name.rpartition('.')
+    attr = _HTTPCORE_PHASES.get(phase)
+    if attr is None:
+        return
+    if stage == 'started':
+        current.attrs[f"_{attr}"] = time.perf_counter()
+    elif stage in ('complete', 'failed'):
+        started = current.attrs.pop(f"_{attr}", None)
+        if started is not None:
+            current.set(**{attr: _elapsed_ms(started)})
+
+async def _add_httpcore_trace(request):
+    request.extensions['trace'] = _httpcore_trace
+
+class TracingHTTPXRequest(HTTPXRequest):
+    """为 Telegram Bot API 请求记录 span（连接、TLS、首字节耗时）"""
+
+    def _build_client(self):
+        client = super()._build_client()
+        if TRACE_ENABLED:
+            client.event_hooks['request'].append(_add_httpcore_trace)
+        return client
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        # URL 中包含机器人令牌，只记录 API 方法名
+        with span(f"telegram {url.rsplit('/', 1)[-1]}") as current:
+            status, payload = await super().do_request(url, method, *args, **kwargs)
+            if current is not None:
+                current.set(status=status, response_bytes=len(payload))
+            return status, payload
@@ -0,0 +1,87 @@
+import asyncio
+from typing import Any, Awaitable, Dict, Hashable, Optional
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+def update_key(update: object) -> Optional[Hashable]:
+    """
+    更新的串行键：同一用户的更新按顺序处理，没有用户的按会话处理，
+    两者都没有时返回 None（不需要排队）
+    """
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user is not None:
+        return ('user', update.effective_user.id)
+    if update.effective_chat is not None:
+        return ('chat', update.effective_chat.id)
+    return None
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """
+    并发处理不同用户的更新，同一用户的更新按到达顺序逐个处理，
+    避免同一用户的会话状态（如分享浏览会话）被并发修改
+    """
+
+    def __init__(self, concurrency: int, max_pending: int):
+        """
+        :param concurrency: 同时处理的更新数上限
+        :param max_pending: 已接收但尚未处理完的更新数上限（含排队中的），超过后新更新等待
+        """
+        # 父类的信号量在按用户排队之前获取，因此只用来限制总的待处理数，
+        # 真正的并发上限在拿到用户锁之后再获取，避免排队中的更新占用处理名额
+        super().__init__(max(max_pending, concurrency))
+        self.concurrency = concurrency
+        self._running = asyncio.BoundedSemaphore(concurrency)
+        # 串行键 -> [锁, 等待及处理中的更新数]
+        self._keys: Dict[Hashable, list] = {}
+        self.active = 0
+        self.pending = 0
+        self.processed = 0
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = update_key(update)
+        self.pending += 1
+        try:
+            if key is None:
+                await self._run(coroutine)
+                return
+            item = self._keys.get(key)
+            if item is None:
+                item = self._keys[key] = [asyncio.Lock(), 0]
+            item[1] += 1
+            try:
+                async with item[0]:
+                    await self._run(coroutine)
+            finally:
+                item[1] -= 1
+                if not item[1]:
+                    del self._keys[key]
+        finally:
+            self.pending -= 1
+
+    async def _run(self, coroutine: Awaitable[Any]):
+        async with self._running:
+            self.active += 1
+            try:
+                await coroutine
+            finally:
+                self.active -= 1
+                self.processed += 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'active': self.active,
+            'queued': self.pending - self.active,
+            'keys': len(self._keys),
+            'concurrency': self.concurrency,
+            'processed': self.processed,
+        }
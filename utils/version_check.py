@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import time
+from typing import Optional, Tuple
+from packaging import version
+from utils.logger import setup_logger
+from config.config import (
+    VERSION_CHECK_TIMEOUT,
+    VERSION_CHECK_CACHE_TTL,
+    VERSION_CHECK_FAILURE_TTL,
+    VERSION_CHECK_CACHE_FILE,
+)
+
+logger = setup_logger(__name__)
+
+def fetch_latest_release(repo_name: str, timeout: float) -> dict:
+    """同步请求GitHub最新发布信息（在线程中执行）"""
+    # PyGithub 仅在此处使用，延迟导入以缩短启动时间
+    from github import Github
+
+    g = Github(timeout=int(max(1, timeout)), retry=None)
+    release = g.get_repo(repo_name).get_latest_release()
+    return {
+        'tag_name': release.tag_name,
+        'body': release.body,
+        'html_url': release.html_url,
+    }
+
+def load_cached_release(
+    repo_name: str,
+    ttl: float = VERSION_CHECK_CACHE_TTL,
+    failure_ttl: float = VERSION_CHECK_FAILURE_TTL,
+) -> Tuple[bool, Optional[dict]]:
+    """
+    读取磁盘上未过期的版本检查结果
+    :param ttl: 成功结果的缓存时间（秒）
+    :param failure_ttl: 失败记录的缓存时间（秒）
+    :return: (是否命中, 发布信息)，命中的是失败记录时发布信息为 None
+    """
+    try:
+        with open(VERSION_CHECK_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return False, None
+    if cached.get('repo') != repo_name:
+        return False, None
+    release = cached.get('release')
+    if time.time() - cached.get('checked_at', 0) > (ttl if release is not None else failure_ttl):
+        return False, None
+    return True, release
+
+def save_cached_release(repo_name: str, release: Optional[dict]):
+    """保存版本检查结果到磁盘，release 为 None 时记录一次失败"""
+    tmp_file = f"{VERSION_CHECK_CACHE_FILE}.tmp"
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'repo': repo_name,
+                'checked_at': time.time(),
+                'release': release,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_file, VERSION_CHECK_CACHE_FILE)
+    except OSError as e:
+        logger.warning(f"⚠️ 保存版本检查缓存失败: {str(e)}")
+
+async def check_version(current_version: str, repo_name: str, timeout: float = VERSION_CHECK_TIMEOUT):
+    """
+    检查GitHub上的最新版本
+    优先使用磁盘缓存；需要联网时在线程中执行，并受 timeout 硬性限制
+    :param current_version: 当前版本号
+    :param repo_name: GitHub仓库名
+    :param timeout: 最长等待时间（秒）
+    """
+    try:
+        cached, release = load_cached_release(repo_name)
+        if not cached:
+            logger.info("🔍 正在检查最新版本...")
+            loop = asyncio.get_running_loop()
+            try:
+                release = await asyncio.wait_for(
+                    loop.run_in_executor(None, fetch_latest_release, repo_name, timeout),
+                    timeout=timeout
+                )
+            except Exception:
+                # 记录失败，退避期内启动时不再联网（无法访问GitHub时不必每次都等到超时）
+                save_cached_release(repo_name, None)
+                raise
+            save_cached_release(repo_name, release)
+        elif release is None:
+            logger.debug("最近一次版本检查失败，%.0f秒内不再重试", VERSION_CHECK_FAILURE_TTL)
+            return
+
+        latest_version = release['tag_name']
+        if version.parse(latest_version.lstrip('v')) > version.parse(current_version.lstrip('v')):
+            logger.info(f"📢 发现新版本: {latest_version} (当前版本: {current_version})")
+            logger.info(f"📝 更新说明: {release['body']}")
+            logger.info(f"🔗 下载地址: {release['html_url']}")
+        else:
+            logger.info(f"✅ 当前已是最新版本: {current_version}")
+    except asyncio.TimeoutError:
+        logger.warning(f"⚠️ 版本检查超时（{timeout}秒），已跳过")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.warning(f"⚠️ 版本检查失败: {str(e)}")
@@ -0,0 +1,128 @@
+import asyncio
+import hmac
+from typing import List, Optional
+from aiohttp import web
+from telegram import Update
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Telegram 推送时携带密钥的请求头
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+class WebhookServer:
+    """
+    内置的 Webhook 接收服务：校验密钥后放入有界队列，由工作协程交给应用的更新处理器，
+    与长轮询一样按用户串行、跨用户并发处理
+    """
+
+    def __init__(
+        self,
+        application,
+        listen: str,
+        port: int,
+        path: str,
+        secret_token: Optional[str] = None,
+        queue_size: int = 1000,
+        workers: int = 1,
+    ):
+        """
+        :param application: telegram Application 实例
+        :param listen: 监听地址
+        :param port: 监听端口
+        :param path: 接收更新的路径
+        :param secret_token: Telegram 推送时携带的密钥，为空时不校验
+        :param queue_size: 待处理更新队列上限，队列满时返回 503 让 Telegram 稍后重试
+        :param workers: 从队列取出更新的工作协程数
+        """
+        self.application = application
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.workers = workers
+        self._runner: Optional[web.AppRunner] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        # 已交给处理器但尚未处理完的更新数上限，与队列一起限制积压
+        self._slots = asyncio.Semaphore(queue_size)
+        self.rejected = 0
+
+    async def start(self):
+        """启动 HTTP 服务和工作协程"""
+        app = web.Application()
+        app.router.add_post(self.path, self._handle_update)
+        app.router.add_get(self.path, self._handle_health)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+        logger.info(f"📡 Webhook 服务已启动: {self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        """停止接收新更新，取消工作协程"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        for task in self._worker_tasks:
+            task.cancel()
+        if self._worker_tasks:
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        logger.info("📡 Webhook 服务已停止")
+
+    async def _handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({'ok': True, 'queued': self.queue.qsize()})
+
+    async def _handle_update(self, request: web.Request) -> web.Response:
+        # 校验密钥
+        if self.secret_token:
+            token = request.headers.get(SECRET_HEADER, "")
+            if not hmac.compare_digest(token, self.secret_token):
+                logger.warning(f"⚠️ Webhook 密钥校验失败，来源: {request.remote}")
+                return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            logger.warning(f"⚠️ 无法解析 Webhook 更新: {str(e)}")
+            return web.Response(status=400)
+
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # 返回非 2xx，Telegram 会在稍后重新推送
+            self.rejected += 1
+            logger.sample(100).warning(f"⚠️ Webhook 队列已满，已拒绝 {self.rejected} 个更新")
+            return web.Response(status=503)
+
+        return web.Response()
+
+    async def _worker(self, index: int):
+        processor = self.application.update_processor
+        while True:
+            update = await self.queue.get()
+            try:
+                if processor.max_concurrent_updates > 1:
+                    # 并发处理：排队和并发上限由处理器负责
+                    await self._slots.acquire()
+                    task = self.application.create_task(self._process(update, index), update=update)
+                    task.add_done_callback(lambda _: self._slots.release())
+                else:
+                    await self._process(update, index)
+            finally:
+                self.queue.task_done()
+
+    async def _process(self, update: Update, index: int):
+        try:
+            await self.application.update_processor.process_update(
+                update, self.application.process_update(update)
+            )
+        except Exception as e:
+            logger.error(f"❌ Webhook 工作协程 {index} 处理更新出错: {str(e)}")